@@ -0,0 +1,40 @@
+"""Admin Models"""
+import pendulum
+
+from api.bases import PydanticBaseModel
+
+
+class Snapshot(PydanticBaseModel):
+    path: str
+    size_bytes: int
+    pages: int
+    steps: int
+    duration_seconds: float
+
+
+class WriteMetrics(PydanticBaseModel):
+    queued: int
+    batches: int
+    writes: int
+    failed_writes: int
+    mean_batch_size: float
+    max_batch_size: int
+    wait_p50_ms: float
+    wait_p95_ms: float
+    wait_max_ms: float
+
+
+class LoopStall(PydanticBaseModel):
+    started_dttm: pendulum.DateTime
+    blocked_ms: float
+    stack: list[str]
+
+
+class LoopMetrics(PydanticBaseModel):
+    samples: int
+    lag_p50_ms: float
+    lag_p95_ms: float
+    lag_p99_ms: float
+    lag_max_ms: float
+    stalls: int
+    recent_stalls: list[LoopStall]
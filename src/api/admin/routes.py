@@ -0,0 +1,70 @@
+from fastapi import APIRouter, HTTPException, Query, status
+from loguru import logger
+from starlette.concurrency import run_in_threadpool
+
+from api.config import get_settings
+from api.database import BOARD_PATTERN, DEFAULT_BOARD, shards, sqlite_path
+from api.watchdog import watchdog
+from api.writes import writes
+from .models import LoopMetrics, Snapshot, WriteMetrics
+from .service import backup_sqlite
+
+router = APIRouter(tags=["Admin"], prefix="/admin")
+settings = get_settings()
+
+
+@router.post(
+    "/backup",
+    response_model=Snapshot,
+    status_code=status.HTTP_201_CREATED,
+    description="Take a consistent snapshot of the live database using sqlite's online backup API",
+    response_description="Snapshot location, size and duration",
+    summary="Backup database",
+)
+async def create_backup(board: str = Query(DEFAULT_BOARD, regex=BOARD_PATTERN, description="Board to back up")):
+    source_path = sqlite_path(shards.url_for(board))
+    if not source_path.exists():
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Board not found")
+
+    # The backup sleeps between page steps, so keep it off the event loop
+    snapshot = await run_in_threadpool(
+        backup_sqlite,
+        source_path,
+        settings.backup.DIR,
+        settings.backup.PAGES_PER_STEP,
+        settings.backup.STEP_SLEEP,
+    )
+    logger.info(
+        "Database snapshot {path} took {duration}s for {size} bytes",
+        path=snapshot.path,
+        duration=snapshot.duration_seconds,
+        size=snapshot.size_bytes,
+    )
+    return snapshot
+
+
+@router.get(
+    "/writes",
+    response_model=WriteMetrics,
+    status_code=status.HTTP_200_OK,
+    description="Batch sizes and queue waits of the write group commit queue over its recent batches",
+    response_description="Write coalescing metrics",
+    summary="Write metrics",
+)
+async def get_write_metrics():
+    return WriteMetrics(queued=writes.queued, **writes.stats.summary())
+
+
+@router.get(
+    "/loop",
+    response_model=LoopMetrics,
+    status_code=status.HTTP_200_OK,
+    description="Event loop lag over the recent heartbeats and the stacks of callbacks that blocked the loop",
+    response_description="Event loop lag metrics",
+    summary="Loop metrics",
+)
+async def get_loop_metrics():
+    if not watchdog.running:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Loop watchdog is not enabled")
+
+    return LoopMetrics(**watchdog.summary())
@@ -0,0 +1,52 @@
+import sqlite3
+import time
+from contextlib import closing
+from pathlib import Path
+
+import pendulum
+
+from .models import Snapshot
+
+
+def backup_sqlite(source_path: Path, backup_dir: Path, pages_per_step: int, step_sleep: float) -> Snapshot:
+    """
+    Copy a live sqlite database with the online backup API.
+
+    Pages are copied `pages_per_step` at a time and the source lock is released
+    for `step_sleep` seconds between steps, so readers and writers only ever
+    wait for one step. The copy is written under a temporary name and renamed
+    once complete, so a snapshot file is always consistent.
+
+    The pause is taken in the progress callback, which runs after each step
+    returns. The `sleep` argument of `Connection.backup` only applies when a
+    step finds the database busy or locked.
+    """
+    backup_dir.mkdir(parents=True, exist_ok=True)
+    stamp = pendulum.now().format("YYYYMMDD_HHmmss_SSSSSS")
+    target_path = backup_dir / f"{source_path.stem}_{stamp}.sqlite"
+    partial_path = target_path.with_name(target_path.name + ".partial")
+
+    steps = 0
+    total_pages = 0
+
+    def progress(status: int, remaining: int, total: int):
+        nonlocal steps, total_pages
+        steps += 1
+        total_pages = total
+        if remaining:
+            time.sleep(step_sleep)
+
+    started = time.perf_counter()
+    with closing(sqlite3.connect(source_path)) as source, closing(sqlite3.connect(partial_path)) as target:
+        source.backup(target, pages=pages_per_step, progress=progress, sleep=step_sleep)
+
+    partial_path.replace(target_path)
+    duration = time.perf_counter() - started
+
+    return Snapshot(
+        path=str(target_path),
+        size_bytes=target_path.stat().st_size,
+        pages=total_pages,
+        steps=steps,
+        duration_seconds=round(duration, 6),
+    )
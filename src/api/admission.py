@@ -0,0 +1,121 @@
+"""Admission Control"""
+import asyncio
+import json
+
+from loguru import logger
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+READ_METHODS = frozenset({"GET", "HEAD", "OPTIONS"})
+
+
+class AdmissionPool:
+    """
+    At most `limit` requests run at once and at most `max_queue` wait for a
+    slot. A request that cannot be queued, or waits longer than `timeout`
+    seconds, is turned away instead of adding to the pile up.
+    """
+
+    def __init__(self, name: str, limit: int, max_queue: int, timeout: float):
+        self.name = name
+        self.limit = limit
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.in_flight = 0
+        self.queued = 0
+        self.rejected = 0
+        self._slots = asyncio.Semaphore(limit)
+
+    async def acquire(self) -> bool:
+        """Take a slot, returning False when the request should be rejected"""
+        if self.in_flight < self.limit and not self.queued:
+            await self._slots.acquire()
+        elif self.queued >= self.max_queue:
+            self.rejected += 1
+            return False
+        else:
+            self.queued += 1
+            try:
+                await asyncio.wait_for(self._slots.acquire(), self.timeout)
+            except asyncio.TimeoutError:
+                self.rejected += 1
+                return False
+            finally:
+                self.queued -= 1
+
+        self.in_flight += 1
+        return True
+
+    def release(self) -> None:
+        self.in_flight -= 1
+        self._slots.release()
+
+    def summary(self) -> dict:
+        return {
+            "limit": self.limit,
+            "in_flight": self.in_flight,
+            "queued": self.queued,
+            "rejected": self.rejected,
+        }
+
+
+class AdmissionMiddleware:
+    """
+    Bound how many API requests run at once, with separate pools for reads
+    and writes so a burst of writes queueing on the database lock cannot
+    starve reads. Overflow gets an immediate 503 with `Retry-After`.
+
+    Slots are held until the response has been fully sent, so streamed
+    responses count against the pool for as long as they stream.
+    """
+
+    def __init__(
+            self,
+            app: ASGIApp,
+            *,
+            read_pool: AdmissionPool,
+            write_pool: AdmissionPool,
+            retry_after: int,
+            prefix: str = "/api/",
+            exempt_paths: tuple[str, ...] = ()
+    ):
+        self.app = app
+        self.read_pool = read_pool
+        self.write_pool = write_pool
+        self.retry_after = retry_after
+        self.prefix = prefix
+        self.exempt_paths = exempt_paths
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        path = scope.get("path", "")
+        if scope["type"] != "http" or not path.startswith(self.prefix) or path in self.exempt_paths:
+            await self.app(scope, receive, send)
+            return
+
+        pool = self.read_pool if scope["method"] in READ_METHODS else self.write_pool
+        if not await pool.acquire():
+            logger.warning(
+                "Rejected {method} {path}, {pool} pool is full",
+                method=scope["method"],
+                path=path,
+                pool=pool.name,
+            )
+            await self.reject(send, pool)
+            return
+
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            pool.release()
+
+    async def reject(self, send: Send, pool: AdmissionPool) -> None:
+        body = json.dumps({"detail": f"Server is at capacity for {pool.name}s, retry later"}).encode()
+        await send({
+            "type": "http.response.start",
+            "status": 503,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(self.retry_after).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
@@ -1,9 +1,30 @@
-from httpx import AsyncClient, Client, QueryParams
+import asyncio
+import getpass
+import os
+import time
+import uuid
+from collections.abc import AsyncIterator, Iterator
+
+from httpx import AsyncClient, Client, QueryParams, Response, TransportError
 from fastapi import status
-from api.cards.models import CardCreate, CardUpdate, CardRead, Priority, State
+from fastapi.encoders import jsonable_encoder
+from api.cards.models import (
+    BulkCreated, BulkTransition, BulkTransitioned, CardCreate, CardField, CardHistoryPage, CardImport, CardPartial,
+    CardUpdate, CardRead, CycleTimes, Dashboard, DayThroughput, FilteredCards, HistoryCompaction, Priority,
+    RollupBackfill, State, TagChange, TagCount, Tombstone
+)
+from api.admin.models import Snapshot
+from api.jobs.models import JobRead, JobState
+from api.root.models import Readiness
+from api.cards.columnar import COLUMNAR_MEDIA_TYPE, decode_cards, decode_page, page_unpacker
 from api.config import get_settings
 import pendulum
 
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
 settings = get_settings()
 
 
@@ -23,12 +44,45 @@ class InternalServerError(ClientError):
     pass
 
 
+class ServiceUnavailableError(ClientError):
+    pass
+
+
+class JobFailedError(ClientError):
+    pass
+
+
 STATUS_ERROR_MAP = {
     status.HTTP_404_NOT_FOUND: InvalidCardIdError,
     status.HTTP_422_UNPROCESSABLE_ENTITY: BadRequestError,
-    status.HTTP_500_INTERNAL_SERVER_ERROR: InternalServerError
+    status.HTTP_500_INTERNAL_SERVER_ERROR: InternalServerError,
+    status.HTTP_503_SERVICE_UNAVAILABLE: ServiceUnavailableError
 }
 
+# Only codings httpx can decode, it handles br when brotli is installed
+ACCEPT_ENCODING = "gzip" if brotli is None else "br, gzip"
+HEADERS = {"Accept-Encoding": ACCEPT_ENCODING}
+COLUMNAR_HEADERS = {"Accept": COLUMNAR_MEDIA_TYPE}
+COLUMNAR_PAGE_SIZE = 1000
+
+def client_headers() -> dict[str, str]:
+    """Changes are recorded in the card history under the local user name, when there is one"""
+    try:
+        actor = getpass.getuser()
+    except (KeyError, OSError):
+        # Containers often run under a uid with no passwd entry and no login variables
+        actor = os.environ.get("USER")
+
+    return HEADERS if actor is None else HEADERS | {"X-Actor": actor}
+
+
+# Requests sent with an Idempotency-Key are safe to resend after a timeout or a 503
+MAX_RETRIES = 3
+RETRY_BACKOFF = 0.2
+
+# Long operations answer 202 with a job, polled until it finishes
+JOB_POLL_INTERVAL = 0.2
+
 
 def raise_for_bad_status(response):
     error = STATUS_ERROR_MAP.get(response.status_code)
@@ -36,10 +90,99 @@ def raise_for_bad_status(response):
         raise error
 
 
+def job_result(job: JobRead):
+    if job.state != JobState.SUCCEEDED:
+        raise JobFailedError(job.error or f"Job {job.id} was {job.state.value}")
+
+    return job.result
+
+
+def cards_path(board: str | None) -> str:
+    """Cards routes of a board, or of the default board when `board` is None"""
+    return "/api/cards" if board is None else f"/api/boards/{board}/cards"
+
+
+def filter_query_params(
+        lowest_create_date: pendulum.Date | None = None,
+        highest_create_date: pendulum.Date | None = None,
+        priorities: list[Priority] | None = None,
+        states: list[State] | None = None,
+        tags_all: list[str] | None = None,
+        tags_any: list[str] | None = None,
+        after_id: int | None = None,
+        limit: int | None = None,
+        fields: list[CardField] | None = None
+) -> QueryParams:
+    query_params_data = {}
+    if lowest_create_date is not None:
+        query_params_data["lowest_create_date"] = lowest_create_date
+
+    if highest_create_date is not None:
+        query_params_data["highest_create_date"] = highest_create_date
+
+    if priorities is not None:
+        priority_values = [priority.value for priority in priorities]
+        query_params_data["priorities"] = priority_values
+
+    if states is not None:
+        state_values = [state.value for state in states]
+        query_params_data["states"] = state_values
+
+    if tags_all is not None:
+        query_params_data["tags_all"] = tags_all
+
+    if tags_any is not None:
+        query_params_data["tags_any"] = tags_any
+
+    if after_id is not None:
+        query_params_data["after_id"] = after_id
+
+    if limit is not None:
+        query_params_data["limit"] = limit
+
+    if fields is not None:
+        query_params_data["fields"] = [field.value for field in fields]
+
+    return QueryParams(**query_params_data)
+
+
+def next_page_size(page_size: int, limit: int | None, n_read: int) -> int:
+    return page_size if limit is None else min(page_size, limit - n_read)
+
+
+def merge_columns(columns: dict[str, list], page_columns: dict[str, list]) -> None:
+    for field, values in page_columns.items():
+        columns.setdefault(field, values[:0]).extend(values)
+
+
+def idempotency_headers(key: str | None = None) -> dict[str, str]:
+    """The key of one logical request, reused by all of its retries, a fresh one unless the caller has its own"""
+    return {"Idempotency-Key": key or uuid.uuid4().hex}
+
+
+def retry_delay(attempt: int, response: Response | None) -> float:
+    if response is not None and (retry_after := response.headers.get("retry-after", "")).isdigit():
+        return float(retry_after)
+
+    return RETRY_BACKOFF * 2 ** attempt
+
+
+def should_retry(attempt: int, response: Response | None) -> bool:
+    if attempt >= MAX_RETRIES:
+        return False
+
+    return response is None or response.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+
+
 class AsyncCardClient:
-    def __init__(self):
+    def __init__(self, board: str | None = None):
         # self._client = AsyncClient(base_url="http://127.0.0.1:8000")
-        self._client = AsyncClient(base_url=f"http://{settings.server.HOST}:{settings.server.PORT}")
+        self._client = AsyncClient(base_url=f"http://{settings.server.HOST}:{settings.server.PORT}", headers=client_headers())
+        self.board = board
+
+    @property
+    def cards_path(self) -> str:
+        return cards_path(self.board)
 
     async def is_healthy(self) -> bool:
         response = await self._client.get("/api/health")
@@ -47,73 +190,288 @@ class AsyncCardClient:
 
         return response.json()
 
+    async def get_readiness(self) -> Readiness:
+        """Readiness is reported with 503 as well, so that status is read as the answer rather than an error"""
+        response = await self._client.get("/api/ready")
+        if response.status_code != status.HTTP_503_SERVICE_UNAVAILABLE:
+            raise_for_bad_status(response)
+
+        return Readiness.from_dict(response.json())
+
     async def get_db_path(self) -> str:
         response = await self._client.get("/api/db/path")
         raise_for_bad_status(response)
 
         return response.json()
 
+    async def create_backup(self) -> Snapshot:
+        params = {} if self.board is None else {"board": self.board}
+        response = await self._client.post("/api/admin/backup", params=params, timeout=None)
+        raise_for_bad_status(response)
+
+        return Snapshot.from_dict(response.json())
+
+    async def send_idempotent(self, method: str, url: str, key: str | None = None, **kwargs) -> Response:
+        """Send a write with an Idempotency-Key, retrying it with the same key until the server answers"""
+        headers = idempotency_headers(key)
+        attempt = 0
+        while True:
+            try:
+                response = await self._client.request(method, url, headers=headers, **kwargs)
+            except TransportError:
+                if not should_retry(attempt, None):
+                    raise
+                response = None
+
+            if not should_retry(attempt, response):
+                return response
+
+            await asyncio.sleep(retry_delay(attempt, response))
+            attempt += 1
+
     async def create_card(self, card: CardCreate) -> CardRead:
-        response = await self._client.post("/api/cards/", json=card.dict())
+        response = await self.send_idempotent("POST", f"{self.cards_path}/", json=jsonable_encoder(card))
         raise_for_bad_status(response)
 
         return CardRead.from_dict(response.json())
 
     async def get_card(self, card_id: int) -> CardRead:
-        response = await self._client.get(f"/api/cards/{card_id}")
+        response = await self._client.get(f"{self.cards_path}/{card_id}")
         raise_for_bad_status(response)
 
         return CardRead.from_dict(response.json())
 
     async def delete_card(self, card_id: int) -> None:
-        response = await self._client.delete(f"/api/cards/{card_id}")
+        response = await self._client.delete(f"{self.cards_path}/{card_id}")
         raise_for_bad_status(response)
 
     async def update_card(self, card_id: int, card_updates: CardUpdate) -> None:
-        body = card_updates.dict(exclude_unset=True)
-        response = await self._client.patch(f"/api/cards/{card_id}", json=body)
+        body = jsonable_encoder(card_updates, exclude_unset=True)
+        response = await self._client.patch(f"{self.cards_path}/{card_id}", json=body)
         raise_for_bad_status(response)
 
     async def get_card_count(self) -> int:
-        response = await self._client.get("/api/cards/count/")
+        response = await self._client.get(f"{self.cards_path}/count/")
         raise_for_bad_status(response)
 
         return response.json().get("count")
 
+    async def get_dashboard(self, top: int = 10, days: int = 14) -> Dashboard:
+        response = await self._client.get(f"{self.cards_path}/dashboard/", params={"top": top, "days": days})
+        raise_for_bad_status(response)
+
+        return Dashboard.from_dict(response.json())
+
+    async def get_daily_stats(self, days: int = 30) -> list[DayThroughput]:
+        response = await self._client.get(f"{self.cards_path}/stats/daily/", params={"days": days})
+        raise_for_bad_status(response)
+
+        return [DayThroughput.from_dict(day) for day in response.json()]
+
+    async def get_cycle_times(self, days: int = 90, percentiles: list[int] | None = None) -> CycleTimes:
+        params = QueryParams(days=days) if percentiles is None else QueryParams(days=days, percentiles=percentiles)
+        response = await self._client.get(f"{self.cards_path}/stats/cycle-times/", params=params)
+        raise_for_bad_status(response)
+
+        return CycleTimes.from_dict(response.json())
+
+    async def wait_for_job(self, response: Response) -> JobRead:
+        """Poll the job a 202 response points to until it finishes"""
+        raise_for_bad_status(response)
+        job = JobRead.from_dict(response.json())
+        while not job.state.finished:
+            await asyncio.sleep(JOB_POLL_INTERVAL)
+            response = await self._client.get(f"/api/jobs/{job.id}")
+            raise_for_bad_status(response)
+            job = JobRead.from_dict(response.json())
+
+        return job
+
+    async def backfill_stats(self) -> RollupBackfill:
+        job = await self.wait_for_job(await self._client.post(f"{self.cards_path}/stats/backfill/"))
+
+        return RollupBackfill.from_dict(job_result(job))
+
+    async def transition_cards(
+            self,
+            state: State,
+            card_ids: list[int] | None = None,
+            from_states: list[State] | None = None
+    ) -> int:
+        body = BulkTransition(state=state, card_ids=card_ids, from_states=from_states)
+        response = await self._client.post(f"{self.cards_path}/transition/", json=jsonable_encoder(body, by_alias=True))
+        job = await self.wait_for_job(response)
+
+        return BulkTransitioned.from_dict(job_result(job)).count
+
+    async def add_tags(self, tags: list[str], card_ids: list[int]) -> None:
+        body = TagChange(tags=tags, card_ids=card_ids).dict(by_alias=True)
+        response = await self._client.post(f"{self.cards_path}/tags/add/", json=body)
+        raise_for_bad_status(response)
+
+    async def remove_tags(self, tags: list[str], card_ids: list[int]) -> None:
+        body = TagChange(tags=tags, card_ids=card_ids).dict(by_alias=True)
+        response = await self._client.post(f"{self.cards_path}/tags/remove/", json=body)
+        raise_for_bad_status(response)
+
+    async def get_card_tags(self, card_id: int) -> list[str]:
+        response = await self._client.get(f"{self.cards_path}/{card_id}/tags/")
+        raise_for_bad_status(response)
+
+        return response.json()
+
+    async def get_tag_counts(self) -> list[TagCount]:
+        response = await self._client.get(f"{self.cards_path}/tags/")
+        raise_for_bad_status(response)
+
+        return [TagCount.from_dict(tag_count) for tag_count in response.json()]
+
+    async def get_card_history(self, card_id: int, after_id: int | None = None, limit: int = 100) -> CardHistoryPage:
+        params = {"limit": limit} if after_id is None else {"after_id": after_id, "limit": limit}
+        response = await self._client.get(f"{self.cards_path}/{card_id}/history/", params=params)
+        raise_for_bad_status(response)
+
+        return CardHistoryPage.from_dict(response.json())
+
+    async def compact_history(self, older_than_days: int) -> HistoryCompaction:
+        params = {"older_than_days": older_than_days}
+        job = await self.wait_for_job(await self._client.post(f"{self.cards_path}/history/compact/", params=params))
+
+        return HistoryCompaction.from_dict(job_result(job))
+
+    async def get_due_cards(self, within_hours: int = 24, limit: int = 100) -> list[CardRead]:
+        params = {"within_hours": within_hours, "limit": limit}
+        response = await self._client.get(f"{self.cards_path}/due/", params=params)
+        raise_for_bad_status(response)
+
+        return [CardRead.from_dict(card) for card in response.json()]
+
+    async def get_deleted_cards(
+            self,
+            after: tuple[pendulum.DateTime, int] | None = None,
+            limit: int = 100
+    ) -> list[Tombstone]:
+        """Cards deleted and not purged yet, keyed after the deletion time and id of the last one read"""
+        params = {"limit": limit}
+        if after is not None:
+            params |= {"after_dttm": str(after[0]), "after_id": after[1]}
+
+        response = await self._client.get(f"{self.cards_path}/deleted/", params=params)
+        raise_for_bad_status(response)
+
+        return [Tombstone.from_dict(tombstone) for tombstone in response.json()]
+
+    async def get_cards_version(self) -> str:
+        response = await self._client.get(f"{self.cards_path}/version/")
+        raise_for_bad_status(response)
+
+        return response.json().get("version")
+
     async def get_cards(
             self,
             lowest_create_date: pendulum.Date | None = None,
             highest_create_date: pendulum.Date | None = None,
             priorities: list[Priority] | None = None,
-            states: list[State] | None = None
-    ) -> list[CardRead]:
-        query_params_data = {}
-        if lowest_create_date is not None:
-            query_params_data["lowest_create_date"] = lowest_create_date
-
-        if highest_create_date is not None:
-            query_params_data["highest_create_date"] = highest_create_date
-
-        if priorities is not None:
-            priority_values = [priority.value for priority in priorities]
-            query_params_data["priorities"] = priority_values
+            states: list[State] | None = None,
+            fields: list[CardField] | None = None,
+            tags_all: list[str] | None = None,
+            tags_any: list[str] | None = None
+    ) -> list[CardRead | CardPartial]:
+        """Cards matching the filters, as partial cards holding only `fields` when given"""
+        page = await self.get_cards_page(
+            lowest_create_date=lowest_create_date,
+            highest_create_date=highest_create_date,
+            priorities=priorities,
+            states=states,
+            fields=fields,
+            tags_all=tags_all,
+            tags_any=tags_any
+        )
+        return page.cards
+
+    async def get_cards_page(self, *, after_id: int | None = None, limit: int | None = None, **filters) -> FilteredCards:
+        query_params = filter_query_params(after_id=after_id, limit=limit, **filters)
+        response = await self._client.get(f"{self.cards_path}/filter/", params=query_params)
+        raise_for_bad_status(response)
 
-        if states is not None:
-            state_values = [state.value for state in states]
-            query_params_data["states"] = state_values
+        return FilteredCards.from_dict(response.json())
 
-        query_params = QueryParams(**query_params_data)
-        response = await self._client.get("/api/cards/filter/", params=query_params)
+    async def iter_card_pages(
+            self,
+            *,
+            page_size: int = 500,
+            limit: int | None = None,
+            after_id: int | None = None,
+            **filters
+    ) -> AsyncIterator[list[CardRead]]:
+        """Yield pages of cards in id order until `limit` cards or the last page is read"""
+        n_read = 0
+        while (size := next_page_size(page_size, limit, n_read)) > 0:
+            page = await self.get_cards_page(after_id=after_id, limit=size, **filters)
+            if page.cards:
+                yield page.cards
+
+            n_read += len(page.cards)
+            after_id = page.next_after_id
+            if after_id is None:
+                break
+
+    async def bulk_create_cards(self, cards: list[CardImport], key: str | None = None) -> int:
+        """Create a batch of cards, resending one under the same `key` never creates it twice"""
+        body = [card.dict(by_alias=True, exclude_none=True) for card in cards]
+        response = await self.send_idempotent("POST", f"{self.cards_path}/bulk/", key=key, json=jsonable_encoder(body))
         raise_for_bad_status(response)
 
-        return [CardRead.from_dict(item) for item in response.json()["cards"]]
+        return BulkCreated.from_dict(response.json()).count
+
+    async def iter_export(self, after_id: int = 0) -> AsyncIterator[CardRead]:
+        """Stream every card after `after_id` without buffering the whole export"""
+        params = {"after_id": after_id}
+        async with self._client.stream("GET", f"{self.cards_path}/export/", params=params, timeout=None) as response:
+            raise_for_bad_status(response)
+            async for line in response.aiter_lines():
+                if line:
+                    yield CardRead.parse_raw(line)
+
+    async def get_card_columns(self, **filters) -> dict[str, list]:
+        """
+        Every card matching the filters as one list or array per field, read in
+        columnar pages so no object is built per card. Needs msgpack.
+        """
+        columns = {}
+        after_id = None
+        while True:
+            query_params = filter_query_params(after_id=after_id, limit=COLUMNAR_PAGE_SIZE, **filters)
+            response = await self._client.get(
+                f"{self.cards_path}/filter/", params=query_params, headers=COLUMNAR_HEADERS
+            )
+            raise_for_bad_status(response)
+
+            page = decode_page(response.content)
+            merge_columns(columns, decode_cards(page))
+            after_id = page["nextAfterId"]
+            if after_id is None:
+                return columns
+
+    async def iter_export_columns(self, after_id: int = 0) -> AsyncIterator[dict[str, list]]:
+        """Stream the export as columnar pages, one dict of field columns per page. Needs msgpack."""
+        params = {"after_id": after_id}
+        unpacker = page_unpacker()
+        async with self._client.stream(
+                "GET", f"{self.cards_path}/export/", params=params, headers=COLUMNAR_HEADERS, timeout=None
+        ) as response:
+            raise_for_bad_status(response)
+            async for chunk in response.aiter_bytes():
+                unpacker.feed(chunk)
+                for page in unpacker:
+                    yield decode_cards(page)
 
     async def start_card(self, card_id: int) -> None:
-        response = await self._client.patch(f"/api/cards/start/{card_id}")
+        response = await self.send_idempotent("PATCH", f"{self.cards_path}/start/{card_id}")
         raise_for_bad_status(response)
 
     async def finish_card(self, card_id: int) -> None:
-        response = await self._client.patch(f"/api/cards/finish/{card_id}")
+        response = await self.send_idempotent("PATCH", f"{self.cards_path}/finish/{card_id}")
         raise_for_bad_status(response)
 
     async def close(self):
@@ -122,8 +480,13 @@ class AsyncCardClient:
 
 
 class SyncCardClient:
-    def __init__(self):
-        self._client = Client(base_url=f"http://{settings.server.HOST}:{settings.server.PORT}")
+    def __init__(self, board: str | None = None):
+        self._client = Client(base_url=f"http://{settings.server.HOST}:{settings.server.PORT}", headers=client_headers())
+        self.board = board
+
+    @property
+    def cards_path(self) -> str:
+        return cards_path(self.board)
 
     def is_healthy(self) -> bool:
         response = self._client.get("/api/health")
@@ -131,72 +494,285 @@ class SyncCardClient:
 
         return response.json()
 
+    def get_readiness(self) -> Readiness:
+        """Readiness is reported with 503 as well, so that status is read as the answer rather than an error"""
+        response = self._client.get("/api/ready")
+        if response.status_code != status.HTTP_503_SERVICE_UNAVAILABLE:
+            raise_for_bad_status(response)
+
+        return Readiness.from_dict(response.json())
+
     def get_db_path(self) -> str:
         response = self._client.get("/api/db/path")
         raise_for_bad_status(response)
 
         return response.json()
 
+    def create_backup(self) -> Snapshot:
+        params = {} if self.board is None else {"board": self.board}
+        response = self._client.post("/api/admin/backup", params=params, timeout=None)
+        raise_for_bad_status(response)
+
+        return Snapshot.from_dict(response.json())
+
+    def send_idempotent(self, method: str, url: str, key: str | None = None, **kwargs) -> Response:
+        """Send a write with an Idempotency-Key, retrying it with the same key until the server answers"""
+        headers = idempotency_headers(key)
+        attempt = 0
+        while True:
+            try:
+                response = self._client.request(method, url, headers=headers, **kwargs)
+            except TransportError:
+                if not should_retry(attempt, None):
+                    raise
+                response = None
+
+            if not should_retry(attempt, response):
+                return response
+
+            time.sleep(retry_delay(attempt, response))
+            attempt += 1
+
     def create_card(self, card: CardCreate) -> CardRead:
-        response = self._client.post("/api/cards/", json=card.dict())
+        response = self.send_idempotent("POST", f"{self.cards_path}/", json=jsonable_encoder(card))
         raise_for_bad_status(response)
 
         return CardRead.from_dict(response.json())
 
     def get_card(self, card_id: int) -> CardRead:
-        response = self._client.get(f"/api/cards/{card_id}")
+        response = self._client.get(f"{self.cards_path}/{card_id}")
         raise_for_bad_status(response)
 
         return CardRead.from_dict(response.json())
 
     def delete_card(self, card_id: int) -> None:
-        response = self._client.delete(f"/api/cards/{card_id}")
+        response = self._client.delete(f"{self.cards_path}/{card_id}")
         raise_for_bad_status(response)
 
     def update_card(self, card_id: int, card_updates: CardUpdate) -> None:
-        body = card_updates.dict(exclude_unset=True)
-        response = self._client.patch(f"/api/cards/{card_id}", json=body)
+        body = jsonable_encoder(card_updates, exclude_unset=True)
+        response = self._client.patch(f"{self.cards_path}/{card_id}", json=body)
         raise_for_bad_status(response)
 
     def get_card_count(self) -> int:
-        response = self._client.get("/api/cards/count/")
+        response = self._client.get(f"{self.cards_path}/count/")
         raise_for_bad_status(response)
 
         return response.json().get("count")
 
+    def get_dashboard(self, top: int = 10, days: int = 14) -> Dashboard:
+        response = self._client.get(f"{self.cards_path}/dashboard/", params={"top": top, "days": days})
+        raise_for_bad_status(response)
+
+        return Dashboard.from_dict(response.json())
+
+    def get_daily_stats(self, days: int = 30) -> list[DayThroughput]:
+        response = self._client.get(f"{self.cards_path}/stats/daily/", params={"days": days})
+        raise_for_bad_status(response)
+
+        return [DayThroughput.from_dict(day) for day in response.json()]
+
+    def get_cycle_times(self, days: int = 90, percentiles: list[int] | None = None) -> CycleTimes:
+        params = QueryParams(days=days) if percentiles is None else QueryParams(days=days, percentiles=percentiles)
+        response = self._client.get(f"{self.cards_path}/stats/cycle-times/", params=params)
+        raise_for_bad_status(response)
+
+        return CycleTimes.from_dict(response.json())
+
+    def wait_for_job(self, response: Response) -> JobRead:
+        """Poll the job a 202 response points to until it finishes"""
+        raise_for_bad_status(response)
+        job = JobRead.from_dict(response.json())
+        while not job.state.finished:
+            time.sleep(JOB_POLL_INTERVAL)
+            response = self._client.get(f"/api/jobs/{job.id}")
+            raise_for_bad_status(response)
+            job = JobRead.from_dict(response.json())
+
+        return job
+
+    def backfill_stats(self) -> RollupBackfill:
+        job = self.wait_for_job(self._client.post(f"{self.cards_path}/stats/backfill/"))
+
+        return RollupBackfill.from_dict(job_result(job))
+
+    def transition_cards(
+            self,
+            state: State,
+            card_ids: list[int] | None = None,
+            from_states: list[State] | None = None
+    ) -> int:
+        body = BulkTransition(state=state, card_ids=card_ids, from_states=from_states)
+        response = self._client.post(f"{self.cards_path}/transition/", json=jsonable_encoder(body, by_alias=True))
+        job = self.wait_for_job(response)
+
+        return BulkTransitioned.from_dict(job_result(job)).count
+
+    def add_tags(self, tags: list[str], card_ids: list[int]) -> None:
+        body = TagChange(tags=tags, card_ids=card_ids).dict(by_alias=True)
+        response = self._client.post(f"{self.cards_path}/tags/add/", json=body)
+        raise_for_bad_status(response)
+
+    def remove_tags(self, tags: list[str], card_ids: list[int]) -> None:
+        body = TagChange(tags=tags, card_ids=card_ids).dict(by_alias=True)
+        response = self._client.post(f"{self.cards_path}/tags/remove/", json=body)
+        raise_for_bad_status(response)
+
+    def get_card_tags(self, card_id: int) -> list[str]:
+        response = self._client.get(f"{self.cards_path}/{card_id}/tags/")
+        raise_for_bad_status(response)
+
+        return response.json()
+
+    def get_tag_counts(self) -> list[TagCount]:
+        response = self._client.get(f"{self.cards_path}/tags/")
+        raise_for_bad_status(response)
+
+        return [TagCount.from_dict(tag_count) for tag_count in response.json()]
+
+    def get_card_history(self, card_id: int, after_id: int | None = None, limit: int = 100) -> CardHistoryPage:
+        params = {"limit": limit} if after_id is None else {"after_id": after_id, "limit": limit}
+        response = self._client.get(f"{self.cards_path}/{card_id}/history/", params=params)
+        raise_for_bad_status(response)
+
+        return CardHistoryPage.from_dict(response.json())
+
+    def compact_history(self, older_than_days: int) -> HistoryCompaction:
+        params = {"older_than_days": older_than_days}
+        job = self.wait_for_job(self._client.post(f"{self.cards_path}/history/compact/", params=params))
+
+        return HistoryCompaction.from_dict(job_result(job))
+
+    def get_due_cards(self, within_hours: int = 24, limit: int = 100) -> list[CardRead]:
+        params = {"within_hours": within_hours, "limit": limit}
+        response = self._client.get(f"{self.cards_path}/due/", params=params)
+        raise_for_bad_status(response)
+
+        return [CardRead.from_dict(card) for card in response.json()]
+
+    def get_deleted_cards(
+            self,
+            after: tuple[pendulum.DateTime, int] | None = None,
+            limit: int = 100
+    ) -> list[Tombstone]:
+        """Cards deleted and not purged yet, keyed after the deletion time and id of the last one read"""
+        params = {"limit": limit}
+        if after is not None:
+            params |= {"after_dttm": str(after[0]), "after_id": after[1]}
+
+        response = self._client.get(f"{self.cards_path}/deleted/", params=params)
+        raise_for_bad_status(response)
+
+        return [Tombstone.from_dict(tombstone) for tombstone in response.json()]
+
+    def get_cards_version(self) -> str:
+        response = self._client.get(f"{self.cards_path}/version/")
+        raise_for_bad_status(response)
+
+        return response.json().get("version")
+
     def get_cards(
             self,
             lowest_create_date: pendulum.Date | None = None,
             highest_create_date: pendulum.Date | None = None,
             priorities: list[Priority] | None = None,
-            states: list[State] | None = None
-    ) -> list[CardRead]:
-        query_params_data = {}
-        if lowest_create_date is not None:
-            query_params_data["lowest_create_date"] = lowest_create_date
-
-        if highest_create_date is not None:
-            query_params_data["highest_create_date"] = highest_create_date
-
-        if priorities is not None:
-            priority_values = [priority.value for priority in priorities]
-            query_params_data["priorities"] = priority_values
+            states: list[State] | None = None,
+            fields: list[CardField] | None = None,
+            tags_all: list[str] | None = None,
+            tags_any: list[str] | None = None
+    ) -> list[CardRead | CardPartial]:
+        """Cards matching the filters, as partial cards holding only `fields` when given"""
+        page = self.get_cards_page(
+            lowest_create_date=lowest_create_date,
+            highest_create_date=highest_create_date,
+            priorities=priorities,
+            states=states,
+            fields=fields,
+            tags_all=tags_all,
+            tags_any=tags_any
+        )
+        return page.cards
+
+    def get_cards_page(self, *, after_id: int | None = None, limit: int | None = None, **filters) -> FilteredCards:
+        query_params = filter_query_params(after_id=after_id, limit=limit, **filters)
+        response = self._client.get(f"{self.cards_path}/filter/", params=query_params)
+        raise_for_bad_status(response)
 
-        if states is not None:
-            state_values = [state.value for state in states]
-            query_params_data["states"] = state_values
+        return FilteredCards.from_dict(response.json())
 
-        query_params = QueryParams(**query_params_data)
-        response = self._client.get("/api/cards/filter/", params=query_params)
+    def iter_card_pages(
+            self,
+            *,
+            page_size: int = 500,
+            limit: int | None = None,
+            after_id: int | None = None,
+            **filters
+    ) -> Iterator[list[CardRead]]:
+        """Yield pages of cards in id order until `limit` cards or the last page is read"""
+        n_read = 0
+        while (size := next_page_size(page_size, limit, n_read)) > 0:
+            page = self.get_cards_page(after_id=after_id, limit=size, **filters)
+            if page.cards:
+                yield page.cards
+
+            n_read += len(page.cards)
+            after_id = page.next_after_id
+            if after_id is None:
+                break
+
+    def bulk_create_cards(self, cards: list[CardImport], key: str | None = None) -> int:
+        """Create a batch of cards, resending one under the same `key` never creates it twice"""
+        body = [card.dict(by_alias=True, exclude_none=True) for card in cards]
+        response = self.send_idempotent("POST", f"{self.cards_path}/bulk/", key=key, json=jsonable_encoder(body))
         raise_for_bad_status(response)
 
-        return [CardRead.from_dict(item) for item in response.json()["cards"]]
+        return BulkCreated.from_dict(response.json()).count
+
+    def iter_export(self, after_id: int = 0) -> Iterator[CardRead]:
+        """Stream every card after `after_id` without buffering the whole export"""
+        params = {"after_id": after_id}
+        with self._client.stream("GET", f"{self.cards_path}/export/", params=params, timeout=None) as response:
+            raise_for_bad_status(response)
+            for line in response.iter_lines():
+                if line:
+                    yield CardRead.parse_raw(line)
+
+    def get_card_columns(self, **filters) -> dict[str, list]:
+        """
+        Every card matching the filters as one list or array per field, read in
+        columnar pages so no object is built per card. Needs msgpack.
+        """
+        columns = {}
+        after_id = None
+        while True:
+            query_params = filter_query_params(after_id=after_id, limit=COLUMNAR_PAGE_SIZE, **filters)
+            response = self._client.get(f"{self.cards_path}/filter/", params=query_params, headers=COLUMNAR_HEADERS)
+            raise_for_bad_status(response)
+
+            page = decode_page(response.content)
+            merge_columns(columns, decode_cards(page))
+            after_id = page["nextAfterId"]
+            if after_id is None:
+                return columns
+
+    def iter_export_columns(self, after_id: int = 0) -> Iterator[dict[str, list]]:
+        """Stream the export as columnar pages, one dict of field columns per page. Needs msgpack."""
+        params = {"after_id": after_id}
+        unpacker = page_unpacker()
+        with self._client.stream(
+                "GET", f"{self.cards_path}/export/", params=params, headers=COLUMNAR_HEADERS, timeout=None
+        ) as response:
+            raise_for_bad_status(response)
+            for chunk in response.iter_bytes():
+                unpacker.feed(chunk)
+                for page in unpacker:
+                    yield decode_cards(page)
 
     def start_card(self, card_id: int) -> None:
-        response = self._client.patch(f"/api/cards/start/{card_id}")
+        response = self.send_idempotent("PATCH", f"{self.cards_path}/start/{card_id}")
         raise_for_bad_status(response)
 
     def finish_card(self, card_id: int) -> None:
-        response = self._client.patch(f"/api/cards/finish/{card_id}")
+        response = self.send_idempotent("PATCH", f"{self.cards_path}/finish/{card_id}")
         raise_for_bad_status(response)
 
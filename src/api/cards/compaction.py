@@ -0,0 +1,71 @@
+"""History Compaction"""
+import asyncio
+import contextlib
+import contextvars
+from collections.abc import Callable
+
+import pendulum
+from loguru import logger
+
+from .reminders import OpenRepository
+
+
+class HistoryCompactor:
+    """
+    Every `interval` seconds, fold the history older than `retention_days`
+    on each board in use into snapshots, so history grows with the number
+    of cards rather than with the number of changes made to them.
+    """
+
+    def __init__(
+            self,
+            open_repository: OpenRepository,
+            boards: Callable[[], list[str]],
+            *,
+            retention_days: int,
+            interval: float,
+            batch_size: int,
+            on_change: Callable[[str], None] = lambda board: None
+    ):
+        self.open_repository = open_repository
+        self.boards = boards
+        self.retention_days = retention_days
+        self.interval = interval
+        self.batch_size = batch_size
+        self.on_change = on_change
+        self._task: asyncio.Task | None = None
+
+    def start(self) -> None:
+        # A fresh context so compaction never inherits a request's board or connection
+        self._task = asyncio.create_task(self._run(), context=contextvars.Context())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._task
+
+            self._task = None
+
+    async def compact(self, board: str) -> None:
+        before = pendulum.now().subtract(days=self.retention_days)
+        async with self.open_repository(board) as repository:
+            compaction = await repository.compact_history(before=before, batch_size=self.batch_size)
+
+        if compaction.folded:
+            self.on_change(board)
+            logger.info(
+                "Folded {folded} history entries of {cards} cards on board {board}",
+                folded=compaction.folded,
+                cards=compaction.cards,
+                board=board,
+            )
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            for board in self.boards():
+                try:
+                    await self.compact(board)
+                except Exception:
+                    logger.exception("History compaction of board {board} failed", board=board)
@@ -0,0 +1,80 @@
+"""
+Card History
+
+Every card mutation appends an entry holding the old and new value of each
+field it changed, written in the same transaction as the change itself.
+Compaction folds the entries of a card older than the retention period into
+one snapshot, whose changes go from the state before the first folded entry
+to the state after the last one.
+"""
+import datetime as dt
+from collections.abc import Iterable, Mapping
+from enum import Enum
+
+from fastapi import Header
+
+from .models import CardRead, HistoryKind, State
+
+HISTORY_FIELDS = tuple(field for field in CardRead.__fields__ if field != "id")
+
+ACTOR_HEADER = Header(
+    None,
+    alias="X-Actor",
+    max_length=100,
+    description="Who is making the change, recorded in the card history",
+)
+
+
+def history_value(value):
+    """JSON friendly form of a card field, timestamps in the naive wall clock time sqlite stores"""
+    if isinstance(value, Enum):
+        return value.value
+
+    if isinstance(value, dt.datetime):
+        return value.replace(tzinfo=None).isoformat()
+
+    if isinstance(value, dt.date):
+        return value.isoformat()
+
+    return value
+
+
+def card_values(card) -> dict:
+    return {field: getattr(card, field) for field in HISTORY_FIELDS}
+
+
+def field_changes(before: Mapping | None, after: Mapping | None) -> dict[str, dict]:
+    """Old and new value of every field that differs, a missing side counts as all fields empty"""
+    before = before or {}
+    after = after or {}
+    changes = {}
+    for field in HISTORY_FIELDS:
+        old, new = history_value(before.get(field)), history_value(after.get(field))
+        if old != new:
+            changes[field] = {"old": old, "new": new}
+
+    return changes
+
+
+def update_kind(changes: Mapping) -> HistoryKind:
+    """Kind of entry for an update, by the state it moves the card to"""
+    match changes.get("state"):
+        case State.IN_PROGRESS:
+            return HistoryKind.STARTED
+        case State.DONE:
+            return HistoryKind.FINISHED
+        case _:
+            return HistoryKind.UPDATED
+
+
+def fold_changes(entries: Iterable[Mapping[str, Mapping]]) -> dict[str, dict]:
+    """Net changes of consecutive entries, dropping fields that ended where they started"""
+    folded = {}
+    for changes in entries:
+        for field, change in changes.items():
+            if field in folded:
+                folded[field]["new"] = change["new"]
+            else:
+                folded[field] = {"old": change["old"], "new": change["new"]}
+
+    return {field: change for field, change in folded.items() if change["old"] != change["new"]}
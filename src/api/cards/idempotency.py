@@ -0,0 +1,170 @@
+"""Idempotent Card Writes"""
+import datetime as dt
+import hashlib
+import time
+from collections import OrderedDict
+from collections.abc import Awaitable, Callable
+from typing import Any, NamedTuple
+
+import pendulum
+from fastapi import Header, HTTPException, Response, status
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from api.config import get_settings
+from api.database import current_board, database
+from api.writes import companion_write, writes
+from .models import IdempotencyRecord
+from .service import SingleFlight, uses_sqlite
+
+settings = get_settings()
+
+IDEMPOTENCY_KEY_HEADER = Header(
+    None,
+    alias="Idempotency-Key",
+    min_length=1,
+    max_length=255,
+    description="Client generated key; retrying a request with the same key replays the first response",
+)
+
+
+class StoredResponse(NamedTuple):
+    fingerprint: str
+    status_code: int
+    body: str
+    # Naive wall clock time, the way sqlite stores it
+    created_dttm: dt.datetime
+
+
+def fingerprint(*parts) -> str:
+    """Hash of the request a key was first used for, to catch a key reused for another request"""
+    return hashlib.sha256(repr(parts).encode()).hexdigest()
+
+
+def stored_response(request_fingerprint: str, response: Response) -> StoredResponse:
+    return StoredResponse(request_fingerprint, response.status_code, response.body.decode(), pendulum.now().naive())
+
+
+class IdempotencyStore:
+    """
+    Responses by board and Idempotency-Key, kept for `ttl` seconds.
+
+    The sqlite backend keeps them in each board's `idempotency_keys` table
+    in front of a small LRU cache. A key is recorded in the same write as
+    the change it guards, so either both commit or neither does, and
+    expired keys are deleted at most once per `purge_interval` seconds
+    through the created_dttm index. The memory backend only has the cache,
+    which matches the lifetime of its cards.
+    """
+
+    def __init__(self, ttl: int, cache_size: int, purge_interval: int):
+        self.ttl = ttl
+        self.cache_size = cache_size
+        self.purge_interval = purge_interval
+        self._cache: OrderedDict[tuple[str, str], StoredResponse] = OrderedDict()
+        self._last_purge: dict[str, float] = {}
+
+    def _expires_before(self) -> dt.datetime:
+        return pendulum.now().naive().subtract(seconds=self.ttl)
+
+    def _remember(self, cache_key: tuple[str, str], response: StoredResponse) -> None:
+        self._cache[cache_key] = response
+        self._cache.move_to_end(cache_key)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    async def get(self, key: str) -> StoredResponse | None:
+        cache_key = (current_board.get(), key)
+        response = self._cache.get(cache_key)
+        if response is None and uses_sqlite():
+            record = await IdempotencyRecord.objects.get_or_none(key=key)
+            if record is not None:
+                response = StoredResponse(
+                    record.fingerprint, record.status_code, record.body, record.created_dttm.replace(tzinfo=None)
+                )
+
+        if response is None or response.created_dttm < self._expires_before():
+            self._cache.pop(cache_key, None)
+            return None
+
+        self._remember(cache_key, response)
+        return response
+
+    async def record(self, key: str, response: StoredResponse) -> None:
+        """Write the key's response from inside the write it belongs to, replacing an expired record of the key"""
+        table = IdempotencyRecord.Meta.table
+        await database.execute(
+            sqlite_insert(table)
+            .values(key=key, **response._asdict())
+            .on_conflict_do_update(index_elements=[table.c.key], set_=response._asdict())
+        )
+
+    async def remember(self, key: str, response: StoredResponse) -> None:
+        """Cache a response once its write has committed, and purge expired keys every now and then"""
+        board = current_board.get()
+        self._remember((board, key), response)
+        if not uses_sqlite():
+            return
+
+        if time.monotonic() - self._last_purge.get(board, float("-inf")) >= self.purge_interval:
+            self._last_purge[board] = time.monotonic()
+            expires_before = self._expires_before()
+            await writes.submit(
+                lambda: IdempotencyRecord.objects.filter(IdempotencyRecord.created_dttm < expires_before).delete()
+            )
+
+
+idempotency_keys = IdempotencyStore(
+    ttl=settings.idempotency.TTL_SECONDS,
+    cache_size=settings.idempotency.CACHE_SIZE,
+    purge_interval=settings.idempotency.PURGE_INTERVAL_SECONDS,
+)
+# Concurrent retries with the same key wait for the first one instead of running again
+key_flights = SingleFlight()
+
+
+async def idempotent(
+        key: str | None,
+        request_fingerprint: str,
+        func: Callable[[], Awaitable[Any]],
+        respond: Callable[[Any], Response]
+) -> Response:
+    """
+    Run `func` once per Idempotency-Key and replay its response to every retry.
+
+    `func` submits the write the key guards and returns its result, and
+    `respond` turns that result into the response. With sqlite `respond` is
+    also called on the result inside the write, so the key is recorded in
+    the same transaction as the change.
+    """
+    if key is None:
+        return respond(await func())
+
+    async def record(result) -> None:
+        await idempotency_keys.record(key, stored_response(request_fingerprint, respond(result)))
+
+    async def run_once() -> StoredResponse:
+        stored = await idempotency_keys.get(key)
+        if stored is None:
+            token = companion_write.set(record if uses_sqlite() else None)
+            try:
+                result = await func()
+            finally:
+                companion_write.reset(token)
+
+            stored = stored_response(request_fingerprint, respond(result))
+            await idempotency_keys.remember(key, stored)
+
+        return stored
+
+    stored = await key_flights.do(("idempotent", key), run_once)
+    if stored.fingerprint != request_fingerprint:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="Idempotency-Key was already used for a different request",
+        )
+
+    return Response(
+        content=stored.body,
+        status_code=stored.status_code,
+        media_type="application/json" if stored.body else None,
+    )
@@ -0,0 +1,328 @@
+"""In-Memory Card Storage"""
+import bisect
+import datetime as dt
+import heapq
+from collections import defaultdict
+from collections.abc import Callable
+
+import pendulum
+
+from .history import card_values, field_changes, fold_changes, update_kind
+from .models import (
+    CardField, CardPartial, CardRead, Dashboard, DayCount, DayStats, HistoryCompaction, HistoryEvent, HistoryKind,
+    Priority, RollupBackfill, State, TagCount, Tombstone
+)
+from .repository import (
+    PRIORITY_RANK, CardRepository, DueKey, TombstoneKey, day_start, projected_columns, timestamps
+)
+from .rollup import card_deltas, group_deltas
+
+
+def naive(dttm: dt.datetime) -> dt.datetime:
+    """Wall clock time without a zone, the way sqlite stores it, so all keys compare"""
+    return dttm.replace(tzinfo=None)
+
+
+def remove_sorted(keys: list, key) -> None:
+    position = bisect.bisect_left(keys, key)
+    if position < len(keys) and keys[position] == key:
+        del keys[position]
+
+
+class MemoryCardRepository(CardRepository):
+    """
+    Cards kept in process memory, for ephemeral deployments, tests and benchmarks.
+
+    Hash indexes map each state and priority to the ids that have it, and a
+    sorted index of (created_dttm, id) answers created date ranges with two
+    bisects. Tags map both ways between names and card ids. Filters intersect
+    the smallest candidate sets first. Open cards with a due date are also
+    kept sorted by (due_dttm, id). Deleted cards leave every index and are
+    kept as tombstones sorted by (deleted_dttm, id) until they are purged.
+    """
+
+    def __init__(self):
+        self._cards: dict[int, CardRead] = {}
+        self._last_id = 0
+        self._by_state: dict[State, set[int]] = defaultdict(set)
+        self._by_priority: dict[Priority, set[int]] = defaultdict(set)
+        self._by_created: list[tuple[dt.datetime, int]] = []
+        self._by_due: list[DueKey] = []
+        self._tombstones: list[TombstoneKey] = []
+        # Deleted cards still count in the rollup, so a backfill needs their timestamps until they are purged
+        self._deleted: dict[int, CardRead] = {}
+        self._by_tag: dict[str, set[int]] = defaultdict(set)
+        self._tags: dict[int, set[str]] = defaultdict(set)
+        self._history: dict[int, list[HistoryEvent]] = defaultdict(list)
+        self._last_event_id = 0
+        self._rollup: dict[dt.date, DayStats] = {}
+
+    def _index(self, card: CardRead) -> None:
+        self._by_state[card.state].add(card.id)
+        self._by_priority[card.priority].add(card.id)
+        bisect.insort(self._by_created, (naive(card.created_dttm), card.id))
+        if card.due_dttm is not None and card.finished_dttm is None:
+            bisect.insort(self._by_due, (naive(card.due_dttm), card.id))
+
+    def _unindex(self, card: CardRead) -> None:
+        self._by_state[card.state].discard(card.id)
+        self._by_priority[card.priority].discard(card.id)
+        remove_sorted(self._by_created, (naive(card.created_dttm), card.id))
+        if card.due_dttm is not None and card.finished_dttm is None:
+            remove_sorted(self._by_due, (naive(card.due_dttm), card.id))
+
+    def _record(self, card_id: int, kind: HistoryKind, changes: dict, actor: str | None) -> None:
+        self._last_event_id += 1
+        self._history[card_id].append(HistoryEvent(
+            id=self._last_event_id,
+            card_id=card_id,
+            kind=kind,
+            actor=actor,
+            changes=changes,
+            created_dttm=pendulum.now(),
+        ))
+
+    def _insert(self, values: dict, actor: str | None) -> CardRead:
+        self._last_id += 1
+        # Same defaults the cards table applies to missing columns
+        defaults = {"state": State.TODO, "priority": Priority.LOW, "created_dttm": pendulum.now()}
+        card = CardRead(
+            id=self._last_id,
+            **defaults | {key: value for key, value in values.items() if value is not None},
+        )
+        self._cards[card.id] = card
+        self._index(card)
+        group_deltas(card_deltas(None, timestamps(card)), days=self._rollup)
+        self._record(card.id, HistoryKind.CREATED, field_changes(None, card_values(card)), actor)
+        return card
+
+    async def get(self, card_id: int) -> CardRead | None:
+        return self._cards.get(card_id)
+
+    async def create(self, values: dict, actor: str | None = None) -> CardRead:
+        return self._insert(values, actor)
+
+    async def bulk_create(self, values: list[dict], actor: str | None = None) -> int:
+        for values_ in values:
+            self._insert(values_, actor)
+
+        return len(values)
+
+    async def update(self, card_id: int, *, actor: str | None = None, **changes) -> None:
+        card = self._cards.get(card_id)
+        if card is None:
+            return
+
+        # Cards are replaced rather than mutated so readers holding the old one never see a half update
+        updated_card = card.copy(update=changes)
+        self._unindex(card)
+        self._cards[card_id] = updated_card
+        self._index(updated_card)
+        group_deltas(card_deltas(timestamps(card), timestamps(updated_card)), days=self._rollup)
+        self._record(
+            card_id,
+            update_kind(changes),
+            field_changes(card_values(card), card_values(updated_card)),
+            actor,
+        )
+
+    async def update_many(
+            self,
+            card_ids: list[int],
+            changes_for: Callable[[CardRead], dict | None],
+            *,
+            actor: str | None = None
+    ) -> int:
+        n_updated = 0
+        for card_id in card_ids:
+            card = self._cards.get(card_id)
+            if card is not None and (changes := changes_for(card)):
+                await self.update(card_id, actor=actor, **changes)
+                n_updated += 1
+
+        return n_updated
+
+    async def delete(self, card_id: int, actor: str | None = None) -> None:
+        card = self._cards.pop(card_id, None)
+        if card is not None:
+            self._unindex(card)
+            await self.remove_tags(list(self._tags.get(card_id, ())), [card_id])
+            self._record(card_id, HistoryKind.DELETED, field_changes(card_values(card), None), actor)
+            bisect.insort(self._tombstones, (naive(pendulum.now()), card_id))
+            self._deleted[card_id] = card
+
+    async def count(self) -> int:
+        return len(self._cards)
+
+    def _created_between(self, lowest: dt.datetime | None, highest: dt.datetime | None) -> set[int]:
+        start = 0 if lowest is None else bisect.bisect_left(self._by_created, (lowest, 0))
+        end = (
+            len(self._by_created) if highest is None
+            else bisect.bisect_right(self._by_created, (highest, float("inf")))
+        )
+        return {card_id for _, card_id in self._by_created[start:end]}
+
+    async def filter(
+            self,
+            *,
+            states: list[State] | None = None,
+            priorities: list[Priority] | None = None,
+            lowest_create_date: pendulum.Date | None = None,
+            highest_create_date: pendulum.Date | None = None,
+            tags_all: list[str] | None = None,
+            tags_any: list[str] | None = None,
+            after_id: int | None = None,
+            limit: int | None = None,
+            fields: list[CardField] | None = None
+    ) -> list[CardRead | CardPartial]:
+        candidates = []
+        if states is not None:
+            candidates.append(set().union(*(self._by_state[state] for state in states)))
+
+        if priorities is not None:
+            candidates.append(set().union(*(self._by_priority[priority] for priority in priorities)))
+
+        if lowest_create_date is not None or highest_create_date is not None:
+            # Dates compare like sqlite compares them to timestamps, as midnight of that day
+            candidates.append(self._created_between(
+                None if lowest_create_date is None else day_start(lowest_create_date),
+                None if highest_create_date is None else day_start(highest_create_date),
+            ))
+
+        if tags_all:
+            candidates.extend(self._by_tag.get(tag, set()) for tag in set(tags_all))
+
+        if tags_any:
+            candidates.append(set().union(*(self._by_tag.get(tag, set()) for tag in tags_any)))
+
+        if candidates:
+            candidates.sort(key=len)
+            card_ids = candidates[0].intersection(*candidates[1:])
+        else:
+            card_ids = self._cards.keys()
+
+        if after_id is not None:
+            card_ids = (card_id for card_id in card_ids if card_id > after_id)
+
+        card_ids = sorted(card_ids)
+        if limit is not None:
+            card_ids = card_ids[:limit]
+
+        if fields is not None:
+            columns = set(projected_columns(fields))
+            return [CardPartial(**self._cards[card_id].dict(include=columns)) for card_id in card_ids]
+
+        return [self._cards[card_id] for card_id in card_ids]
+
+    async def add_tags(self, tags: list[str], card_ids: list[int]) -> None:
+        for card_id in card_ids:
+            if card_id in self._cards:
+                self._tags[card_id].update(tags)
+                for tag in tags:
+                    self._by_tag[tag].add(card_id)
+
+    async def remove_tags(self, tags: list[str], card_ids: list[int]) -> None:
+        for card_id in card_ids:
+            card_tags = self._tags.get(card_id)
+            if card_tags is None:
+                continue
+
+            card_tags.difference_update(tags)
+            if not card_tags:
+                del self._tags[card_id]
+
+            for tag in tags:
+                tag_cards = self._by_tag.get(tag)
+                if tag_cards is not None:
+                    tag_cards.discard(card_id)
+                    if not tag_cards:
+                        del self._by_tag[tag]
+
+    async def card_tags(self, card_id: int) -> list[str]:
+        return sorted(self._tags.get(card_id, ()))
+
+    async def tag_counts(self) -> list[TagCount]:
+        counts = sorted(self._by_tag.items(), key=lambda item: (-len(item[1]), item[0]))
+        return [TagCount(name=tag, count=len(card_ids)) for tag, card_ids in counts]
+
+    async def history(self, card_id: int, *, after_id: int | None = None, limit: int) -> list[HistoryEvent]:
+        events = self._history.get(card_id, [])
+        start = 0 if after_id is None else bisect.bisect_right(events, after_id, key=lambda event: event.id)
+        return events[start:start + limit]
+
+    async def compact_history(self, before: dt.datetime, batch_size: int) -> HistoryCompaction:
+        before = naive(before)
+        n_cards = n_folded = 0
+        for card_id, events in self._history.items():
+            n_old = bisect.bisect_left(events, before, key=lambda event: naive(event.created_dttm))
+            if n_old < 2:
+                continue
+
+            old_events = events[:n_old]
+            snapshot = HistoryEvent(**old_events[-1].dict() | {
+                "kind": HistoryKind.SNAPSHOT,
+                "actor": None,
+                "changes": fold_changes(event.dict()["changes"] for event in old_events),
+                "folded": sum(event.folded for event in old_events),
+            })
+            self._history[card_id] = [snapshot] + events[n_old:]
+            n_cards += 1
+            n_folded += n_old
+
+        return HistoryCompaction(cards=n_cards, folded=n_folded)
+
+    async def due(self, *, after: DueKey | None = None, until: dt.datetime | None = None, limit: int) -> list[CardRead]:
+        start = 0 if after is None else bisect.bisect_right(self._by_due, (naive(after[0]), after[1]))
+        end = len(self._by_due) if until is None else bisect.bisect_right(self._by_due, (naive(until), float("inf")))
+        return [self._cards[card_id] for _, card_id in self._by_due[start:min(end, start + limit)]]
+
+    async def deleted(self, *, after: TombstoneKey | None = None, limit: int) -> list[Tombstone]:
+        start = 0 if after is None else bisect.bisect_right(self._tombstones, (naive(after[0]), after[1]))
+        return [
+            Tombstone(id=card_id, deleted_dttm=deleted_dttm)
+            for deleted_dttm, card_id in self._tombstones[start:start + limit]
+        ]
+
+    async def purge(self, before: dt.datetime, limit: int) -> int:
+        n_purged = min(limit, bisect.bisect_left(self._tombstones, (naive(before), 0)))
+        for _, card_id in self._tombstones[:n_purged]:
+            self._deleted.pop(card_id, None)
+        del self._tombstones[:n_purged]
+        return n_purged
+
+    async def vacuum(self, pages: int) -> int:
+        return 0
+
+    async def dashboard(self, top: int, days: int) -> Dashboard:
+        since = naive(pendulum.today().subtract(days=days - 1))
+        finished_per_day = defaultdict(int)
+        for card_id in self._by_state[State.DONE]:
+            finished_dttm = self._cards[card_id].finished_dttm
+            if finished_dttm is not None and naive(finished_dttm) >= since:
+                finished_per_day[finished_dttm.date()] += 1
+
+        open_ids = self._by_state[State.TODO] | self._by_state[State.IN_PROGRESS]
+        top_cards = heapq.nsmallest(
+            top,
+            (self._cards[card_id] for card_id in open_ids),
+            key=lambda card: (PRIORITY_RANK[card.priority], naive(card.created_dttm), card.id),
+        )
+
+        return Dashboard(
+            states={state: len(self._by_state[state]) for state in State},
+            priorities={priority: len(self._by_priority[priority]) for priority in Priority},
+            finished_per_day=[DayCount(day=day, count=count) for day, count in sorted(finished_per_day.items())],
+            top_cards=top_cards,
+        )
+
+    async def daily_stats(self, since: dt.date) -> list[DayStats]:
+        return [self._rollup[day].copy(deep=True) for day in sorted(self._rollup) if day >= since]
+
+    async def backfill_rollup(self) -> RollupBackfill:
+        days = {}
+        cards = [*self._cards.values(), *self._deleted.values()]
+        for card in cards:
+            group_deltas(card_deltas(None, timestamps(card)), days=days)
+
+        self._rollup = days
+        return RollupBackfill(cards=len(cards), days=len(days))
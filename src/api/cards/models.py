@@ -1,8 +1,10 @@
 """Card Database Model"""
 import pendulum
-from ormar import DateTime, Integer, String, Text
+import sqlalchemy
+from ormar import JSON, Date, DateTime, Float, Integer, String, Text
 from ormar import Enum as OrmarEnum
 from enum import Enum
+from pydantic import Field, constr
 
 from api.bases import PydanticBaseModel
 from api.bases import OrmarBaseModel
@@ -58,6 +60,134 @@ class Card(OrmarBaseModel):
     created_dttm: pendulum.DateTime = DateTime(default=pendulum.now)
     started_dttm: pendulum.DateTime | None = DateTime(nullable=True)
     finished_dttm: pendulum.DateTime | None = DateTime(nullable=True)
+    due_dttm: pendulum.DateTime | None = DateTime(nullable=True)
+    # Set when the card is deleted, the row stays as a tombstone until it is purged
+    deleted_dttm: pendulum.DateTime | None = DateTime(nullable=True)
+
+
+# Purged ids are never handed out again, a mirror or a stale client must not mistake a new card for the deleted one
+Card.Meta.table.dialect_options["sqlite"]["autoincrement"] = True
+
+# Every read skips tombstones, so counts and state and priority aggregates are covered by the live rows alone
+sqlalchemy.Index(
+    "ix_cards_live_state_priority",
+    Card.Meta.table.c.state,
+    Card.Meta.table.c.priority,
+    sqlite_where=Card.Meta.table.c.deleted_dttm.is_(None),
+)
+
+# Holds nothing but tombstones, for mirrors following deletions and for the purge job
+sqlalchemy.Index(
+    "ix_cards_tombstones",
+    Card.Meta.table.c.deleted_dttm,
+    Card.Meta.table.c.id,
+    sqlite_where=Card.Meta.table.c.deleted_dttm.is_not(None),
+)
+
+# Only open cards get reminders, so finished ones are left out of the index that feeds them
+sqlalchemy.Index(
+    "ix_cards_open_due_dttm",
+    Card.Meta.table.c.due_dttm,
+    Card.Meta.table.c.id,
+    sqlite_where=Card.Meta.table.c.finished_dttm.is_(None),
+)
+
+
+class HistoryKind(str, Enum):
+    CREATED = 'created'
+    UPDATED = 'updated'
+    STARTED = 'started'
+    FINISHED = 'finished'
+    DELETED = 'deleted'
+    SNAPSHOT = 'snapshot'
+
+
+class CardHistory(OrmarBaseModel):
+    """
+    One append-only entry per card mutation, holding the old and new value of
+    every field it changed. Compaction folds old entries of a card into a
+    single snapshot entry that keeps the id of the last one it replaced.
+    """
+
+    class Meta:
+        database = database
+        metadata = metadata
+        tablename = "card_history"
+
+    id: int = Integer(primary_key=True)
+    # No foreign key, history outlives the cards it describes
+    card_id: int = Integer(nullable=False)
+    kind: HistoryKind = OrmarEnum(nullable=False, enum_class=HistoryKind)
+    actor: str | None = String(max_length=100, nullable=True)
+    changes: dict = JSON(nullable=False)
+    folded: int = Integer(default=1, nullable=False)
+    created_dttm: pendulum.DateTime = DateTime(default=pendulum.now, index=True)
+
+
+# A card's history is paged on id, so it is one range of this index per page
+sqlalchemy.Index("ix_card_history_card_id_id", CardHistory.Meta.table.c.card_id, CardHistory.Meta.table.c.id)
+
+
+TAG_PATTERN = r"^[a-z0-9][a-z0-9_:-]*$"
+# Tags are matched exactly, so they are trimmed and lower cased on the way in
+TagName = constr(strip_whitespace=True, to_lower=True, min_length=1, max_length=50, regex=TAG_PATTERN)
+
+
+class Tag(OrmarBaseModel):
+    """Tag names, stored once and linked to cards through `card_tags`"""
+
+    class Meta:
+        database = database
+        metadata = metadata
+        tablename = "tags"
+
+    id: int = Integer(primary_key=True)
+    name: str = String(max_length=50, nullable=False, unique=True)
+
+
+# Keyed on (card_id, tag_id) to list a card's tags, indexed on (tag_id, card_id) to list a tag's cards.
+# Without a rowid both are covering, so tag filters never touch the table itself.
+card_tags = sqlalchemy.Table(
+    "card_tags",
+    metadata,
+    sqlalchemy.Column("card_id", sqlalchemy.Integer, sqlalchemy.ForeignKey("cards.id"), primary_key=True),
+    sqlalchemy.Column("tag_id", sqlalchemy.Integer, sqlalchemy.ForeignKey("tags.id"), primary_key=True),
+    sqlalchemy.Index("ix_card_tags_tag_id_card_id", "tag_id", "card_id"),
+    sqlite_with_rowid=False,
+)
+
+
+class IdempotencyRecord(OrmarBaseModel):
+    """Response to a request sent with an Idempotency-Key, replayed when the request is retried"""
+
+    class Meta:
+        database = database
+        metadata = metadata
+        tablename = "idempotency_keys"
+
+    key: str = String(primary_key=True, max_length=255)
+    fingerprint: str = String(max_length=64, nullable=False)
+    status_code: int = Integer(nullable=False)
+    body: str = Text(nullable=False)
+    created_dttm: pendulum.DateTime = DateTime(default=pendulum.now, index=True)
+
+
+class CardDailyStats(OrmarBaseModel):
+    """Cards created, started and finished on a day, with histograms of how long the finished ones took"""
+
+    class Meta:
+        database = database
+        metadata = metadata
+        tablename = "card_daily_stats"
+
+    day: pendulum.Date = Date(primary_key=True, autoincrement=False)
+    created: int = Integer(default=0, nullable=False)
+    started: int = Integer(default=0, nullable=False)
+    finished: int = Integer(default=0, nullable=False)
+    lead_time_seconds: float = Float(default=0, nullable=False)
+    cycle_time_seconds: float = Float(default=0, nullable=False)
+    lead_time_histogram: list[int] = JSON(nullable=False)
+    cycle_time_histogram: list[int] = JSON(nullable=False)
 
 
 class CardCreate(PydanticBaseModel):
@@ -65,12 +195,35 @@ class CardCreate(PydanticBaseModel):
     summary: str | None
     state: State = State.TODO
     priority: Priority = Priority.LOW
+    due_dttm: pendulum.DateTime | None
+
+
+class CardImport(CardCreate):
+    created_dttm: pendulum.DateTime | None
+    started_dttm: pendulum.DateTime | None
+    finished_dttm: pendulum.DateTime | None
+
+
+class BulkCreated(PydanticBaseModel):
+    count: int
+
+
+class BulkTransition(PydanticBaseModel):
+    state: State
+    # Cards to move, every live card when left out, narrowed to cards in `from_states` when given
+    card_ids: list[int] | None = Field(None, min_items=1)
+    from_states: list[State] | None = Field(None, min_items=1)
+
+
+class BulkTransitioned(PydanticBaseModel):
+    count: int
 
 
 class CardUpdate(PydanticBaseModel):
     title: str | None
     summary: str | None
     priority: Priority | None
+    due_dttm: pendulum.DateTime | None
 
 
 class CardRead(PydanticBaseModel):
@@ -82,6 +235,7 @@ class CardRead(PydanticBaseModel):
     created_dttm: pendulum.DateTime
     started_dttm: pendulum.DateTime | None
     finished_dttm: pendulum.DateTime | None
+    due_dttm: pendulum.DateTime | None
 
     def __repr__(self):
         return f"<Card {self.id} - {self.state.name}>"
@@ -93,10 +247,36 @@ class CardRead(PydanticBaseModel):
         yield "..."
 
 
+class CardField(str, Enum):
+    ID = 'id'
+    TITLE = 'title'
+    SUMMARY = 'summary'
+    STATE = 'state'
+    PRIORITY = 'priority'
+    CREATED_DTTM = 'created_dttm'
+    STARTED_DTTM = 'started_dttm'
+    FINISHED_DTTM = 'finished_dttm'
+    DUE_DTTM = 'due_dttm'
+
+
+class CardPartial(PydanticBaseModel):
+    """Card with only the fields a sparse fieldset asked for, the rest are left unset"""
+    id: int
+    title: str | None
+    summary: str | None
+    state: State | None
+    priority: Priority | None
+    created_dttm: pendulum.DateTime | None
+    started_dttm: pendulum.DateTime | None
+    finished_dttm: pendulum.DateTime | None
+    due_dttm: pendulum.DateTime | None
+
+
 class Operator(str, Enum):
     LESS_THAN = '<'
     GREATER_THAN = '>'
     IN = 'in'
+    ALL = 'all'
 
 
 class Filter(PydanticBaseModel):
@@ -105,7 +285,95 @@ class Filter(PydanticBaseModel):
     value: Any
 
 
+class FieldChange(PydanticBaseModel):
+    old: Any
+    new: Any
+
+
+class HistoryEvent(PydanticBaseModel):
+    id: int
+    card_id: int
+    kind: HistoryKind
+    actor: str | None
+    changes: dict[str, FieldChange]
+    folded: int = 1
+    created_dttm: pendulum.DateTime
+
+
+class CardHistoryPage(PydanticBaseModel):
+    events: list[HistoryEvent]
+    next_after_id: int | None = None
+
+
+class HistoryCompaction(PydanticBaseModel):
+    cards: int
+    folded: int
+
+
+class Tombstone(PydanticBaseModel):
+    id: int
+    deleted_dttm: pendulum.DateTime
+
+
+class TagCount(PydanticBaseModel):
+    name: str
+    count: int
+
+
+class TagChange(PydanticBaseModel):
+    tags: list[TagName] = Field(..., min_items=1, max_items=100)
+    card_ids: list[int] = Field(..., min_items=1, max_items=1000)
+
+
+class DayCount(PydanticBaseModel):
+    day: pendulum.Date
+    count: int
+
+
+class Dashboard(PydanticBaseModel):
+    states: dict[State, int]
+    priorities: dict[Priority, int]
+    finished_per_day: list[DayCount]
+    top_cards: list[CardRead]
+
+
+class DayStats(PydanticBaseModel):
+    day: pendulum.Date
+    created: int = 0
+    started: int = 0
+    finished: int = 0
+    lead_time_seconds: float = 0
+    cycle_time_seconds: float = 0
+    lead_time_histogram: list[int]
+    cycle_time_histogram: list[int]
+
+
+class DayThroughput(PydanticBaseModel):
+    day: pendulum.Date
+    created: int
+    started: int
+    finished: int
+
+
+class DurationStats(PydanticBaseModel):
+    count: int
+    mean_seconds: float | None
+    percentile_seconds: dict[int, float]
+
+
+class CycleTimes(PydanticBaseModel):
+    days: int
+    lead_time: DurationStats
+    cycle_time: DurationStats
+
+
+class RollupBackfill(PydanticBaseModel):
+    cards: int
+    days: int
+
+
 class FilteredCards(PydanticBaseModel):
     offset: int
     filters: list[Filter]
-    cards: list[CardRead]
+    cards: list[CardRead | CardPartial]
+    next_after_id: int | None = None
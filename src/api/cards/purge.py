@@ -0,0 +1,89 @@
+"""Tombstone Purging"""
+import asyncio
+import contextlib
+import contextvars
+from collections.abc import Callable
+
+import pendulum
+from loguru import logger
+
+from .reminders import OpenRepository
+
+
+class TombstonePurger:
+    """
+    Every `interval` seconds, remove the cards deleted more than
+    `retention_hours` ago on each board in use, then hand the pages they
+    freed back to the file system with an incremental vacuum.
+
+    Tombstones are removed `batch_size` at a time, one write each, and the
+    purge of a board stops as soon as `idle` reports other writes waiting,
+    so a large backlog is worked off across idle periods instead of holding
+    the writer.
+    """
+
+    def __init__(
+            self,
+            open_repository: OpenRepository,
+            boards: Callable[[], list[str]],
+            idle: Callable[[str], bool],
+            *,
+            retention_hours: int,
+            interval: float,
+            batch_size: int,
+            vacuum_pages: int,
+            on_change: Callable[[str], None] = lambda board: None
+    ):
+        self.open_repository = open_repository
+        self.boards = boards
+        self.idle = idle
+        self.retention_hours = retention_hours
+        self.interval = interval
+        self.batch_size = batch_size
+        self.vacuum_pages = vacuum_pages
+        self.on_change = on_change
+        self._task: asyncio.Task | None = None
+
+    def start(self) -> None:
+        # A fresh context so purging never inherits a request's board or connection
+        self._task = asyncio.create_task(self._run(), context=contextvars.Context())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._task
+
+            self._task = None
+
+    async def purge(self, board: str) -> int:
+        before = pendulum.now().subtract(hours=self.retention_hours)
+        n_purged = 0
+        async with self.open_repository(board) as repository:
+            while self.idle(board):
+                n_batch = await repository.purge(before=before, limit=self.batch_size)
+                n_purged += n_batch
+                if n_batch < self.batch_size:
+                    break
+
+            released = await repository.vacuum(self.vacuum_pages) if n_purged else 0
+
+        if n_purged:
+            self.on_change(board)
+            logger.info(
+                "Purged {purged} deleted cards on board {board}, released {pages} pages",
+                purged=n_purged,
+                board=board,
+                pages=released,
+            )
+
+        return n_purged
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            for board in self.boards():
+                try:
+                    await self.purge(board)
+                except Exception:
+                    logger.exception("Purging deleted cards on board {board} failed", board=board)
@@ -0,0 +1,234 @@
+"""Due Date Reminders"""
+import asyncio
+import contextlib
+import contextvars
+import heapq
+from collections.abc import Awaitable, Callable
+from typing import AsyncContextManager
+
+import pendulum
+from loguru import logger
+
+from .models import CardRead
+from .repository import CardRepository, DueKey
+from .rollup import naive
+
+OpenRepository = Callable[[str], AsyncContextManager[CardRepository]]
+OnDue = Callable[[str, CardRead], Awaitable[None]]
+
+
+async def log_reminder(board: str, card: CardRead) -> None:
+    logger.info("Card {card_id} on board {board} is due: {title}", card_id=card.id, board=board, title=card.title)
+
+
+class ReminderScheduler:
+    """
+    Fires `on_due` for each open card of one board once its due date passes.
+
+    Only the next `batch_size` deadlines are held, in a heap. When it runs
+    dry the next batch is read from the open due date index, keyed after
+    the last deadline loaded, so the cards table is never scanned on a
+    timer. Due dates set while running are pushed in directly when they fall
+    inside the loaded window and left for the reload that reaches them
+    otherwise. Each entry is checked against its card before firing, so
+    cards finished, deleted or rescheduled since they were loaded are skipped.
+    """
+
+    def __init__(
+            self,
+            board: str,
+            open_repository: OpenRepository,
+            *,
+            batch_size: int,
+            max_sleep: float,
+            catch_up: float,
+            on_due: OnDue = log_reminder
+    ):
+        self.board = board
+        self.open_repository = open_repository
+        self.batch_size = batch_size
+        self.max_sleep = max_sleep
+        self.on_due = on_due
+        self.fired = 0
+        self.reloads = 0
+        self._heap: list[DueKey] = []
+        self._queued: set[DueKey] = set()
+        start: DueKey = (naive(pendulum.now().subtract(seconds=catch_up)), 0)
+        self._fired_until = start
+        self._loaded_until = start
+        # Whether the last load reached the end of the index, so every pending deadline is in the heap
+        self._exhausted = False
+        self._reload_requested = True
+        self._wake = asyncio.Event()
+        self._task: asyncio.Task | None = None
+
+    @property
+    def pending(self) -> int:
+        return len(self._heap)
+
+    def start(self) -> None:
+        # A fresh context so the scheduler never inherits a request's board or connection
+        self._task = asyncio.create_task(self._run(), context=contextvars.Context())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._task
+
+            self._task = None
+
+    def notify(self, card_id: int, due_dttm: pendulum.DateTime) -> None:
+        """Schedule a due date that was just set"""
+        key = (naive(due_dttm), card_id)
+        if self._exhausted or key <= self._loaded_until:
+            self._push(key)
+            self._trim()
+
+        self._wake.set()
+
+    def refresh(self) -> None:
+        """Reload from the index after due dates were written in bulk"""
+        self._loaded_until = self._fired_until
+        self._exhausted = False
+        self._reload_requested = True
+        self._wake.set()
+
+    def _push(self, key: DueKey) -> None:
+        if key not in self._queued:
+            heapq.heappush(self._heap, key)
+            self._queued.add(key)
+
+    def _pop(self) -> DueKey:
+        key = heapq.heappop(self._heap)
+        self._queued.discard(key)
+        return key
+
+    def _trim(self) -> None:
+        """Drop the latest deadlines beyond twice the batch size, they are read again when reached"""
+        if len(self._heap) <= 2 * self.batch_size:
+            return
+
+        self._heap = heapq.nsmallest(self.batch_size, self._heap)
+        self._queued = set(self._heap)
+        self._loaded_until = self._heap[-1]
+        self._exhausted = False
+
+    async def _reload(self) -> None:
+        async with self.open_repository(self.board) as repository:
+            cards = await repository.due(after=self._loaded_until, limit=self.batch_size)
+
+        self.reloads += 1
+        self._reload_requested = False
+        for card in cards:
+            self._push((naive(card.due_dttm), card.id))
+
+        if cards:
+            self._loaded_until = (naive(cards[-1].due_dttm), cards[-1].id)
+
+        self._exhausted = len(cards) < self.batch_size
+        self._trim()
+
+    async def _fire(self, key: DueKey) -> None:
+        due_dttm, card_id = key
+        async with self.open_repository(self.board) as repository:
+            card = await repository.get(card_id)
+
+        self._fired_until = max(self._fired_until, key)
+        if card is None or card.finished_dttm is not None or card.due_dttm is None or naive(card.due_dttm) != due_dttm:
+            return
+
+        try:
+            await self.on_due(self.board, card)
+        except Exception:
+            logger.exception("Reminder for card {card_id} on board {board} failed", card_id=card_id, board=self.board)
+
+        self.fired += 1
+
+    async def _run(self) -> None:
+        while True:
+            # Cleared before looking at the heap so a due date set while firing still wakes the next wait
+            self._wake.clear()
+            try:
+                if self._reload_requested or not self._heap and not self._exhausted:
+                    await self._reload()
+                    continue
+
+                now = naive(pendulum.now())
+                while self._heap and self._heap[0][0] <= now:
+                    await self._fire(self._pop())
+
+                if not self._heap and not self._exhausted:
+                    continue
+
+                # Sleep until the next deadline, waking early for a due date set in the meantime
+                timeout = self.max_sleep
+                if self._heap:
+                    timeout = min(timeout, (self._heap[0][0] - naive(pendulum.now())).total_seconds())
+            except Exception:
+                logger.exception("Reminder scheduler for board {board} failed", board=self.board)
+                timeout = self.max_sleep
+
+            with contextlib.suppress(asyncio.TimeoutError):
+                await asyncio.wait_for(self._wake.wait(), max(0.0, timeout))
+
+
+class ReminderRegistry:
+    """One reminder scheduler per board, started the first time a running server opens the board"""
+
+    def __init__(
+            self,
+            open_repository: OpenRepository,
+            *,
+            batch_size: int,
+            max_sleep: float,
+            catch_up: float,
+            on_due: OnDue = log_reminder
+    ):
+        self.open_repository = open_repository
+        self.batch_size = batch_size
+        self.max_sleep = max_sleep
+        self.catch_up = catch_up
+        self.on_due = on_due
+        self.running = False
+        self._schedulers: dict[str, ReminderScheduler] = {}
+
+    def start(self, *boards: str) -> None:
+        """Watch `boards` right away, any other board is watched once it is opened"""
+        self.running = True
+        for board in boards:
+            self.watch(board)
+
+    async def stop(self) -> None:
+        self.running = False
+        for scheduler in self._schedulers.values():
+            await scheduler.stop()
+
+        self._schedulers.clear()
+
+    def watch(self, board: str) -> ReminderScheduler | None:
+        if not self.running:
+            return None
+
+        scheduler = self._schedulers.get(board)
+        if scheduler is None:
+            scheduler = ReminderScheduler(
+                board,
+                self.open_repository,
+                batch_size=self.batch_size,
+                max_sleep=self.max_sleep,
+                catch_up=self.catch_up,
+                on_due=self.on_due,
+            )
+            self._schedulers[board] = scheduler
+            scheduler.start()
+
+        return scheduler
+
+    def notify(self, board: str, card_id: int, due_dttm: pendulum.DateTime | None) -> None:
+        if due_dttm is not None and (scheduler := self.watch(board)) is not None:
+            scheduler.notify(card_id, due_dttm)
+
+    def refresh(self, board: str) -> None:
+        if (scheduler := self.watch(board)) is not None:
+            scheduler.refresh()
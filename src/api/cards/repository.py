@@ -0,0 +1,578 @@
+"""Card Storage"""
+import datetime as dt
+import itertools
+from abc import ABC, abstractmethod
+from collections.abc import Callable
+
+import pendulum
+from sqlalchemy import and_, case, delete, func, insert, intersect, or_, select, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from api.database import database
+from api.writes import writes
+from .models import (
+    Card, CardDailyStats, CardField, CardHistory, CardPartial, CardRead, Dashboard, DayCount, DayStats,
+    HistoryCompaction, HistoryEvent, HistoryKind, Priority, RollupBackfill, State, Tag, TagCount, Tombstone, card_tags
+)
+from .history import card_values, field_changes, fold_changes, update_kind
+from .rollup import TIMESTAMP_FIELDS, RollupDelta, card_deltas, group_deltas
+
+PRIORITY_RANK = {priority: rank for rank, priority in enumerate(sorted(Priority))}
+
+# Due dates are paged on (due_dttm, id) so cards sharing a deadline are never skipped
+DueKey = tuple[dt.datetime, int]
+# Tombstones are paged the same way on (deleted_dttm, id)
+TombstoneKey = tuple[dt.datetime, int]
+
+
+def day_start(date: dt.date) -> dt.datetime:
+    """Dates compare against timestamps as midnight of that day"""
+    return dt.datetime(date.year, date.month, date.day)
+
+
+def timestamps(card) -> dict:
+    return {field: getattr(card, field) for field in TIMESTAMP_FIELDS}
+
+
+def projected_columns(fields: list[CardField]) -> list[str]:
+    """Columns to read for a sparse fieldset, always including the id cards are keyed and paged on"""
+    return [CardField.ID.value] + sorted({field.value for field in fields} - {CardField.ID.value})
+
+
+class CardRepository(ABC):
+    """Storage operations the card routes rely on"""
+
+    @abstractmethod
+    async def get(self, card_id: int) -> CardRead | None:
+        ...
+
+    @abstractmethod
+    async def create(self, values: dict, actor: str | None = None) -> CardRead:
+        ...
+
+    @abstractmethod
+    async def bulk_create(self, values: list[dict], actor: str | None = None) -> int:
+        ...
+
+    @abstractmethod
+    async def update(self, card_id: int, *, actor: str | None = None, **changes) -> None:
+        ...
+
+    @abstractmethod
+    async def update_many(
+            self,
+            card_ids: list[int],
+            changes_for: Callable[[CardRead], dict | None],
+            *,
+            actor: str | None = None
+    ) -> int:
+        """Apply what `changes_for` returns for each live card in `card_ids` in one write, returning how many changed"""
+
+    @abstractmethod
+    async def delete(self, card_id: int, actor: str | None = None) -> None:
+        ...
+
+    @abstractmethod
+    async def count(self) -> int:
+        ...
+
+    @abstractmethod
+    async def filter(
+            self,
+            *,
+            states: list[State] | None = None,
+            priorities: list[Priority] | None = None,
+            lowest_create_date: pendulum.Date | None = None,
+            highest_create_date: pendulum.Date | None = None,
+            tags_all: list[str] | None = None,
+            tags_any: list[str] | None = None,
+            after_id: int | None = None,
+            limit: int | None = None,
+            fields: list[CardField] | None = None
+    ) -> list[CardRead | CardPartial]:
+        """
+        Cards matching every given filter, in id order when paging with `after_id` or `limit`.
+        `tags_all` keeps cards that have every one of the tags, `tags_any` those with at least one.
+        With `fields` only those columns are read and partial cards are returned.
+        """
+
+    @abstractmethod
+    async def add_tags(self, tags: list[str], card_ids: list[int]) -> None:
+        """Tag every existing card in `card_ids` with every tag, creating tags as needed"""
+
+    @abstractmethod
+    async def remove_tags(self, tags: list[str], card_ids: list[int]) -> None:
+        ...
+
+    @abstractmethod
+    async def card_tags(self, card_id: int) -> list[str]:
+        """Tags of a card, in name order"""
+
+    @abstractmethod
+    async def tag_counts(self) -> list[TagCount]:
+        """Number of cards with each tag in use, most used first"""
+
+    @abstractmethod
+    async def due(self, *, after: DueKey | None = None, until: dt.datetime | None = None, limit: int) -> list[CardRead]:
+        """Open cards with a due date, soonest first, keyed after `after` and due no later than `until`"""
+
+    @abstractmethod
+    async def history(self, card_id: int, *, after_id: int | None = None, limit: int) -> list[HistoryEvent]:
+        """History of a card oldest first, paged on the entry id"""
+
+    @abstractmethod
+    async def compact_history(self, before: dt.datetime, batch_size: int) -> HistoryCompaction:
+        """Fold each card's entries from before `before` into one snapshot, `batch_size` cards per write"""
+
+    @abstractmethod
+    async def deleted(self, *, after: TombstoneKey | None = None, limit: int) -> list[Tombstone]:
+        """Cards deleted but not purged yet, oldest deletion first, keyed after `after`"""
+
+    @abstractmethod
+    async def purge(self, before: dt.datetime, limit: int) -> int:
+        """Remove up to `limit` cards deleted before `before` for good, returning how many were removed"""
+
+    @abstractmethod
+    async def vacuum(self, pages: int) -> int:
+        """Hand up to `pages` free pages back to the file system, returning how many were released"""
+
+    @abstractmethod
+    async def dashboard(self, top: int, days: int) -> Dashboard:
+        ...
+
+    @abstractmethod
+    async def daily_stats(self, since: dt.date) -> list[DayStats]:
+        """Rollup of every day from `since` on that had any events, in day order"""
+
+    @abstractmethod
+    async def backfill_rollup(self) -> RollupBackfill:
+        """Rebuild the rollup from the cards themselves"""
+
+
+class SqliteCardRepository(CardRepository):
+    """Cards stored in the current board's sqlite shard, written through the group commit queue"""
+
+    async def get(self, card_id: int) -> CardRead | None:
+        card = await Card.objects.get_or_none(id=card_id, deleted_dttm__isnull=True)
+        return None if card is None else CardRead.validate(card)
+
+    async def create(self, values: dict, actor: str | None = None) -> CardRead:
+        async def create_card():
+            card = await Card(**values).save()
+            await self._apply_rollup(card_deltas(None, timestamps(card)))
+            await CardHistory(
+                card_id=card.id,
+                kind=HistoryKind.CREATED,
+                actor=actor,
+                changes=field_changes(None, card_values(card)),
+            ).save()
+            return card
+
+        card = await writes.submit(create_card)
+        return CardRead.validate(card)
+
+    async def bulk_create(self, values: list[dict], actor: str | None = None) -> int:
+        table = Card.Meta.table
+
+        async def create_cards():
+            cards = [Card(**card_values) for card_values in values]
+            # Inserted one row at a time inside the same write, each card keeps the id sqlite actually gave it
+            for card in cards:
+                card.id = await database.execute(insert(table).values(card.prepare_model_to_save(card.dict())))
+                card.set_save_status(True)
+            await self._apply_rollup([delta for card in cards for delta in card_deltas(None, timestamps(card))])
+            await CardHistory.objects.bulk_create([
+                CardHistory(
+                    card_id=card.id,
+                    kind=HistoryKind.CREATED,
+                    actor=actor,
+                    changes=field_changes(None, card_values(card)),
+                )
+                for card in cards
+            ])
+            return len(cards)
+
+        return await writes.submit(create_cards)
+
+    @classmethod
+    async def _update_card(cls, before: Card, changes: dict, actor: str | None) -> None:
+        await Card.objects.filter(id=before.id).update(**changes)
+        before_values = card_values(before)
+        after_values = before_values | changes
+        await cls._apply_rollup(card_deltas(timestamps(before), after_values))
+        await CardHistory(
+            card_id=before.id,
+            kind=update_kind(changes),
+            actor=actor,
+            changes=field_changes(before_values, after_values),
+        ).save()
+
+    async def update(self, card_id: int, *, actor: str | None = None, **changes) -> None:
+        async def update_card():
+            before = await Card.objects.get_or_none(id=card_id, deleted_dttm__isnull=True)
+            if before is not None:
+                await self._update_card(before, changes, actor)
+
+        await writes.submit(update_card)
+
+    async def update_many(
+            self,
+            card_ids: list[int],
+            changes_for: Callable[[CardRead], dict | None],
+            *,
+            actor: str | None = None
+    ) -> int:
+        async def update_cards():
+            n_updated = 0
+            for before in await Card.objects.filter(id__in=card_ids, deleted_dttm__isnull=True).all():
+                if changes := changes_for(CardRead.validate(before)):
+                    await self._update_card(before, changes, actor)
+                    n_updated += 1
+
+            return n_updated
+
+        return await writes.submit(update_cards)
+
+    async def delete(self, card_id: int, actor: str | None = None) -> None:
+        async def delete_card():
+            before = await Card.objects.get_or_none(id=card_id, deleted_dttm__isnull=True)
+            if before is None:
+                return
+
+            # Only the tombstone is written now, the purge job removes the row later in small batches
+            await database.execute(delete(card_tags).where(card_tags.c.card_id == card_id))
+            await Card.objects.filter(id=card_id).update(deleted_dttm=pendulum.now())
+            await CardHistory(
+                card_id=card_id,
+                kind=HistoryKind.DELETED,
+                actor=actor,
+                changes=field_changes(card_values(before), None),
+            ).save()
+
+        await writes.submit(delete_card)
+
+    async def count(self) -> int:
+        table = Card.Meta.table
+        return await database.fetch_val(select(func.count()).select_from(table).where(table.c.deleted_dttm.is_(None)))
+
+    async def filter(
+            self,
+            *,
+            states: list[State] | None = None,
+            priorities: list[Priority] | None = None,
+            lowest_create_date: pendulum.Date | None = None,
+            highest_create_date: pendulum.Date | None = None,
+            tags_all: list[str] | None = None,
+            tags_any: list[str] | None = None,
+            after_id: int | None = None,
+            limit: int | None = None,
+            fields: list[CardField] | None = None
+    ) -> list[CardRead | CardPartial]:
+        table = Card.Meta.table
+        # Only the requested columns are selected, so unread summaries never leave the database
+        columns = [table] if fields is None else [table.c[column] for column in projected_columns(fields)]
+        query = select(*columns).where(table.c.deleted_dttm.is_(None))
+        if states is not None:
+            query = query.where(table.c.state.in_(states))
+
+        if priorities is not None:
+            query = query.where(table.c.priority.in_(priorities))
+
+        if lowest_create_date is not None:
+            query = query.where(table.c.created_dttm >= day_start(lowest_create_date))
+
+        if highest_create_date is not None:
+            query = query.where(table.c.created_dttm <= day_start(highest_create_date))
+
+        # Each tag reads its own range of the (tag_id, card_id) index, never the cards themselves
+        tags = Tag.Meta.table
+        if tags_all:
+            query = query.where(table.c.id.in_(intersect(*[
+                select(card_tags.c.card_id).join(tags).where(tags.c.name == tag) for tag in set(tags_all)
+            ])))
+
+        if tags_any:
+            query = query.where(table.c.id.in_(
+                select(card_tags.c.card_id).join(tags).where(tags.c.name.in_(tags_any))
+            ))
+
+        # Pages are keyed on id so each page is an index range scan instead of an offset scan. Unpaged reads
+        # are ordered too, as the partial index on live cards would otherwise hand them back in state order
+        query = query.order_by(table.c.id)
+        if after_id is not None:
+            query = query.where(table.c.id > after_id)
+
+        if limit is not None:
+            query = query.limit(limit)
+
+        card_model = CardRead if fields is None else CardPartial
+        return [card_model.from_dict(dict(row._mapping)) for row in await database.fetch_all(query)]
+
+    async def add_tags(self, tags: list[str], card_ids: list[int]) -> None:
+        cards, tag_table = Card.Meta.table, Tag.Meta.table
+
+        async def tag_cards():
+            await database.execute(
+                sqlite_insert(tag_table).values([{"name": tag} for tag in set(tags)]).on_conflict_do_nothing()
+            )
+            # Every link in one statement, ids that are not cards simply match nothing
+            await database.execute(
+                insert(card_tags).prefix_with("OR IGNORE").from_select(
+                    ["card_id", "tag_id"],
+                    select(cards.c.id, tag_table.c.id).where(
+                        cards.c.id.in_(card_ids),
+                        cards.c.deleted_dttm.is_(None),
+                        tag_table.c.name.in_(tags),
+                    ),
+                )
+            )
+
+        await writes.submit(tag_cards)
+
+    async def remove_tags(self, tags: list[str], card_ids: list[int]) -> None:
+        tag_table = Tag.Meta.table
+        await writes.submit(lambda: database.execute(
+            delete(card_tags).where(
+                card_tags.c.card_id.in_(card_ids),
+                card_tags.c.tag_id.in_(select(tag_table.c.id).where(tag_table.c.name.in_(tags))),
+            )
+        ))
+
+    async def card_tags(self, card_id: int) -> list[str]:
+        tags = Tag.Meta.table
+        rows = await database.fetch_all(
+            select(tags.c.name).join(card_tags).where(card_tags.c.card_id == card_id).order_by(tags.c.name)
+        )
+        return [row.name for row in rows]
+
+    async def tag_counts(self) -> list[TagCount]:
+        tags = Tag.Meta.table
+        count = func.count().label("count")
+        rows = await database.fetch_all(
+            select(tags.c.name, count).join(card_tags).group_by(tags.c.name).order_by(count.desc(), tags.c.name)
+        )
+        return [TagCount(name=row.name, count=row.count) for row in rows]
+
+    async def history(self, card_id: int, *, after_id: int | None = None, limit: int) -> list[HistoryEvent]:
+        history = CardHistory.Meta.table
+        query = select(history).where(history.c.card_id == card_id).order_by(history.c.id).limit(limit)
+        if after_id is not None:
+            query = query.where(history.c.id > after_id)
+
+        return [HistoryEvent.from_dict(dict(row._mapping)) for row in await database.fetch_all(query)]
+
+    async def compact_history(self, before: dt.datetime, batch_size: int) -> HistoryCompaction:
+        history = CardHistory.Meta.table
+        # Ids grow with time, so everything up to the newest entry before the cutoff is old enough
+        cutoff_id = await database.fetch_val(
+            select(history.c.id)
+            .where(history.c.created_dttm < before)
+            .order_by(history.c.created_dttm.desc(), history.c.id.desc())
+            .limit(1)
+        )
+        if cutoff_id is None:
+            return HistoryCompaction(cards=0, folded=0)
+
+        n_cards = n_folded = 0
+        after_card_id = None
+        while True:
+            query = (
+                select(history.c.card_id)
+                .where(history.c.id <= cutoff_id)
+                .group_by(history.c.card_id)
+                .having(func.count() > 1)
+                .order_by(history.c.card_id)
+                .limit(batch_size)
+            )
+            if after_card_id is not None:
+                query = query.where(history.c.card_id > after_card_id)
+
+            card_ids = [row.card_id for row in await database.fetch_all(query)]
+            if not card_ids:
+                break
+
+            # Each batch is its own write so compaction never holds the board's writer for long
+            n_folded += await writes.submit(lambda card_ids=card_ids: self._fold_history(card_ids, cutoff_id))
+            n_cards += len(card_ids)
+            after_card_id = card_ids[-1]
+
+        return HistoryCompaction(cards=n_cards, folded=n_folded)
+
+    @staticmethod
+    async def _fold_history(card_ids: list[int], cutoff_id: int) -> int:
+        """Replace the entries of each card up to `cutoff_id` with a snapshot under the id of the last one"""
+        history = CardHistory.Meta.table
+        rows = await database.fetch_all(
+            select(history)
+            .where(history.c.card_id.in_(card_ids), history.c.id <= cutoff_id)
+            .order_by(history.c.card_id, history.c.id)
+        )
+        n_folded = 0
+        for card_id, card_rows in itertools.groupby(rows, key=lambda row: row.card_id):
+            entries = [HistoryEvent.from_dict(dict(row._mapping)) for row in card_rows]
+            if len(entries) < 2:
+                continue
+
+            last = entries[-1]
+            await database.execute(
+                delete(history).where(history.c.id.in_([entry.id for entry in entries[:-1]]))
+            )
+            await database.execute(
+                update(history).where(history.c.id == last.id).values(
+                    kind=HistoryKind.SNAPSHOT,
+                    actor=None,
+                    changes=fold_changes(entry.dict()["changes"] for entry in entries),
+                    folded=sum(entry.folded for entry in entries),
+                )
+            )
+            n_folded += len(entries)
+
+        return n_folded
+
+    async def due(self, *, after: DueKey | None = None, until: dt.datetime | None = None, limit: int) -> list[CardRead]:
+        table = Card.Meta.table
+        # Matches the partial index on open due dates, so this reads `limit` index entries and no more
+        query = (
+            select(table)
+            .where(table.c.due_dttm.is_not(None), table.c.finished_dttm.is_(None), table.c.deleted_dttm.is_(None))
+            .order_by(table.c.due_dttm, table.c.id)
+            .limit(limit)
+        )
+        if after is not None:
+            after_dttm, after_id = after
+            query = query.where(or_(
+                table.c.due_dttm > after_dttm,
+                and_(table.c.due_dttm == after_dttm, table.c.id > after_id),
+            ))
+
+        if until is not None:
+            query = query.where(table.c.due_dttm <= until)
+
+        return [CardRead.from_dict(dict(row._mapping)) for row in await database.fetch_all(query)]
+
+    async def deleted(self, *, after: TombstoneKey | None = None, limit: int) -> list[Tombstone]:
+        table = Card.Meta.table
+        # Matches the partial index that holds only tombstones
+        query = (
+            select(table.c.id, table.c.deleted_dttm)
+            .where(table.c.deleted_dttm.is_not(None))
+            .order_by(table.c.deleted_dttm, table.c.id)
+            .limit(limit)
+        )
+        if after is not None:
+            after_dttm, after_id = after
+            query = query.where(or_(
+                table.c.deleted_dttm > after_dttm,
+                and_(table.c.deleted_dttm == after_dttm, table.c.id > after_id),
+            ))
+
+        return [Tombstone.from_dict(dict(row._mapping)) for row in await database.fetch_all(query)]
+
+    async def purge(self, before: dt.datetime, limit: int) -> int:
+        table = Card.Meta.table
+
+        async def purge_tombstones():
+            card_ids = await database.fetch_all(
+                select(table.c.id)
+                .where(table.c.deleted_dttm.is_not(None), table.c.deleted_dttm < before)
+                .order_by(table.c.deleted_dttm, table.c.id)
+                .limit(limit)
+            )
+            if card_ids:
+                await database.execute(delete(table).where(table.c.id.in_([row.id for row in card_ids])))
+
+            return len(card_ids)
+
+        return await writes.submit(purge_tombstones)
+
+    async def vacuum(self, pages: int) -> int:
+        async with database.connection() as connection:
+            sqlite_connection = connection.raw_connection
+            # Run as a script so it steps to completion, a plain execute frees a single page. A script commits
+            # whatever transaction is open first, so this never runs inside one, nor through the write queue.
+            if sqlite_connection.in_transaction:
+                return 0
+
+            # Only releases pages on databases created with auto_vacuum set to incremental, a no-op on others
+            free_before = await connection.fetch_val("PRAGMA freelist_count")
+            await sqlite_connection.executescript(f"PRAGMA incremental_vacuum({int(pages)})")
+            return free_before - await connection.fetch_val("PRAGMA freelist_count")
+
+    async def dashboard(self, top: int, days: int) -> Dashboard:
+        """Aggregate the dashboard in SQL so its cost does not grow with the number of cards"""
+        table = Card.Meta.table
+        live = table.c.deleted_dttm.is_(None)
+
+        state_rows = await database.fetch_all(
+            select(table.c.state, func.count()).where(live).group_by(table.c.state)
+        )
+        priority_rows = await database.fetch_all(
+            select(table.c.priority, func.count()).where(live).group_by(table.c.priority)
+        )
+
+        since = pendulum.today().subtract(days=days - 1).naive()
+        finished_day = func.date(table.c.finished_dttm)
+        finished_rows = await database.fetch_all(
+            select(finished_day, func.count())
+            .where(live, table.c.finished_dttm >= since)
+            .group_by(finished_day)
+            .order_by(finished_day)
+        )
+
+        priority_rank = case(*[(table.c.priority == priority, rank) for priority, rank in PRIORITY_RANK.items()])
+        top_rows = await database.fetch_all(
+            select(table)
+            .where(live, table.c.state != State.DONE)
+            .order_by(priority_rank, table.c.created_dttm, table.c.id)
+            .limit(top)
+        )
+
+        return Dashboard(
+            states={state: 0 for state in State} | {row[0]: row[1] for row in state_rows},
+            priorities={priority: 0 for priority in Priority} | {row[0]: row[1] for row in priority_rows},
+            finished_per_day=[DayCount(day=row[0], count=row[1]) for row in finished_rows],
+            top_cards=[CardRead.from_dict(dict(row._mapping)) for row in top_rows],
+        )
+
+    @staticmethod
+    async def _apply_rollup(deltas: list[RollupDelta]) -> None:
+        """
+        Fold `deltas` into the stored rollup as part of the write that caused
+        them. Writes to a board are serialized by the write queue, so reading
+        and rewriting the day rows cannot interleave with another write.
+        """
+        if not deltas:
+            return
+
+        rows = await CardDailyStats.objects.filter(CardDailyStats.day.in_({delta.day for delta in deltas})).all()
+        stored_days = {row.day for row in rows}
+        days = group_deltas(deltas, days={row.day: DayStats(**row.dict()) for row in rows})
+        for day, stats in days.items():
+            if day in stored_days:
+                await CardDailyStats.objects.filter(day=day).update(**stats.dict(exclude={"day"}))
+            else:
+                await CardDailyStats(**stats.dict()).save()
+
+    async def daily_stats(self, since: dt.date) -> list[DayStats]:
+        rows = await CardDailyStats.objects.filter(CardDailyStats.day >= since).order_by(CardDailyStats.day.asc()).all()
+        return [DayStats(**row.dict()) for row in rows]
+
+    async def backfill_rollup(self) -> RollupBackfill:
+        async def rebuild():
+            table = Card.Meta.table
+            days = {}
+            n_cards = 0
+            # Deleted cards keep their counts in the rollup, only purged ones are gone for good
+            query = select(*[table.c[field] for field in TIMESTAMP_FIELDS])
+            async for row in database.iterate(query):
+                group_deltas(card_deltas(None, row._mapping), days=days)
+                n_cards += 1
+
+            await CardDailyStats.objects.delete(each=True)
+            if days:
+                await CardDailyStats.objects.bulk_create([CardDailyStats(**stats.dict()) for stats in days.values()])
+
+            return RollupBackfill(cards=n_cards, days=len(days))
+
+        # Rebuilt inside one write so no card write lands between the scan and the swap
+        return await writes.submit(rebuild)
@@ -0,0 +1,138 @@
+"""
+Daily Card Rollup
+
+Each day keeps how many cards were created, started and finished on it. For
+the cards finished that day it also keeps the total lead time (created to
+finished) and cycle time (started to finished), plus histograms of both over
+log spaced buckets. Charts and percentiles over any range read one row per
+day rather than the cards themselves.
+
+Rollups count events, so deleting a card does not take back its counts, and
+a backfill counts deleted cards too until they are purged.
+"""
+import bisect
+import datetime as dt
+from collections.abc import Iterable, Mapping
+from typing import NamedTuple
+
+from .models import DayStats, DurationStats
+
+# Bucket upper bounds grow by a factor of sqrt(2) from one minute to about two years
+DURATION_BOUNDS = [60 * 2 ** (step / 2) for step in range(41)]
+HISTOGRAM_SIZE = len(DURATION_BOUNDS) + 1
+TIMESTAMP_FIELDS = ("created_dttm", "started_dttm", "finished_dttm")
+
+
+class RollupDelta(NamedTuple):
+    day: dt.date
+    created: int = 0
+    started: int = 0
+    finished: int = 0
+    lead_time_seconds: float | None = None
+    cycle_time_seconds: float | None = None
+
+
+def naive(dttm: dt.datetime) -> dt.datetime:
+    """Wall clock time without a zone, the way sqlite stores it"""
+    return dttm.replace(tzinfo=None)
+
+
+def bucket_index(seconds: float) -> int:
+    return bisect.bisect_right(DURATION_BOUNDS, seconds)
+
+
+def empty_day(day: dt.date) -> DayStats:
+    return DayStats(day=day, lead_time_histogram=[0] * HISTOGRAM_SIZE, cycle_time_histogram=[0] * HISTOGRAM_SIZE)
+
+
+def card_deltas(before: Mapping | None, after: Mapping) -> list[RollupDelta]:
+    """
+    Rollup changes for a card going from `before` to `after`, mappings of its
+    timestamps with `before` None for a new card. A timestamp only counts the
+    first time it is set, so starting a card twice counts one start.
+    """
+    before = before or {}
+    created_dttm, started_dttm, finished_dttm = (
+        None if after.get(field) is None else naive(after[field]) for field in TIMESTAMP_FIELDS
+    )
+
+    deltas = []
+    if not before:
+        deltas.append(RollupDelta(day=created_dttm.date(), created=1))
+
+    if started_dttm is not None and before.get("started_dttm") is None:
+        deltas.append(RollupDelta(day=started_dttm.date(), started=1))
+
+    if finished_dttm is not None and before.get("finished_dttm") is None:
+        deltas.append(RollupDelta(
+            day=finished_dttm.date(),
+            finished=1,
+            lead_time_seconds=max(0.0, (finished_dttm - created_dttm).total_seconds()),
+            cycle_time_seconds=(
+                None if started_dttm is None else max(0.0, (finished_dttm - started_dttm).total_seconds())
+            ),
+        ))
+
+    return deltas
+
+
+def apply_delta(stats: DayStats, delta: RollupDelta) -> None:
+    stats.created += delta.created
+    stats.started += delta.started
+    stats.finished += delta.finished
+    if delta.lead_time_seconds is not None:
+        stats.lead_time_seconds += delta.lead_time_seconds
+        stats.lead_time_histogram[bucket_index(delta.lead_time_seconds)] += 1
+
+    if delta.cycle_time_seconds is not None:
+        stats.cycle_time_seconds += delta.cycle_time_seconds
+        stats.cycle_time_histogram[bucket_index(delta.cycle_time_seconds)] += 1
+
+
+def group_deltas(deltas: Iterable[RollupDelta], days: dict[dt.date, DayStats] | None = None) -> dict[dt.date, DayStats]:
+    """Fold `deltas` into per day stats, starting from `days` when given"""
+    days = {} if days is None else days
+    for delta in deltas:
+        if delta.day not in days:
+            days[delta.day] = empty_day(delta.day)
+
+        apply_delta(days[delta.day], delta)
+
+    return days
+
+
+def merge_histograms(histograms: Iterable[list[int]]) -> list[int]:
+    return [sum(counts) for counts in zip(*histograms)] or [0] * HISTOGRAM_SIZE
+
+
+def histogram_percentile(histogram: list[int], percentile: float) -> float | None:
+    """Duration below which `percentile` percent fall, interpolated within its bucket"""
+    total = sum(histogram)
+    if not total:
+        return None
+
+    target = total * percentile / 100
+    seen = 0
+    for index, count in enumerate(histogram):
+        if count and seen + count >= target:
+            lower = 0.0 if index == 0 else DURATION_BOUNDS[index - 1]
+            if index == len(DURATION_BOUNDS):
+                return lower
+
+            return lower + (DURATION_BOUNDS[index] - lower) * (target - seen) / count
+
+        seen += count
+
+    return DURATION_BOUNDS[-1]
+
+
+def duration_stats(histograms: list[list[int]], total_seconds: float, percentiles: list[int]) -> DurationStats:
+    histogram = merge_histograms(histograms)
+    count = sum(histogram)
+    return DurationStats(
+        count=count,
+        mean_seconds=total_seconds / count if count else None,
+        percentile_seconds={
+            percentile: histogram_percentile(histogram, percentile) for percentile in percentiles
+        } if count else {},
+    )
@@ -1,11 +1,38 @@
 import pendulum
-from fastapi import APIRouter, Depends, Query, status, Body, HTTPException
-from .service import valid_card_id
+from fastapi import APIRouter, Depends, Header, Query, status, Body, HTTPException, Response
+from fastapi.responses import StreamingResponse
+from .columnar import COLUMNAR_MEDIA_TYPE, accepts_columnar, encode_cards
+from .exceptions import invalid_card_id_exception
+from .history import ACTOR_HEADER
+from .idempotency import IDEMPOTENCY_KEY_HEADER, fingerprint, idempotent
+from .repository import CardRepository
+from .rollup import duration_stats
+from .service import valid_card_id, read_flights, cards_version, get_repository, new_card_values, reminders
+from .service import history_compactor, open_board, state_changes
+from api.config import get_settings
+from api.database import current_board
+from api.jobs.models import JobRead
+from api.jobs.service import JobProgress, start_job
 from . import models
 from loguru import logger
 from textwrap import dedent
 
 router = APIRouter(tags=["Cards"], prefix="/cards")
+settings = get_settings()
+
+MAX_PAGE_SIZE = 1000
+MAX_BULK_SIZE = 1000
+MAX_STATS_DAYS = 730
+MAX_DUE_HOURS = 24 * 365
+
+
+def json_response(content: str, status_code: int = status.HTTP_200_OK) -> Response:
+    """Wrap an already serialized body so it is not validated and encoded again"""
+    return Response(content=content, status_code=status_code, media_type="application/json")
+
+
+def no_content(_=None) -> Response:
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
 
 
 @router.post(
@@ -16,18 +43,86 @@ router = APIRouter(tags=["Cards"], prefix="/cards")
     response_description="Return created card object",
     summary="Create card",
 )
-async def create_card(card: models.CardCreate):
-    db_card = models.Card.from_orm(card)
+async def create_card(
+        card: models.CardCreate,
+        repository: CardRepository = Depends(get_repository),
+        idempotency_key: str | None = IDEMPOTENCY_KEY_HEADER,
+        actor: str | None = ACTOR_HEADER
+):
+    async def create():
+        created_card = await repository.create(new_card_values(card), actor=actor)
+        read_flights.invalidate()
+        reminders.notify(current_board.get(), created_card.id, created_card.due_dttm)
+        return created_card
 
-    if db_card.state == models.State.DONE:
-        now = pendulum.now()
-        db_card.started_dttm = now
-        db_card.finished_dttm = now
-    elif db_card.state == models.State.IN_PROGRESS:
-        db_card.started_dttm = pendulum.now()
+    def respond(created_card) -> Response:
+        body = models.CardRead.validate(created_card).json(by_alias=True)
+        return json_response(body, status_code=status.HTTP_201_CREATED)
 
-    await db_card.save()
-    return db_card
+    return await idempotent(idempotency_key, fingerprint("create_card", card.json()), create, respond)
+
+
+@router.post(
+    "/bulk/",
+    response_model=models.BulkCreated,
+    status_code=status.HTTP_201_CREATED,
+    description="Create a batch of cards in a single statement, keeping any timestamps they already have",
+    response_description="Number of cards created",
+    summary="Bulk create cards",
+)
+async def bulk_create_cards(
+        cards: list[models.CardImport] = Body(..., min_items=1, max_items=MAX_BULK_SIZE),
+        repository: CardRepository = Depends(get_repository),
+        idempotency_key: str | None = IDEMPOTENCY_KEY_HEADER,
+        actor: str | None = ACTOR_HEADER
+):
+    async def create():
+        count = await repository.bulk_create([new_card_values(card) for card in cards], actor=actor)
+        read_flights.invalidate()
+        if any(card.due_dttm is not None for card in cards):
+            reminders.refresh(current_board.get())
+        return count
+
+    def respond(count: int) -> Response:
+        return json_response(models.BulkCreated(count=count).json(by_alias=True), status_code=status.HTTP_201_CREATED)
+
+    request_fingerprint = fingerprint("bulk_create_cards", [card.json() for card in cards])
+    return await idempotent(idempotency_key, request_fingerprint, create, respond)
+
+
+@router.get(
+    "/export/",
+    status_code=status.HTTP_200_OK,
+    description=(
+        "Stream every card in id order as newline delimited JSON, "
+        f"or as one columnar page per batch of cards when `{COLUMNAR_MEDIA_TYPE}` is accepted"
+    ),
+    response_description="One card per line, or columnar pages",
+    summary="Export cards",
+)
+async def export_cards(
+        after_id: int = Query(0, description="Resume after this card id"),
+        accept: str | None = Header(None),
+        repository: CardRepository = Depends(get_repository)
+):
+    columnar = accepts_columnar(accept)
+
+    async def export_pages():
+        last_id = after_id
+        while True:
+            cards = await repository.filter(after_id=last_id, limit=MAX_PAGE_SIZE)
+            if not cards:
+                break
+
+            if columnar:
+                yield encode_cards(cards)
+            else:
+                yield "".join(card.json(by_alias=True) + "\n" for card in cards)
+
+            last_id = cards[-1].id
+
+    media_type = COLUMNAR_MEDIA_TYPE if columnar else "application/x-ndjson"
+    return StreamingResponse(export_pages(), media_type=media_type)
 
 
 @router.get(
@@ -38,8 +133,13 @@ async def create_card(card: models.CardCreate):
     response_description="Return card object",
     summary="Get card",
 )
-async def get_card(card: models.Card = Depends(valid_card_id)):
-    return card
+async def get_card(card_id: int, repository: CardRepository = Depends(get_repository)):
+    async def read_card():
+        card = await valid_card_id(card_id, repository)
+        return card.json(by_alias=True)
+
+    content = await read_flights.do(("get_card", card_id), read_card)
+    return json_response(content)
 
 
 @router.delete(
@@ -49,8 +149,13 @@ async def get_card(card: models.Card = Depends(valid_card_id)):
     response_description="None",
     summary="Delete card",
 )
-async def delete_card(card: models.Card = Depends(valid_card_id)):
-    await card.delete()
+async def delete_card(
+        card: models.CardRead = Depends(valid_card_id),
+        repository: CardRepository = Depends(get_repository),
+        actor: str | None = ACTOR_HEADER
+):
+    await repository.delete(card.id, actor=actor)
+    read_flights.invalidate()
 
 
 @router.patch(
@@ -60,14 +165,18 @@ async def delete_card(card: models.Card = Depends(valid_card_id)):
     response_description="None",
     summary="Update card",
 )
-async def update_card(*, card: models.Card = Depends(valid_card_id), card_update: models.CardUpdate):
+async def update_card(
+        *,
+        card: models.CardRead = Depends(valid_card_id),
+        card_update: models.CardUpdate,
+        repository: CardRepository = Depends(get_repository),
+        actor: str | None = ACTOR_HEADER
+):
     update_data = card_update.dict(exclude_unset=True)
-    for key, value in update_data.items():
-        setattr(card, key, value)
-
-    await card.update()
-
-    return card
+    if update_data:
+        await repository.update(card.id, actor=actor, **update_data)
+        read_flights.invalidate()
+        reminders.notify(current_board.get(), card.id, update_data.get("due_dttm"))
 
 
 @router.get(
@@ -77,16 +186,366 @@ async def update_card(*, card: models.Card = Depends(valid_card_id), card_update
     response_description="Integer count of cards",
     summary="Count cards",
 )
-async def count_cards():
-    n = await models.Card.objects.count()
+async def count_cards(repository: CardRepository = Depends(get_repository)):
+    n = await repository.count()
     return {"count": n}
 
 
+@router.get(
+    "/dashboard/",
+    response_model=models.Dashboard,
+    status_code=status.HTTP_200_OK,
+    description="Card counts by state and priority, cards finished per day and the most urgent open cards",
+    response_description="Pre-aggregated dashboard",
+    summary="Dashboard",
+)
+async def get_dashboard(
+        *,
+        top: int = Query(10, ge=0, le=100, description="Number of open cards to return"),
+        days: int = Query(14, ge=1, le=365, description="Number of days of finished counts"),
+        repository: CardRepository = Depends(get_repository)
+):
+    async def read_dashboard():
+        dashboard = await repository.dashboard(top=top, days=days)
+        return dashboard.json(by_alias=True)
+
+    content = await read_flights.do(("get_dashboard", top, days), read_dashboard)
+    return json_response(content)
+
+
+@router.get(
+    "/stats/daily/",
+    response_model=list[models.DayThroughput],
+    status_code=status.HTTP_200_OK,
+    description="Cards created, started and finished on each of the last days, read from the daily rollup",
+    response_description="One entry per day, oldest first, including days without any events",
+    summary="Daily throughput",
+)
+async def get_daily_stats(
+        *,
+        days: int = Query(30, ge=1, le=MAX_STATS_DAYS, description="Number of days ending today"),
+        repository: CardRepository = Depends(get_repository)
+):
+    async def read_daily_stats():
+        today = pendulum.today().date()
+        since = today.subtract(days=days - 1)
+        stats = {day_stats.day: day_stats for day_stats in await repository.daily_stats(since)}
+        throughput = [
+            models.DayThroughput(day=day, created=0, started=0, finished=0) if day not in stats
+            else models.DayThroughput(**stats[day].dict(include={"day", "created", "started", "finished"}))
+            for day in (since.add(days=offset) for offset in range(days))
+        ]
+        return "[" + ",".join(day.json(by_alias=True) for day in throughput) + "]"
+
+    content = await read_flights.do(("get_daily_stats", days), read_daily_stats)
+    return json_response(content)
+
+
+@router.get(
+    "/stats/cycle-times/",
+    response_model=models.CycleTimes,
+    status_code=status.HTTP_200_OK,
+    description=dedent("""
+        Mean and percentile lead time (created to finished) and cycle time (started to finished)
+        of the cards finished in the last days, estimated from the daily rollup histograms
+    """),
+    response_description="Lead and cycle time statistics in seconds",
+    summary="Cycle times",
+)
+async def get_cycle_times(
+        *,
+        days: int = Query(90, ge=1, le=MAX_STATS_DAYS, description="Number of days ending today"),
+        percentiles: list[int] = Query([50, 85, 95], description="Percentiles to estimate, from 1 to 99"),
+        repository: CardRepository = Depends(get_repository)
+):
+    if any(not 1 <= percentile <= 99 for percentile in percentiles):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Percentiles must be between 1 and 99"
+        )
+
+    percentiles = normalize_choices(percentiles)
+
+    async def read_cycle_times():
+        stats = await repository.daily_stats(pendulum.today().date().subtract(days=days - 1))
+        cycle_times = models.CycleTimes(
+            days=days,
+            lead_time=duration_stats(
+                [day.lead_time_histogram for day in stats],
+                sum(day.lead_time_seconds for day in stats),
+                percentiles,
+            ),
+            cycle_time=duration_stats(
+                [day.cycle_time_histogram for day in stats],
+                sum(day.cycle_time_seconds for day in stats),
+                percentiles,
+            ),
+        )
+        return cycle_times.json(by_alias=True)
+
+    content = await read_flights.do(("get_cycle_times", days, percentiles), read_cycle_times)
+    return json_response(content)
+
+
+@router.post(
+    "/stats/backfill/",
+    response_model=JobRead,
+    status_code=status.HTTP_202_ACCEPTED,
+    description=dedent("""
+        Rebuild the daily rollup from the cards in a background job, for boards created before it existed
+        or after a restore. The job result holds the number of cards scanned and days written
+    """),
+    response_description="Job to poll for the result",
+    summary="Backfill daily rollup",
+)
+async def backfill_stats():
+    board = current_board.get()
+
+    async def backfill(progress: JobProgress) -> models.RollupBackfill:
+        async with open_board(board) as repository:
+            rollup_backfill = await repository.backfill_rollup()
+
+        read_flights.invalidate()
+        return rollup_backfill
+
+    return await start_job("backfill_stats", backfill)
+
+
+@router.get(
+    "/tags/",
+    response_model=list[models.TagCount],
+    status_code=status.HTTP_200_OK,
+    description="Every tag in use with the number of cards that have it",
+    response_description="Tag counts, most used first",
+    summary="Tag counts",
+)
+async def get_tag_counts(repository: CardRepository = Depends(get_repository)):
+    async def read_tag_counts():
+        tag_counts = await repository.tag_counts()
+        return "[" + ",".join(tag_count.json(by_alias=True) for tag_count in tag_counts) + "]"
+
+    content = await read_flights.do(("get_tag_counts",), read_tag_counts)
+    return json_response(content)
+
+
+@router.post(
+    "/tags/add/",
+    status_code=status.HTTP_204_NO_CONTENT,
+    description="Tag a batch of cards with every given tag in a single statement, ids that are not cards are ignored",
+    response_description="None",
+    summary="Bulk tag cards",
+)
+async def add_tags(tag_change: models.TagChange, repository: CardRepository = Depends(get_repository)):
+    await repository.add_tags(tag_change.tags, tag_change.card_ids)
+    read_flights.invalidate()
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
+
+
+@router.post(
+    "/tags/remove/",
+    status_code=status.HTTP_204_NO_CONTENT,
+    description="Remove every given tag from a batch of cards in a single statement",
+    response_description="None",
+    summary="Bulk untag cards",
+)
+async def remove_tags(tag_change: models.TagChange, repository: CardRepository = Depends(get_repository)):
+    await repository.remove_tags(tag_change.tags, tag_change.card_ids)
+    read_flights.invalidate()
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
+
+
+@router.get(
+    "/{card_id}/tags/",
+    response_model=list[str],
+    status_code=status.HTTP_200_OK,
+    description="Tags of a card in the description",
+    response_description="Tag names in order",
+    summary="Card tags",
+)
+async def get_card_tags(
+        card: models.CardRead = Depends(valid_card_id),
+        repository: CardRepository = Depends(get_repository)
+):
+    return await repository.card_tags(card.id)
+
+
+@router.get(
+    "/{card_id}/history/",
+    response_model=models.CardHistoryPage,
+    status_code=status.HTTP_200_OK,
+    description=dedent("""
+        Changes made to a card in the description, oldest first, including after it was deleted.
+        Entries older than the retention period are folded into a single snapshot
+    """),
+    response_description="One page of history entries",
+    summary="Card history",
+)
+async def get_card_history(
+        *,
+        card_id: int,
+        after_id: int = Query(None, description="Only return entries with a greater id"),
+        limit: int = Query(100, gt=0, le=MAX_PAGE_SIZE, description="Maximum number of entries to return"),
+        repository: CardRepository = Depends(get_repository)
+):
+    async def read_history():
+        events = await repository.history(card_id, after_id=after_id, limit=limit)
+        if not events and after_id is None:
+            raise invalid_card_id_exception
+
+        next_after_id = events[-1].id if len(events) == limit else None
+        return models.CardHistoryPage(events=events, next_after_id=next_after_id).json(by_alias=True)
+
+    content = await read_flights.do(("get_card_history", card_id, after_id, limit), read_history)
+    return json_response(content)
+
+
+@router.post(
+    "/history/compact/",
+    response_model=JobRead,
+    status_code=status.HTTP_202_ACCEPTED,
+    description=dedent("""
+        Fold the history entries older than the given age into one snapshot per card in a background job,
+        without waiting for the next scheduled compaction. The job result holds the number of cards
+        compacted and entries folded
+    """),
+    response_description="Job to poll for the result",
+    summary="Compact history",
+)
+async def compact_history(
+        older_than_days: int = Query(
+            history_compactor.retention_days,
+            ge=0,
+            description="Age of the entries to fold",
+        )
+):
+    board = current_board.get()
+    before = pendulum.now().subtract(days=older_than_days)
+
+    async def compact(progress: JobProgress) -> models.HistoryCompaction:
+        async with open_board(board) as repository:
+            compaction = await repository.compact_history(before=before, batch_size=history_compactor.batch_size)
+
+        read_flights.invalidate()
+        return compaction
+
+    return await start_job("compact_history", compact)
+
+
+@router.post(
+    "/transition/",
+    response_model=JobRead,
+    status_code=status.HTTP_202_ACCEPTED,
+    description=dedent("""
+        Move cards to a state in a background job, a batch of cards per write, setting the timestamps
+        the state implies. Cards already in the state are left alone. The job result holds the number
+        of cards moved
+    """),
+    response_description="Job to poll for progress and the result",
+    summary="Bulk transition cards",
+)
+async def transition_cards(transition: models.BulkTransition, actor: str | None = ACTOR_HEADER):
+    board = current_board.get()
+    batch_size = settings.jobs.BATCH_SIZE
+
+    def changes_for(card: models.CardRead) -> dict | None:
+        # Checked again inside each write, so a card moved elsewhere since the ids were read is skipped
+        if transition.from_states is not None and card.state not in transition.from_states:
+            return None
+
+        return state_changes(card, transition.state, pendulum.now())
+
+    async def transition_job(progress: JobProgress) -> models.BulkTransitioned:
+        async with open_board(board) as repository:
+            if transition.card_ids is not None:
+                card_ids = sorted(set(transition.card_ids))
+            else:
+                cards = await repository.filter(states=transition.from_states, fields=[models.CardField.ID])
+                card_ids = [card.id for card in cards]
+
+            await progress(0, len(card_ids))
+            n_moved = 0
+            for start in range(0, len(card_ids), batch_size):
+                n_moved += await repository.update_many(card_ids[start:start + batch_size], changes_for, actor=actor)
+                read_flights.invalidate()
+                await progress(min(start + batch_size, len(card_ids)))
+
+        # Reopened cards may have due dates the reminders have to pick up again
+        reminders.refresh(board)
+        return models.BulkTransitioned(count=n_moved)
+
+    return await start_job("transition_cards", transition_job)
+
+
+@router.get(
+    "/due/",
+    response_model=list[models.CardRead],
+    status_code=status.HTTP_200_OK,
+    description="Open cards that are overdue or due within the next hours, soonest first",
+    response_description="Cards ordered by due date",
+    summary="Cards due soon",
+)
+async def get_due_cards(
+        *,
+        within_hours: int = Query(24, ge=0, le=MAX_DUE_HOURS, description="How far ahead to look"),
+        limit: int = Query(100, gt=0, le=MAX_PAGE_SIZE, description="Maximum number of cards to return"),
+        repository: CardRepository = Depends(get_repository)
+):
+    async def read_due_cards():
+        cards = await repository.due(until=pendulum.now().add(hours=within_hours), limit=limit)
+        return "[" + ",".join(card.json(by_alias=True) for card in cards) + "]"
+
+    content = await read_flights.do(("get_due_cards", within_hours, limit), read_due_cards)
+    return json_response(content)
+
+
+@router.get(
+    "/deleted/",
+    response_model=list[models.Tombstone],
+    status_code=status.HTTP_200_OK,
+    description=dedent("""
+        Cards deleted and not purged yet, oldest deletion first, for mirrors to follow deletions.
+        Pass the deletion time and id of the last tombstone returned to read the next page
+    """),
+    response_description="Ids of deleted cards with when they were deleted",
+    summary="Deleted cards",
+)
+async def get_deleted_cards(
+        *,
+        after_dttm: pendulum.DateTime = Query(None, description="Only return cards deleted at or after this time"),
+        after_id: int = Query(0, description="Among cards deleted at `after_dttm`, only return greater ids"),
+        limit: int = Query(100, gt=0, le=MAX_PAGE_SIZE, description="Maximum number of cards to return"),
+        repository: CardRepository = Depends(get_repository)
+):
+    async def read_deleted_cards():
+        after = None if after_dttm is None else (after_dttm, after_id)
+        tombstones = await repository.deleted(after=after, limit=limit)
+        return "[" + ",".join(tombstone.json(by_alias=True) for tombstone in tombstones) + "]"
+
+    content = await read_flights.do(("get_deleted_cards", after_dttm, after_id, limit), read_deleted_cards)
+    return json_response(content)
+
+
+@router.get(
+    "/version/",
+    status_code=status.HTTP_200_OK,
+    description="Token that changes whenever a card is created, updated or deleted",
+    response_description="Opaque version string",
+    summary="Cards version",
+)
+async def get_cards_version():
+    return {"version": cards_version()}
+
+
+def normalize_choices(values: list | None) -> tuple | None:
+    """Order and de-duplicate multi-value query params so equivalent filters share a key"""
+    return None if values is None else tuple(sorted(set(values)))
+
+
 @router.get(
     "/filter/",
     response_model=models.FilteredCards,
     status_code=status.HTTP_200_OK,
-    description="Read cards in the description",
+    description=f"Read cards in the description, as a columnar page when `{COLUMNAR_MEDIA_TYPE}` is accepted",
     response_description="List of cards",
     summary="Read cards",
 )
@@ -95,18 +554,32 @@ async def filter_cards(
         states: list[models.State] = Query(None),
         priorities: list[models.Priority] = Query(None),
         lowest_create_date: pendulum.Date = Query(None),
-        highest_create_date: pendulum.Date = Query(None)
+        highest_create_date: pendulum.Date = Query(None),
+        tags_all: list[models.TagName] = Query(None, description="Only return cards with every one of these tags"),
+        tags_any: list[models.TagName] = Query(None, description="Only return cards with at least one of these tags"),
+        after_id: int = Query(None, description="Only return cards with a greater id"),
+        limit: int = Query(None, gt=0, le=MAX_PAGE_SIZE, description="Maximum number of cards to return"),
+        fields: list[models.CardField] = Query(None, description="Only return these card fields, id is always included"),
+        accept: str | None = Header(None),
+        repository: CardRepository = Depends(get_repository)
 ):
     logger.debug(
         "Read Card Filters\n"
         "states={states};\n"
         "priorities={priorities};\n"
         "lowest_create_date={lowest_create_date}\n"
-        "highest_create_date={highest_create_date}",
+        "highest_create_date={highest_create_date}\n"
+        "tags_all={tags_all}; tags_any={tags_any};\n"
+        "after_id={after_id}; limit={limit}; fields={fields}",
         states=states,
         priorities=priorities,
         lowest_create_date=lowest_create_date,
-        highest_create_date=highest_create_date
+        highest_create_date=highest_create_date,
+        tags_all=tags_all,
+        tags_any=tags_any,
+        after_id=after_id,
+        limit=limit,
+        fields=fields
     )
 
     if lowest_create_date and highest_create_date and lowest_create_date > highest_create_date:
@@ -124,10 +597,8 @@ async def filter_cards(
             detail=error_message
         )
 
-    query = models.Card.objects
     filters = []
     if states is not None:
-        query = query.filter(models.Card.state.in_(states))
         filters.append(
             models.Filter(
                 field="state",
@@ -137,7 +608,6 @@ async def filter_cards(
         )
 
     if priorities is not None:
-        query = query.filter(models.Card.priority.in_(priorities))
         filters.append(
             models.Filter(
                 field="priority",
@@ -147,7 +617,6 @@ async def filter_cards(
         )
 
     if lowest_create_date is not None:
-        query = query.filter(models.Card.created_dttm >= lowest_create_date)
         filters.append(
             models.Filter(
                 field="created_dttm",
@@ -157,7 +626,6 @@ async def filter_cards(
         )
 
     if highest_create_date is not None:
-        query = query.filter(models.Card.created_dttm <= highest_create_date)
         filters.append(
             models.Filter(
                 field="created_dttm",
@@ -166,9 +634,69 @@ async def filter_cards(
             )
         )
 
-    cards = await query.all()
+    if tags_all is not None:
+        filters.append(
+            models.Filter(
+                field="tags",
+                operator=models.Operator.ALL,
+                value=tags_all
+            )
+        )
+
+    if tags_any is not None:
+        filters.append(
+            models.Filter(
+                field="tags",
+                operator=models.Operator.IN,
+                value=tags_any
+            )
+        )
 
-    return models.FilteredCards(offset=0, filters=filters, cards=cards)
+    columnar = accepts_columnar(accept)
+
+    async def read_cards():
+        cards = await repository.filter(
+            states=states,
+            priorities=priorities,
+            lowest_create_date=lowest_create_date,
+            highest_create_date=highest_create_date,
+            tags_all=tags_all,
+            tags_any=tags_any,
+            after_id=after_id,
+            limit=limit,
+            fields=fields
+        )
+        next_after_id = cards[-1].id if limit is not None and len(cards) == limit else None
+        if columnar:
+            return encode_cards(cards, fields=fields, next_after_id=next_after_id)
+
+        filtered_cards = models.FilteredCards(
+            offset=0,
+            filters=filters,
+            cards=cards,
+            next_after_id=next_after_id
+        )
+        # Partial cards leave the fields that were not asked for unset rather than null
+        return filtered_cards.json(by_alias=True, exclude_unset=fields is not None)
+
+    flight_key = (
+        "filter_cards",
+        normalize_choices(states),
+        normalize_choices(priorities),
+        lowest_create_date,
+        highest_create_date,
+        normalize_choices(tags_all),
+        normalize_choices(tags_any),
+        after_id,
+        limit,
+        normalize_choices(fields),
+        columnar,
+    )
+    content = await read_flights.do(flight_key, read_cards)
+    if columnar:
+        return Response(content=content, media_type=COLUMNAR_MEDIA_TYPE)
+
+    return json_response(content)
 
 
 @router.patch(
@@ -178,10 +706,17 @@ async def filter_cards(
     response_description="None",
     summary="Start card",
 )
-async def start_card(card: models.Card = Depends(valid_card_id)):
-    card.state = models.State.IN_PROGRESS
-    card.started_dttm = pendulum.now()
-    await card.update()
+async def start_card(
+        card: models.CardRead = Depends(valid_card_id),
+        repository: CardRepository = Depends(get_repository),
+        idempotency_key: str | None = IDEMPOTENCY_KEY_HEADER,
+        actor: str | None = ACTOR_HEADER
+):
+    async def start():
+        await repository.update(card.id, actor=actor, state=models.State.IN_PROGRESS, started_dttm=pendulum.now())
+        read_flights.invalidate()
+
+    return await idempotent(idempotency_key, fingerprint("start_card", card.id), start, no_content)
 
 
 @router.patch(
@@ -191,11 +726,18 @@ async def start_card(card: models.Card = Depends(valid_card_id)):
     response_description="None",
     summary="Finish card",
 )
-async def finish_card(card: models.Card = Depends(valid_card_id)):
-    if card.state == models.State.TODO:
-        card.started_dttm = pendulum.now()
+async def finish_card(
+        card: models.CardRead = Depends(valid_card_id),
+        repository: CardRepository = Depends(get_repository),
+        idempotency_key: str | None = IDEMPOTENCY_KEY_HEADER,
+        actor: str | None = ACTOR_HEADER
+):
+    async def finish():
+        changes = {"state": models.State.DONE, "finished_dttm": pendulum.now()}
+        if card.state == models.State.TODO:
+            changes["started_dttm"] = changes["finished_dttm"]
 
-    card.state = models.State.DONE
-    card.finished_dttm = pendulum.now()
+        await repository.update(card.id, actor=actor, **changes)
+        read_flights.invalidate()
 
-    await card.update()
+    return await idempotent(idempotency_key, fingerprint("finish_card", card.id), finish, no_content)
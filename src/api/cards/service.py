@@ -1,10 +1,180 @@
-from ormar.exceptions import NoMatch
+import asyncio
+import contextlib
+import uuid
+from collections import Counter, defaultdict
+from collections.abc import AsyncIterator, Awaitable, Callable, Hashable
+
+import pendulum
+from fastapi import Depends, Path
+
+from api.config import StorageBackend, get_settings
+from api.database import BOARD_PATTERN, current_board, shards
+from api.writes import writes
+from .compaction import HistoryCompactor
 from .exceptions import invalid_card_id_exception
-from .models import Card
+from .memory import MemoryCardRepository
+from .models import CardCreate, CardRead, State
+from .purge import TombstonePurger
+from .reminders import ReminderRegistry
+from .repository import CardRepository, SqliteCardRepository
+
+settings = get_settings()
+
+sqlite_repository = SqliteCardRepository()
+memory_repositories: defaultdict[str, MemoryCardRepository] = defaultdict(MemoryCardRepository)
+
+
+def uses_sqlite() -> bool:
+    return settings.db.BACKEND == StorageBackend.SQLITE
+
+
+async def get_repository() -> CardRepository:
+    """Storage for the current board in the configured backend"""
+    return sqlite_repository if uses_sqlite() else memory_repositories[current_board.get()]
+
+
+async def valid_card_id(card_id: int, repository: CardRepository = Depends(get_repository)) -> CardRead:
+    card = await repository.get(card_id)
+    if card is None:
+        raise invalid_card_id_exception
+
+    return card
 
 
-async def valid_card_id(card_id: int):
+@contextlib.asynccontextmanager
+async def open_board(board: str) -> AsyncIterator[CardRepository]:
+    """Route card queries to the board's shard while the block runs, yielding its storage"""
+    if uses_sqlite():
+        await shards.acquire(board)
+
+    token = current_board.set(board)
     try:
-        return await Card.objects.get(id=card_id)
-    except NoMatch as e:
-        raise invalid_card_id_exception from e
+        yield await get_repository()
+    finally:
+        current_board.reset(token)
+        if uses_sqlite():
+            shards.release(board)
+
+
+reminders = ReminderRegistry(
+    open_board,
+    batch_size=settings.reminders.BATCH_SIZE,
+    max_sleep=settings.reminders.MAX_SLEEP_SECONDS,
+    catch_up=settings.reminders.CATCH_UP_SECONDS,
+)
+
+
+def boards_in_use() -> list[str]:
+    """Boards with storage open in this process"""
+    return shards.open_boards if uses_sqlite() else list(memory_repositories)
+
+
+async def valid_board(board: str = Path(..., regex=BOARD_PATTERN, description="Board whose shard holds the cards")):
+    """Route every card query in the request to the board's shard"""
+    async with open_board(board):
+        reminders.watch(board)
+        yield board
+
+
+def state_changes(card: CardRead, state: State, now: pendulum.DateTime) -> dict | None:
+    """Changes that move a card to `state` with the timestamps that implies, None when it is already there"""
+    if card.state == state:
+        return None
+
+    match state:
+        case State.TODO:
+            return {"state": state, "started_dttm": None, "finished_dttm": None}
+        case State.IN_PROGRESS:
+            return {"state": state, "started_dttm": now, "finished_dttm": None}
+        case State.DONE:
+            return {"state": state, "started_dttm": card.started_dttm or now, "finished_dttm": now}
+
+
+def new_card_values(card: CardCreate) -> dict:
+    """Values for a new card, filling in the timestamps its initial state implies"""
+    values = card.dict(exclude_none=True)
+    values.setdefault("created_dttm", pendulum.now())
+
+    if card.state == State.DONE:
+        now = pendulum.now()
+        values.setdefault("started_dttm", now)
+        values.setdefault("finished_dttm", now)
+    elif card.state == State.IN_PROGRESS:
+        values.setdefault("started_dttm", pendulum.now())
+
+    return values
+
+
+class SingleFlight:
+    """
+    Coalesce identical concurrent reads into one shared call.
+
+    Callers asking for the same key while a call is in flight await that call
+    instead of starting their own. Every committed write must call
+    `invalidate`, which moves new callers on the written board onto a fresh
+    generation so a read that started before the write is never shared with
+    a caller that arrived after it. Boards count their generations apart, a
+    write to one board leaves the flights of the others alone.
+    """
+
+    def __init__(self):
+        self._generations: Counter[str] = Counter()
+        self._flights: dict[Hashable, asyncio.Future] = {}
+
+    def generation(self, board: str) -> int:
+        return self._generations[board]
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._flights)
+
+    def invalidate(self, board: str | None = None) -> None:
+        self._generations[board or current_board.get()] += 1
+
+    async def do(self, key: Hashable, func: Callable[[], Awaitable]):
+        # Identical reads against different boards hit different shards
+        board = current_board.get()
+        flight_key = (board, self._generations[board], key)
+        flight = self._flights.get(flight_key)
+        if flight is None:
+            flight = asyncio.ensure_future(func())
+            self._flights[flight_key] = flight
+            flight.add_done_callback(lambda _: self._flights.pop(flight_key, None))
+
+        # Shield the shared call so one cancelled caller does not cancel it for the rest
+        return await asyncio.shield(flight)
+
+
+read_flights = SingleFlight()
+
+history_compactor = HistoryCompactor(
+    open_board,
+    boards_in_use,
+    retention_days=settings.history.RETENTION_DAYS,
+    interval=settings.history.COMPACT_INTERVAL_SECONDS,
+    batch_size=settings.history.COMPACT_BATCH_SIZE,
+    on_change=read_flights.invalidate,
+)
+
+tombstone_purger = TombstonePurger(
+    open_board,
+    boards_in_use,
+    writes.idle,
+    retention_hours=settings.purge.RETENTION_HOURS,
+    interval=settings.purge.INTERVAL_SECONDS,
+    batch_size=settings.purge.BATCH_SIZE,
+    vacuum_pages=settings.purge.VACUUM_PAGES,
+    on_change=read_flights.invalidate,
+)
+
+# Distinguishes generations from different server processes after a restart
+BOOT_ID = uuid.uuid4().hex[:8]
+
+
+def cards_version() -> str:
+    """
+    Cheap token that changes whenever a card write to the current board is
+    committed. Generations are counted in memory, which holds as long as one
+    process serves the boards, the same assumption the write queue makes.
+    """
+    return f"{BOOT_ID}.{read_flights.generation(current_board.get())}"
@@ -0,0 +1,168 @@
+"""Response Compression"""
+import zlib
+from collections.abc import Callable
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+# brotli and zstandard are optional, gzip is always available
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+class GzipCompressor:
+    def __init__(self, level: int):
+        # wbits 31 writes the gzip header and trailer rather than a raw zlib stream
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        return self._compressor.flush()
+
+
+class BrotliCompressor:
+    def __init__(self, level: int):
+        self._compressor = brotli.Compressor(quality=min(level, 11))
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.process(data) + self._compressor.flush()
+
+    def finish(self) -> bytes:
+        return self._compressor.finish()
+
+
+class ZstdCompressor:
+    def __init__(self, level: int):
+        self._compressor = zstandard.ZstdCompressor(level=level).compressobj()
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data) + self._compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+
+    def finish(self) -> bytes:
+        return self._compressor.flush()
+
+
+def available_encodings() -> dict[str, Callable]:
+    """Compressors by content coding, most preferred first"""
+    encodings = {}
+    if zstandard is not None:
+        encodings["zstd"] = ZstdCompressor
+
+    if brotli is not None:
+        encodings["br"] = BrotliCompressor
+
+    encodings["gzip"] = GzipCompressor
+    return encodings
+
+
+def accepted_encodings(accept_encoding: str) -> set[str]:
+    """Codings from an Accept-Encoding header, leaving out any refused with q=0"""
+    accepted = set()
+    for item in accept_encoding.split(","):
+        coding, *params = [part.strip() for part in item.split(";")]
+        refused = any(param.replace(" ", "") in ("q=0", "q=0.0", "q=0.00", "q=0.000") for param in params)
+        if coding and not refused:
+            accepted.add(coding.lower())
+
+    return accepted
+
+
+class CompressionMiddleware:
+    """
+    Compress responses in the best coding the client accepts.
+
+    Bodies sent in one piece below `minimum_size` bytes, like single cards,
+    go out as they are, since compressing them costs more than it saves.
+    Streamed bodies are compressed chunk by chunk and each chunk is flushed,
+    so a client reading NDJSON gets every line as soon as it is sent.
+    """
+
+    def __init__(self, app: ASGIApp, *, minimum_size: int, level: int):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.level = level
+        self.encodings = available_encodings()
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        accepted = accepted_encodings(Headers(scope=scope).get("accept-encoding", ""))
+        if "*" in accepted:
+            accepted |= set(self.encodings)
+
+        coding = next((coding for coding in self.encodings if coding in accepted), None)
+        if coding is None:
+            await self.app(scope, receive, send)
+            return
+
+        await CompressedResponder(self.app, coding, self.encodings[coding](self.level), self.minimum_size)(
+            scope, receive, send
+        )
+
+
+class CompressedResponder:
+    def __init__(self, app: ASGIApp, coding: str, compressor, minimum_size: int):
+        self.app = app
+        self.coding = coding
+        self.compressor = compressor
+        self.minimum_size = minimum_size
+        self.send: Send | None = None
+        self.start_message: Message | None = None
+        # None until the first body chunk decides whether to compress
+        self.compressing: bool | None = None
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        self.send = send
+        await self.app(scope, receive, self.send_compressed)
+
+    async def send_compressed(self, message: Message) -> None:
+        if message["type"] == "http.response.start":
+            self.start_message = message
+            if "content-encoding" in Headers(raw=message["headers"]):
+                self.compressing = False
+                await self.send(message)
+            return
+
+        if message["type"] != "http.response.body":
+            await self.send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+        if self.compressing is None:
+            self.compressing = more_body or len(body) >= self.minimum_size
+            headers = MutableHeaders(raw=self.start_message["headers"])
+            if self.compressing:
+                headers["content-encoding"] = self.coding
+                headers.add_vary_header("accept-encoding")
+                del headers["content-length"]
+
+            if self.compressing and not more_body:
+                body = self.compressor.compress(body) + self.compressor.finish()
+                headers["content-length"] = str(len(body))
+                await self.send(self.start_message)
+                await self.send({"type": "http.response.body", "body": body})
+                return
+
+            await self.send(self.start_message)
+
+        if not self.compressing:
+            await self.send(message)
+            return
+
+        body = self.compressor.compress(body)
+        if not more_body:
+            body += self.compressor.finish()
+
+        await self.send({"type": "http.response.body", "body": body, "more_body": more_body})
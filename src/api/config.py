@@ -1,12 +1,18 @@
+from enum import Enum
 from functools import lru_cache
 from pathlib import Path
 
-from pydantic import BaseSettings
+from pydantic import BaseSettings, Field
+import os
 import sys
 
 
 root = Path(__file__).parent.parent
-testing = "pytest" in sys.argv[0]
+# xdist workers are started through `python -c`, so they only show up in the environment
+xdist_worker = os.environ.get("PYTEST_XDIST_WORKER")
+testing = "pytest" in sys.argv[0] or xdist_worker is not None
+# Each parallel test worker gets its own database files
+test_db_suffix = f"_{xdist_worker}" if xdist_worker else ""
 
 
 class UISettings(BaseSettings):
@@ -29,8 +35,139 @@ class CookieSettings(BaseSettings):
     ALGO: str = "HS256"
 
 
+class StorageBackend(str, Enum):
+    SQLITE = "sqlite"
+    MEMORY = "memory"
+
+
 class DBSettings(BaseSettings):
-    URL: str = "sqlite:///test_db.sqlite" if testing else "sqlite:///db.sqlite"
+    BACKEND: StorageBackend = StorageBackend.SQLITE
+    # Still read from the unprefixed URL of older deployments when DB_URL is not set
+    URL: str = Field(
+        f"sqlite:///test_db{test_db_suffix}.sqlite" if testing else "sqlite:///db.sqlite",
+        env=["DB_URL", "URL"],
+    )
+    SHARD_URL: str = (
+        f"sqlite:///test_boards{test_db_suffix}/{{board}}.sqlite" if testing else "sqlite:///boards/{board}.sqlite"
+    )
+    MAX_OPEN_SHARDS: int = 16
+    # Writes arriving within WRITE_BATCH_WAIT seconds of each other share one commit
+    WRITE_BATCH_SIZE: int = 64
+    WRITE_BATCH_WAIT: float = 0.002
+
+    class Config:
+        env_prefix = "DB_"
+
+
+class BackupSettings(BaseSettings):
+    DIR: Path = Path("backups")
+    PAGES_PER_STEP: int = 256
+    STEP_SLEEP: float = 0.005
+
+    class Config:
+        env_prefix = "BACKUP_"
+
+
+class AdmissionSettings(BaseSettings):
+    READ_LIMIT: int = 64
+    WRITE_LIMIT: int = 8
+    QUEUE_SIZE: int = 128
+    QUEUE_TIMEOUT: float = 2.0
+    RETRY_AFTER: int = 1
+
+    class Config:
+        env_prefix = "ADMISSION_"
+
+
+class IdempotencySettings(BaseSettings):
+    TTL_SECONDS: int = 24 * 60 * 60
+    CACHE_SIZE: int = 1024
+    PURGE_INTERVAL_SECONDS: int = 60 * 60
+
+    class Config:
+        env_prefix = "IDEMPOTENCY_"
+
+
+class CompressionSettings(BaseSettings):
+    MINIMUM_SIZE: int = 1024
+    LEVEL: int = 6
+
+    class Config:
+        env_prefix = "COMPRESSION_"
+
+
+class ReminderSettings(BaseSettings):
+    # Deadlines held in memory per board, the next batch is read from the index as they are used up
+    BATCH_SIZE: int = 256
+    MAX_SLEEP_SECONDS: float = 60.0
+    # Reminders that came due this long before startup still fire, older ones are only listed as overdue
+    CATCH_UP_SECONDS: int = 15 * 60
+
+    class Config:
+        env_prefix = "REMINDER_"
+
+
+class HistorySettings(BaseSettings):
+    # Entries older than this are folded into one snapshot per card
+    RETENTION_DAYS: int = 90
+    COMPACT_INTERVAL_SECONDS: int = 60 * 60
+    COMPACT_BATCH_SIZE: int = 500
+
+    class Config:
+        env_prefix = "HISTORY_"
+
+
+class PurgeSettings(BaseSettings):
+    # Deleted cards stay listed as tombstones this long, so mirrors have time to pick up the deletion
+    RETENTION_HOURS: int = 7 * 24
+    INTERVAL_SECONDS: int = 5 * 60
+    # Tombstones hard deleted per write, the purge stops whenever other writes are waiting
+    BATCH_SIZE: int = 200
+    # Free pages handed back to the file system per run
+    VACUUM_PAGES: int = 2000
+
+    class Config:
+        env_prefix = "PURGE_"
+
+
+class JobSettings(BaseSettings):
+    # Jobs running at once, the rest wait queued for a worker
+    MAX_WORKERS: int = 2
+    # Jobs queued or running before new ones are turned away with a 503
+    MAX_PENDING: int = 100
+    # Progress is written to the job at most this often
+    PROGRESS_INTERVAL_SECONDS: float = 1.0
+    # Cards a job changes per write
+    BATCH_SIZE: int = 500
+    # Finished jobs are forgotten after this long
+    KEEP_DAYS: int = 30
+
+    class Config:
+        env_prefix = "JOB_"
+
+
+class HealthSettings(BaseSettings):
+    # The readiness probe reports not ready when the database round trip takes longer than this
+    DB_TIMEOUT_SECONDS: float = 1.0
+    # or when callbacks wait this long for the event loop
+    MAX_LOOP_LAG_SECONDS: float = 0.5
+
+    class Config:
+        env_prefix = "HEALTH_"
+
+
+class WatchdogSettings(BaseSettings):
+    # Off by default, the heartbeat and its thread cost a little on every beat
+    ENABLED: bool = False
+    INTERVAL_SECONDS: float = 0.1
+    # A callback holding the loop longer than this has its stack logged
+    THRESHOLD_SECONDS: float = 0.25
+    # Lag samples kept for the percentiles, and blocked stacks kept for the metrics
+    WINDOW: int = 1024
+    MAX_STALLS: int = 20
+
+    class Config:
+        env_prefix = "WATCHDOG_"
 
 
 class Settings(BaseSettings):
@@ -39,6 +176,16 @@ class Settings(BaseSettings):
     ui: UISettings = UISettings()
     cookie: CookieSettings = CookieSettings()
     db: DBSettings = DBSettings()
+    backup: BackupSettings = BackupSettings()
+    admission: AdmissionSettings = AdmissionSettings()
+    idempotency: IdempotencySettings = IdempotencySettings()
+    compression: CompressionSettings = CompressionSettings()
+    reminders: ReminderSettings = ReminderSettings()
+    history: HistorySettings = HistorySettings()
+    purge: PurgeSettings = PurgeSettings()
+    jobs: JobSettings = JobSettings()
+    health: HealthSettings = HealthSettings()
+    watchdog: WatchdogSettings = WatchdogSettings()
 
 
 @lru_cache
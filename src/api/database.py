@@ -1,10 +1,191 @@
 """Database Connection Pool"""
 
+from collections import Counter, OrderedDict
+from contextvars import ContextVar
+from pathlib import Path
+
+import sqlalchemy
 from databases import Database
+from loguru import logger
 from sqlalchemy import MetaData
+from sqlalchemy.engine import make_url
+from starlette.concurrency import run_in_threadpool
 
 from api.config import get_settings
 
 settings = get_settings()
 metadata = MetaData()
-database = Database(url=settings.db.URL)
+
+DEFAULT_BOARD = "default"
+BOARD_PATTERN = r"^[A-Za-z0-9_-]{1,64}$"
+
+current_board: ContextVar[str] = ContextVar("current_board", default=DEFAULT_BOARD)
+
+
+def sqlite_path(url: str) -> Path:
+    """File path of a sqlite database url"""
+    return Path(make_url(url).database)
+
+
+def rebuild_table(connection: sqlalchemy.engine.Connection, table: sqlalchemy.Table) -> None:
+    """
+    Recreate `table` from its current definition and copy its rows over, for
+    changes sqlite cannot make in place. The indexes are dropped with the old
+    table and created again by `upgrade_schema`.
+    """
+    existing_columns = {column["name"] for column in sqlalchemy.inspect(connection).get_columns(table.name)}
+    columns = ", ".join(f'"{column.name}"' for column in table.columns if column.name in existing_columns)
+    rebuilt = table.to_metadata(MetaData(), name=f"{table.name}_rebuild")
+    connection.execute(sqlalchemy.schema.CreateTable(rebuilt))
+    connection.execute(sqlalchemy.text(f'INSERT INTO "{rebuilt.name}" ({columns}) SELECT {columns} FROM "{table.name}"'))
+    connection.execute(sqlalchemy.text(f'DROP TABLE "{table.name}"'))
+    connection.execute(sqlalchemy.text(f'ALTER TABLE "{rebuilt.name}" RENAME TO "{table.name}"'))
+    logger.info("Rebuilt table {table}", table=table.name)
+
+
+def missing_autoincrement(connection: sqlalchemy.engine.Connection, table: sqlalchemy.Table) -> bool:
+    """Whether `table` should never reuse ids but was created before it was declared that way"""
+    if not table.dialect_options["sqlite"]["autoincrement"]:
+        return False
+
+    sql = connection.execute(
+        sqlalchemy.text("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = :name"), {"name": table.name}
+    ).scalar()
+    return "AUTOINCREMENT" not in sql.upper()
+
+
+def upgrade_schema(connection: sqlalchemy.engine.Connection) -> None:
+    """
+    Add the columns and indexes that tables created by an older version are
+    missing. New columns have to be nullable, as sqlite cannot add any other
+    kind to a table that already has rows. Tables that have to stop reusing
+    ids are rebuilt, copying the rows keeps the largest id in use as the
+    starting point.
+    """
+    for table in metadata.sorted_tables:
+        if missing_autoincrement(connection, table):
+            rebuild_table(connection, table)
+
+    inspector = sqlalchemy.inspect(connection)
+    for table in metadata.sorted_tables:
+        existing_columns = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name not in existing_columns:
+                column_type = column.type.compile(dialect=connection.dialect)
+                connection.execute(sqlalchemy.text(f'ALTER TABLE "{table.name}" ADD COLUMN "{column.name}" {column_type}'))
+                logger.info("Added column {column} to {table}", column=column.name, table=table.name)
+
+        for index in table.indexes:
+            index.create(connection, checkfirst=True)
+
+
+def create_schema(url: str) -> None:
+    """Create any missing tables, columns and indexes in the database at `url`"""
+    sqlite_path(url).parent.mkdir(parents=True, exist_ok=True)
+    engine = sqlalchemy.create_engine(url)
+    try:
+        with engine.connect() as connection:
+            # Lets the purge job hand freed pages back, only takes effect while the file has no tables yet
+            connection.exec_driver_sql("PRAGMA auto_vacuum = INCREMENTAL")
+
+        metadata.create_all(engine)
+        with engine.begin() as connection:
+            upgrade_schema(connection)
+    finally:
+        engine.dispose()
+
+
+class ShardRegistry:
+    """
+    One database per board, opened on first use.
+
+    The default board lives at `DBSettings.URL` and is always open. Other
+    boards live at `DBSettings.SHARD_URL` and at most `max_open` of them stay
+    connected; the least recently used shard with no requests in flight is
+    closed when another one has to be opened.
+    """
+
+    def __init__(self, default_url: str, url_template: str, max_open: int):
+        self.default_url = default_url
+        self.url_template = url_template
+        self.max_open = max_open
+        self._shards: OrderedDict[str, Database] = OrderedDict({DEFAULT_BOARD: Database(url=default_url)})
+        self._in_use: Counter[str] = Counter()
+
+    def url_for(self, board: str) -> str:
+        return self.default_url if board == DEFAULT_BOARD else self.url_template.format(board=board)
+
+    def get(self, board: str) -> Database:
+        try:
+            return self._shards[board]
+        except KeyError:
+            raise LookupError(f"Board {board!r} has not been opened") from None
+
+    @property
+    def open_boards(self) -> list[str]:
+        return list(self._shards)
+
+    async def connect_default(self) -> None:
+        await run_in_threadpool(create_schema, self.default_url)
+        await self._shards[DEFAULT_BOARD].connect()
+
+    async def acquire(self, board: str) -> Database:
+        """Open the board's shard if needed and pin it until `release`"""
+        shard = self._shards.get(board)
+        if shard is None:
+            url = self.url_for(board)
+            await run_in_threadpool(create_schema, url)
+            # Another request may have opened the same board while the schema was created
+            shard = self._shards.setdefault(board, Database(url=url))
+            logger.info("Opened shard for board {board}", board=board)
+
+        self._shards.move_to_end(board)
+        self._in_use[board] += 1
+        await shard.connect()
+        await self.evict_idle()
+        return shard
+
+    def release(self, board: str) -> None:
+        self._in_use[board] -= 1
+        if self._in_use[board] <= 0:
+            del self._in_use[board]
+
+    async def evict_idle(self) -> None:
+        # Picked again before every close, a board can be acquired while an earlier shard disconnects
+        while len(self._shards) > self.max_open:
+            board = next(
+                (board for board in self._shards if board != DEFAULT_BOARD and not self._in_use[board]),
+                None,
+            )
+            if board is None:
+                return
+
+            await self.close(board)
+
+    async def close(self, board: str) -> None:
+        shard = self._shards.pop(board) if board != DEFAULT_BOARD else self._shards[board]
+        if shard.is_connected:
+            await shard.disconnect()
+            logger.info("Closed shard for board {board}", board=board)
+
+    async def close_all(self) -> None:
+        for board in list(self._shards):
+            await self.close(board)
+
+
+class ShardProxy:
+    """Stands in for a `Database`, forwarding every call to the current board's shard"""
+
+    def __init__(self, registry: ShardRegistry):
+        self._registry = registry
+
+    def __getattr__(self, name: str):
+        return getattr(self._registry.get(current_board.get()), name)
+
+
+shards = ShardRegistry(
+    default_url=settings.db.URL,
+    url_template=settings.db.SHARD_URL,
+    max_open=settings.db.MAX_OPEN_SHARDS,
+)
+database = ShardProxy(shards)
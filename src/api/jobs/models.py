@@ -0,0 +1,60 @@
+"""Job Models"""
+from enum import Enum
+from typing import Any
+
+import pendulum
+from ormar import JSON, DateTime, Integer, String, Text
+from ormar import Enum as OrmarEnum
+
+from api.bases import OrmarBaseModel, PydanticBaseModel
+from api.database import database, metadata
+
+
+class JobState(str, Enum):
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    SUCCEEDED = 'succeeded'
+    FAILED = 'failed'
+    CANCELLED = 'cancelled'
+
+    @property
+    def finished(self) -> bool:
+        return self in (JobState.SUCCEEDED, JobState.FAILED, JobState.CANCELLED)
+
+
+class Job(OrmarBaseModel):
+    """
+    One background job. Jobs of every board are kept in the default board's
+    database, so a job can be looked up by id alone.
+    """
+
+    class Meta:
+        database = database
+        metadata = metadata
+        tablename = "jobs"
+
+    id: int = Integer(primary_key=True)
+    kind: str = String(max_length=50, nullable=False)
+    board: str = String(max_length=64, nullable=False)
+    state: JobState = OrmarEnum(default=JobState.QUEUED, nullable=False, enum_class=JobState)
+    done: int = Integer(default=0, nullable=False)
+    total: int | None = Integer(nullable=True)
+    result: Any = JSON(nullable=True)
+    error: str | None = Text(nullable=True)
+    created_dttm: pendulum.DateTime = DateTime(default=pendulum.now, index=True)
+    started_dttm: pendulum.DateTime | None = DateTime(nullable=True)
+    finished_dttm: pendulum.DateTime | None = DateTime(nullable=True)
+
+
+class JobRead(PydanticBaseModel):
+    id: int
+    kind: str
+    board: str
+    state: JobState
+    done: int
+    total: int | None
+    result: Any
+    error: str | None
+    created_dttm: pendulum.DateTime
+    started_dttm: pendulum.DateTime | None
+    finished_dttm: pendulum.DateTime | None
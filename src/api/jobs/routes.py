@@ -0,0 +1,56 @@
+from fastapi import APIRouter, HTTPException, Query, status
+
+from .models import JobRead
+from .service import job_not_found_exception, jobs
+
+router = APIRouter(tags=["Jobs"], prefix="/jobs")
+
+
+@router.get(
+    "/",
+    response_model=list[JobRead],
+    status_code=status.HTTP_200_OK,
+    description="Most recently submitted jobs of every board, newest first",
+    response_description="List of jobs",
+    summary="Recent jobs",
+)
+async def get_jobs(limit: int = Query(20, gt=0, le=1000, description="Maximum number of jobs to return")):
+    return await jobs.recent(limit)
+
+
+@router.get(
+    "/{job_id}",
+    response_model=JobRead,
+    status_code=status.HTTP_200_OK,
+    description="State, progress and, once it has succeeded, result of a job",
+    response_description="Job object",
+    summary="Get job",
+)
+async def get_job(job_id: int):
+    job = await jobs.get(job_id)
+    if job is None:
+        raise job_not_found_exception
+
+    return job
+
+
+@router.post(
+    "/{job_id}/cancel",
+    response_model=JobRead,
+    status_code=status.HTTP_200_OK,
+    description="Cancel a job that is queued or running, changes it already committed are kept",
+    response_description="Cancelled job object",
+    summary="Cancel job",
+)
+async def cancel_job(job_id: int):
+    job = await jobs.get(job_id)
+    if job is None:
+        raise job_not_found_exception
+
+    if job.state.finished or not await jobs.cancel(job_id):
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Job has already {job.state.value}" if job.state.finished else "Job is not running"
+        )
+
+    return await jobs.get(job_id)
@@ -0,0 +1,209 @@
+"""Background Jobs"""
+import asyncio
+import contextlib
+import contextvars
+import time
+from collections.abc import Awaitable, Callable
+from typing import Any
+
+import pendulum
+from fastapi import HTTPException, Response, status
+from fastapi.encoders import jsonable_encoder
+from loguru import logger
+
+from api.config import get_settings
+from api.database import DEFAULT_BOARD, current_board
+from api.writes import writes
+from .models import Job, JobRead, JobState
+
+settings = get_settings()
+
+job_not_found_exception = HTTPException(
+    status_code=status.HTTP_404_NOT_FOUND,
+    detail="Job not found"
+)
+
+
+class JobQueueFull(Exception):
+    """Too many jobs are already queued or running"""
+
+
+@contextlib.contextmanager
+def on_default_board():
+    """Jobs of every board live in the default board's database"""
+    token = current_board.set(DEFAULT_BOARD)
+    try:
+        yield
+    finally:
+        current_board.reset(token)
+
+
+class JobProgress:
+    """Handed to a running job to report how much of its work is done"""
+
+    def __init__(self, runner: "JobRunner", job_id: int, interval: float):
+        self.runner = runner
+        self.job_id = job_id
+        self.interval = interval
+        self.done = 0
+        self.total: int | None = None
+        self._saved_at = 0.0
+
+    async def __call__(self, done: int, total: int | None = None) -> None:
+        self.done = done
+        if total is not None:
+            self.total = total
+
+        # Written at most every `interval` seconds, a job reporting every batch does not add a write per batch
+        now = time.monotonic()
+        if now - self._saved_at >= self.interval or self.total is not None and done >= self.total:
+            self._saved_at = now
+            await self.runner.save(self.job_id, done=self.done, total=self.total)
+
+
+JobFunc = Callable[[JobProgress], Awaitable[Any]]
+
+
+class JobRunner:
+    """
+    Runs long operations in the background, at most `max_workers` at once.
+
+    Every job is a row that moves from queued to running and then to
+    succeeded, failed or cancelled, so its state can be polled by id from
+    any request. Jobs wait for a worker in the order they were submitted and
+    cancelling one interrupts it at its next await, so a write it already
+    handed to the write queue still commits. Jobs still queued or running
+    when the process stops are marked failed by `recover` on the next start.
+    """
+
+    def __init__(self, *, max_workers: int, max_pending: int, progress_interval: float):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.progress_interval = progress_interval
+        self._slots = asyncio.Semaphore(max_workers)
+        self._tasks: dict[int, asyncio.Task] = {}
+
+    @property
+    def pending(self) -> int:
+        return len(self._tasks)
+
+    async def save(self, job_id: int, **values) -> None:
+        with on_default_board():
+            await writes.submit(lambda: Job.objects.filter(id=job_id).update(**values))
+
+    async def get(self, job_id: int) -> JobRead | None:
+        with on_default_board():
+            job = await Job.objects.get_or_none(id=job_id)
+
+        return None if job is None else JobRead.validate(job)
+
+    async def recent(self, limit: int) -> list[JobRead]:
+        with on_default_board():
+            jobs = await Job.objects.order_by(Job.id.desc()).limit(limit).all()
+
+        return [JobRead.validate(job) for job in jobs]
+
+    async def submit(self, kind: str, board: str, func: JobFunc) -> JobRead:
+        if self.pending >= self.max_pending:
+            raise JobQueueFull(f"{self.pending} jobs are already queued or running")
+
+        with on_default_board():
+            job = await writes.submit(lambda: Job(kind=kind, board=board).save())
+
+        # A fresh context so the job never inherits the request's board or connection
+        task = asyncio.create_task(self._run(job.id, func), context=contextvars.Context())
+        self._tasks[job.id] = task
+        task.add_done_callback(lambda _: self._tasks.pop(job.id, None))
+        return JobRead.validate(job)
+
+    async def cancel(self, job_id: int) -> bool:
+        """Cancel a job queued or running in this process, returning whether there was one"""
+        task = self._tasks.get(job_id)
+        if task is None:
+            return False
+
+        task.cancel()
+        await asyncio.wait([task])
+        return True
+
+    async def recover(self, keep_days: int) -> int:
+        """Fail the jobs a previous process left unfinished and forget finished jobs older than `keep_days`"""
+        now = pendulum.now()
+
+        async def recover_jobs():
+            # Counted by id, sqlite hands back the last row id rather than the rows an update touched
+            unfinished = await Job.objects.filter(
+                Job.state.in_([JobState.QUEUED, JobState.RUNNING])
+            ).values_list("id", flatten=True)
+            if unfinished:
+                await Job.objects.filter(Job.id.in_(unfinished)).update(
+                    state=JobState.FAILED,
+                    error="Interrupted by a restart",
+                    finished_dttm=now,
+                )
+
+            await Job.objects.filter(Job.finished_dttm < now.subtract(days=keep_days)).delete()
+            return len(unfinished)
+
+        with on_default_board():
+            return await writes.submit(recover_jobs)
+
+    async def stop(self) -> None:
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+
+        if tasks:
+            await asyncio.wait(tasks)
+
+    async def _finish(self, job_id: int, **values) -> None:
+        """Record how a job ended, a cancel arriving meanwhile waits for the row instead of leaving it running"""
+        save = asyncio.ensure_future(self.save(job_id, finished_dttm=pendulum.now(), **values))
+        try:
+            await asyncio.shield(save)
+        except asyncio.CancelledError:
+            await save
+            raise
+
+    async def _run(self, job_id: int, func: JobFunc) -> None:
+        try:
+            async with self._slots:
+                await self.save(job_id, state=JobState.RUNNING, started_dttm=pendulum.now())
+                result = await func(JobProgress(self, job_id, self.progress_interval))
+        except asyncio.CancelledError:
+            outcome = {"state": JobState.CANCELLED}
+        except Exception as e:
+            logger.exception("Job {job_id} failed", job_id=job_id)
+            outcome = {"state": JobState.FAILED, "error": str(e) or type(e).__name__}
+        else:
+            outcome = {"state": JobState.SUCCEEDED, "result": jsonable_encoder(result, by_alias=True)}
+
+        # The job is over once its work is, so cancelling it while its state is written reports nothing to cancel
+        self._tasks.pop(job_id, None)
+        await self._finish(job_id, **outcome)
+
+
+jobs = JobRunner(
+    max_workers=settings.jobs.MAX_WORKERS,
+    max_pending=settings.jobs.MAX_PENDING,
+    progress_interval=settings.jobs.PROGRESS_INTERVAL_SECONDS,
+)
+
+
+async def start_job(kind: str, func: JobFunc) -> Response:
+    """Run `func` as a job on the current board and answer 202 with the job to poll"""
+    try:
+        job = await jobs.submit(kind, current_board.get(), func)
+    except JobQueueFull:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many jobs are queued, try again later",
+            headers={"Retry-After": str(settings.admission.RETRY_AFTER)},
+        )
+
+    return Response(
+        content=job.json(by_alias=True),
+        status_code=status.HTTP_202_ACCEPTED,
+        media_type="application/json",
+        headers={"Location": f"/api/jobs/{job.id}"},
+    )
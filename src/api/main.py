@@ -1,12 +1,22 @@
-from fastapi import FastAPI
+from fastapi import Depends, FastAPI
 from fastapi.routing import APIRoute
 from fastapi.middleware.cors import CORSMiddleware
 
+from api.admin.routes import router as admin_router
+from api.admission import AdmissionMiddleware, AdmissionPool
+from api.compression import CompressionMiddleware
 from api.cards.routes import router as cards_router
+from api.cards.service import history_compactor, reminders, tombstone_purger, valid_board
+from api.jobs.routes import router as jobs_router
+from api.jobs.service import jobs
 from api.root.routes import router as root_router
-from api.database import database
+from api.watchdog import watchdog
+from api.config import get_settings
+from api.database import DEFAULT_BOARD, shards
 from loguru import logger
 
+settings = get_settings()
+
 
 def create_app():
     """App factory function"""
@@ -14,10 +24,45 @@ def create_app():
     def init_routers(app_: FastAPI):
         """Add all routers to the application"""
         app_.include_router(cards_router, prefix="/api")
+        app_.include_router(
+            cards_router,
+            prefix="/api/boards/{board}",
+            dependencies=[Depends(valid_board)],
+            generate_unique_id_function=lambda route: f"board_{route.name}",
+        )
         app_.include_router(root_router, prefix="/api")
+        app_.include_router(admin_router, prefix="/api")
+        app_.include_router(jobs_router, prefix="/api")
 
     def init_middlewares(app_: FastAPI):
         """Add all middlewares to the application"""
+        app_.add_middleware(
+            CompressionMiddleware,
+            minimum_size=settings.compression.MINIMUM_SIZE,
+            level=settings.compression.LEVEL,
+        )
+        # Kept on the app state so health checks can report pool usage
+        app_.state.read_pool = AdmissionPool(
+            "read",
+            limit=settings.admission.READ_LIMIT,
+            max_queue=settings.admission.QUEUE_SIZE,
+            timeout=settings.admission.QUEUE_TIMEOUT,
+        )
+        app_.state.write_pool = AdmissionPool(
+            "write",
+            limit=settings.admission.WRITE_LIMIT,
+            max_queue=settings.admission.QUEUE_SIZE,
+            timeout=settings.admission.QUEUE_TIMEOUT,
+        )
+        # Added before CORS so it runs inside it and rejections still carry CORS headers
+        app_.add_middleware(
+            AdmissionMiddleware,
+            read_pool=app_.state.read_pool,
+            write_pool=app_.state.write_pool,
+            retry_after=settings.admission.RETRY_AFTER,
+            # Probes answer even when the pools are full, readiness reports how full they are
+            exempt_paths=("/api/health", "/api/ready"),
+        )
         app_.add_middleware(
             CORSMiddleware,
             allow_origins=["*"],
@@ -32,13 +77,28 @@ def create_app():
         @app_.on_event("startup")
         async def connect_database():
             logger.info("[bold green]Connecting to database")
-            await database.connect()
+            await shards.connect_default()
+            n_failed = await jobs.recover(keep_days=settings.jobs.KEEP_DAYS)
+            if n_failed:
+                logger.warning("Marked {count} jobs interrupted by the last shutdown as failed", count=n_failed)
+
+        @app_.on_event("startup")
+        async def start_background_tasks():
+            if settings.watchdog.ENABLED:
+                watchdog.start()
+            reminders.start(DEFAULT_BOARD)
+            history_compactor.start()
+            tombstone_purger.start()
 
         @app_.on_event("shutdown")
         async def disconnect_database():
-            if database.is_connected:
-                logger.info("[bold green]Disconnecting from database")
-                await database.disconnect()
+            await jobs.stop()
+            await reminders.stop()
+            await history_compactor.stop()
+            await tombstone_purger.stop()
+            await watchdog.stop()
+            logger.info("[bold green]Disconnecting from databases")
+            await shards.close_all()
 
     def custom_generate_unique_id(route: APIRoute):
         """Generate unique id for cleaner client names"""
@@ -51,6 +111,14 @@ def create_app():
                 "name": "Cards",
                 "description": "Operations for Cards",
             },
+            {
+                "name": "Admin",
+                "description": "Operations for running the service",
+            },
+            {
+                "name": "Jobs",
+                "description": "Long running operations working in the background",
+            },
         ]
 
     app = FastAPI(
@@ -0,0 +1,27 @@
+"""Root Models"""
+from api.bases import PydanticBaseModel
+
+
+class DatabaseCheck(PydanticBaseModel):
+    ok: bool
+    connected: bool
+    latency_ms: float | None
+    error: str | None
+    open_shards: int
+
+
+class PoolUsage(PydanticBaseModel):
+    limit: int
+    in_flight: int
+    queued: int
+    rejected: int
+
+
+class Readiness(PydanticBaseModel):
+    ready: bool
+    database: DatabaseCheck
+    loop_lag_ms: float
+    reads: PoolUsage
+    writes: PoolUsage
+    queued_writes: int
+    pending_jobs: int
@@ -1,15 +1,48 @@
-from fastapi import APIRouter, status
+from fastapi import APIRouter, Request, status
+from fastapi.responses import JSONResponse
+
 from api.config import get_settings
+from api.jobs.service import jobs
+from api.writes import writes
+from .models import PoolUsage, Readiness
+from .service import check_database, loop_lag
 
 router = APIRouter()
 settings = get_settings()
 
 
-@router.get("/health")
-def get_health():
+@router.get(
+    "/health",
+    description="Liveness check, answers as long as the event loop is running",
+)
+async def get_health():
     return True
 
 
+@router.get(
+    "/ready",
+    response_model=Readiness,
+    description="Readiness check, 503 while the database is unreachable or the event loop is falling behind",
+    responses={status.HTTP_503_SERVICE_UNAVAILABLE: {"model": Readiness}},
+)
+async def get_readiness(request: Request):
+    lag = await loop_lag()
+    database = await check_database(settings.health.DB_TIMEOUT_SECONDS)
+    readiness = Readiness(
+        ready=database.ok and lag <= settings.health.MAX_LOOP_LAG_SECONDS,
+        database=database,
+        loop_lag_ms=lag * 1000,
+        reads=PoolUsage(**request.app.state.read_pool.summary()),
+        writes=PoolUsage(**request.app.state.write_pool.summary()),
+        queued_writes=writes.queued,
+        pending_jobs=jobs.pending,
+    )
+    return JSONResponse(
+        readiness.dict(by_alias=True),
+        status_code=status.HTTP_200_OK if readiness.ready else status.HTTP_503_SERVICE_UNAVAILABLE,
+    )
+
+
 @router.get("/db/path")
 def get_db_path():
     return settings.db.URL
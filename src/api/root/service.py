@@ -0,0 +1,34 @@
+import asyncio
+import time
+
+from api.database import DEFAULT_BOARD, shards
+from .models import DatabaseCheck
+
+
+async def loop_lag() -> float:
+    """Seconds a callback scheduled now waits for the callbacks already queued on the event loop"""
+    started = time.perf_counter()
+    await asyncio.sleep(0)
+    return time.perf_counter() - started
+
+
+async def check_database(timeout: float) -> DatabaseCheck:
+    """Time a trivial query on the default board, which every request and job depends on"""
+    shard = shards.get(DEFAULT_BOARD)
+    started = time.perf_counter()
+    try:
+        await asyncio.wait_for(shard.fetch_val("SELECT 1"), timeout)
+    except asyncio.TimeoutError:
+        latency, error = None, f"No answer within {timeout}s"
+    except Exception as e:
+        latency, error = None, str(e) or type(e).__name__
+    else:
+        latency, error = (time.perf_counter() - started) * 1000, None
+
+    return DatabaseCheck(
+        ok=error is None,
+        connected=shard.is_connected,
+        latency_ms=latency,
+        error=error,
+        open_shards=len(shards.open_boards),
+    )
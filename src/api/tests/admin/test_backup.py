@@ -0,0 +1,66 @@
+"""
+Test Cases
+* `post /admin/backup` creates a consistent snapshot
+* `post /admin/backup` reports snapshot size and duration
+* the backup pauses between steps
+"""
+import sqlite3
+from contextlib import closing
+from pathlib import Path
+
+import pytest
+from fastapi import status
+from api.admin.service import backup_sqlite
+from api.config import get_settings
+
+pytestmark = pytest.mark.anyio
+
+settings = get_settings()
+
+
+@pytest.fixture
+def backup_dir(monkeypatch, tmp_path):
+    monkeypatch.setattr(settings.backup, "DIR", tmp_path)
+    return tmp_path
+
+
+@pytest.mark.committed
+@pytest.mark.num_cards(5)
+async def test_backup(client, clean_db, backup_dir):
+    response = await client.post("/api/admin/backup")
+    data = response.json()
+    snapshot_path = Path(data["path"])
+
+    assert response.status_code == status.HTTP_201_CREATED
+    assert snapshot_path.parent == backup_dir
+    assert data["sizeBytes"] == snapshot_path.stat().st_size
+    assert data["durationSeconds"] >= 0
+    assert data["pages"] > 0
+
+    with closing(sqlite3.connect(snapshot_path)) as snapshot:
+        assert snapshot.execute("pragma integrity_check").fetchone() == ("ok",)
+        assert snapshot.execute("select count(*) from cards").fetchone() == (5,)
+
+
+@pytest.mark.num_cards(0)
+async def test_backup_in_steps(client, clean_db, backup_dir, monkeypatch):
+    monkeypatch.setattr(settings.backup, "PAGES_PER_STEP", 1)
+    response = await client.post("/api/admin/backup")
+    data = response.json()
+
+    assert response.status_code == status.HTTP_201_CREATED
+    assert data["steps"] == data["pages"]
+    assert not list(backup_dir.glob("*.partial"))
+
+
+def test_backup_pauses_between_steps(tmp_path):
+    source_path = tmp_path / "board.sqlite"
+    with closing(sqlite3.connect(source_path)) as source:
+        source.execute("create table notes (body text)")
+        source.executemany("insert into notes values (?)", [("x" * 1000,) for _ in range(40)])
+        source.commit()
+
+    snapshot = backup_sqlite(source_path, tmp_path / "backups", pages_per_step=2, step_sleep=0.02)
+
+    assert snapshot.steps > 5
+    assert snapshot.duration_seconds >= (snapshot.steps - 1) * 0.02
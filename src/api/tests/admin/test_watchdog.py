@@ -0,0 +1,67 @@
+"""
+Test Cases
+* the watchdog records how late its heartbeats wake up
+* a callback blocking the loop past the threshold has its stack captured once
+* `get /admin/loop` reports lag percentiles and stalls, 404 while the watchdog is off
+* the watchdog is configured by WATCHDOG_ variables only
+"""
+import asyncio
+import time
+
+import pytest
+from fastapi import status
+
+from api.config import PurgeSettings, WatchdogSettings
+from api.watchdog import LoopWatchdog, watchdog
+
+pytestmark = pytest.mark.anyio
+
+
+def block_loop(seconds):
+    time.sleep(seconds)
+
+
+async def test_watchdog_catches_blocking_callback():
+    loop_watchdog = LoopWatchdog(interval=0.01, threshold=0.05)
+    loop_watchdog.start()
+    try:
+        await asyncio.sleep(0.05)
+        block_loop(0.2)
+        await asyncio.sleep(0.05)
+    finally:
+        await loop_watchdog.stop()
+
+    metrics = loop_watchdog.summary()
+    # A busy test machine can stall the loop elsewhere too, the blocking call has to be among the stalls once
+    [stall] = [stall for stall in metrics["recent_stalls"] if any("block_loop" in line for line in stall["stack"])]
+
+    assert metrics["samples"] > 2
+    assert metrics["stalls"] == len(metrics["recent_stalls"])
+    assert metrics["lag_max_ms"] >= 150
+    assert stall["blocked_ms"] >= 150
+
+
+async def test_loop_metrics(client):
+    response = await client.get("/api/admin/loop")
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+
+    watchdog.start()
+    try:
+        await asyncio.sleep(3 * watchdog.interval)
+        response = await client.get("/api/admin/loop")
+    finally:
+        await watchdog.stop()
+
+    metrics = response.json()
+    assert response.status_code == status.HTTP_200_OK
+    assert metrics["samples"] >= 1
+    assert metrics["lagP95Ms"] >= metrics["lagP50Ms"] >= 0
+
+
+def test_watchdog_settings(monkeypatch):
+    monkeypatch.setenv("WATCHDOG_ENABLED", "true")
+    monkeypatch.setenv("WATCHDOG_INTERVAL_SECONDS", "0.5")
+    monkeypatch.setenv("ENABLED", "false")
+
+    assert (WatchdogSettings().ENABLED, WatchdogSettings().INTERVAL_SECONDS) == (True, 0.5)
+    assert PurgeSettings().INTERVAL_SECONDS == PurgeSettings.__fields__["INTERVAL_SECONDS"].default
@@ -0,0 +1,116 @@
+"""
+Test Cases
+* requests beyond the pool and queue get a fast 503 with `Retry-After`
+* a queued request runs once a slot frees up
+* a request that waits past the queue timeout gets a 503
+* saturated writes do not block reads
+* exempt paths skip admission control
+"""
+import asyncio
+
+import pytest
+from fastapi import FastAPI, status
+from httpx import AsyncClient
+from api.admission import AdmissionMiddleware, AdmissionPool
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def release():
+    return asyncio.Event()
+
+
+@pytest.fixture
+def pools():
+    return (
+        AdmissionPool("read", limit=1, max_queue=1, timeout=5),
+        AdmissionPool("write", limit=1, max_queue=1, timeout=5),
+    )
+
+
+@pytest.fixture
+async def slow_client(release, pools):
+    app = FastAPI()
+
+    @app.get("/api/slow")
+    @app.post("/api/slow")
+    async def slow():
+        await release.wait()
+        return True
+
+    @app.get("/api/health")
+    async def health():
+        return True
+
+    read_pool, write_pool = pools
+    admitted_app = AdmissionMiddleware(
+        app,
+        read_pool=read_pool,
+        write_pool=write_pool,
+        retry_after=3,
+        exempt_paths=("/api/health",),
+    )
+    async with AsyncClient(app=admitted_app, base_url="http://test") as client_:
+        yield client_
+
+
+async def wait_for_queue(pool: AdmissionPool, in_flight: int, queued: int):
+    while (pool.in_flight, pool.queued) != (in_flight, queued):
+        await asyncio.sleep(0.001)
+
+
+async def test_overflow_is_rejected(slow_client, release, pools):
+    _, write_pool = pools
+    running = asyncio.create_task(slow_client.post("/api/slow"))
+    queued = asyncio.create_task(slow_client.post("/api/slow"))
+    await wait_for_queue(write_pool, in_flight=1, queued=1)
+
+    response = await slow_client.post("/api/slow")
+
+    assert response.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+    assert response.headers["retry-after"] == "3"
+    assert write_pool.rejected == 1
+
+    release.set()
+    assert [response.status_code for response in await asyncio.gather(running, queued)] == [200, 200]
+    assert (write_pool.in_flight, write_pool.queued) == (0, 0)
+
+
+async def test_queue_timeout(slow_client, release, pools):
+    _, write_pool = pools
+    write_pool.timeout = 0.01
+    running = asyncio.create_task(slow_client.post("/api/slow"))
+    await wait_for_queue(write_pool, in_flight=1, queued=0)
+
+    response = await slow_client.post("/api/slow")
+
+    assert response.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+    release.set()
+    assert (await running).status_code == status.HTTP_200_OK
+
+
+async def test_writes_do_not_block_reads(slow_client, release, pools):
+    read_pool, write_pool = pools
+    running = asyncio.create_task(slow_client.post("/api/slow"))
+    await wait_for_queue(write_pool, in_flight=1, queued=0)
+
+    read = asyncio.create_task(slow_client.get("/api/slow"))
+    await wait_for_queue(read_pool, in_flight=1, queued=0)
+    release.set()
+
+    assert (await read).status_code == status.HTTP_200_OK
+    assert (await running).status_code == status.HTTP_200_OK
+
+
+async def test_exempt_path(slow_client, release, pools):
+    read_pool, _ = pools
+    running = asyncio.create_task(slow_client.get("/api/slow"))
+    queued = asyncio.create_task(slow_client.get("/api/slow"))
+    await wait_for_queue(read_pool, in_flight=1, queued=1)
+
+    response = await slow_client.get("/api/health")
+
+    assert response.status_code == status.HTTP_200_OK
+    release.set()
+    await asyncio.gather(running, queued)
@@ -0,0 +1,140 @@
+"""
+Test Cases
+* `post /boards/{board}/cards` keeps cards in the board's shard
+* `get /boards/{board}/cards/filter` only reads the board's cards
+* `get /boards/{board}/cards` an invalid board name
+* `get /boards/{board}/cards/version` only changes with writes to that board
+* shards are opened lazily and idle ones are closed least recently used first
+* a shard acquired while another one is being closed stays open
+"""
+import asyncio
+
+import pytest
+from fastapi import status
+from api.cards.models import Card
+from api.database import DEFAULT_BOARD, ShardRegistry, shards
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+async def board_shards(monkeypatch, tmp_path):
+    monkeypatch.setattr(shards, "url_template", f"sqlite:///{tmp_path}/{{board}}.sqlite")
+    yield tmp_path
+    for board in shards.open_boards:
+        if board != DEFAULT_BOARD:
+            await shards.close(board)
+
+
+@pytest.mark.num_cards(2)
+async def test_board_create(client, clean_db, board_shards):
+    response = await client.post("/api/boards/team-a/cards/", json={"title": "board card", "summary": "test"})
+
+    assert response.status_code == status.HTTP_201_CREATED
+    assert (board_shards / "team-a.sqlite").exists()
+    assert await Card.objects.count() == 2
+
+    response = await client.get(f"/api/boards/team-a/cards/{response.json()['id']}")
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()["title"] == "board card"
+
+
+@pytest.mark.num_cards(3)
+async def test_board_filter(client, clean_db, board_shards):
+    for board, n_cards in [("team-a", 2), ("team-b", 1)]:
+        for i in range(n_cards):
+            await client.post(f"/api/boards/{board}/cards/", json={"title": f"{board} {i}", "summary": "test"})
+
+    counts = {}
+    for board in ["team-a", "team-b"]:
+        response = await client.get(f"/api/boards/{board}/cards/filter/")
+        counts[board] = len(response.json()["cards"])
+
+    default_response = await client.get("/api/cards/filter/")
+
+    assert counts == {"team-a": 2, "team-b": 1}
+    assert len(default_response.json()["cards"]) == 3
+
+
+async def test_board_versions(client, board_shards):
+    async def versions():
+        return [
+            (await client.get(f"{path}/cards/version/")).json()["version"]
+            for path in ["/api", "/api/boards/team-a", "/api/boards/team-b"]
+        ]
+
+    default_version, team_a_version, team_b_version = await versions()
+    await client.post("/api/boards/team-a/cards/", json={"title": "board card", "summary": "test"})
+
+    default_after, team_a_after, team_b_after = await versions()
+
+    assert (default_after, team_b_after) == (default_version, team_b_version)
+    assert team_a_after != team_a_version
+
+
+async def test_board_invalid_name(client, board_shards):
+    response = await client.get("/api/boards/bad.name/cards/filter/")
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+
+async def test_shard_lru_eviction(tmp_path):
+    registry = ShardRegistry(
+        default_url=f"sqlite:///{tmp_path}/default.sqlite",
+        url_template=f"sqlite:///{tmp_path}/{{board}}.sqlite",
+        max_open=3,
+    )
+
+    async def touch(board):
+        await registry.acquire(board)
+        registry.release(board)
+
+    await touch("a")
+    await touch("b")
+    assert registry.open_boards == [DEFAULT_BOARD, "a", "b"]
+
+    pinned = await registry.acquire("c")
+    assert registry.open_boards == [DEFAULT_BOARD, "b", "c"]
+
+    await touch("b")
+    await touch("d")
+    assert registry.open_boards == [DEFAULT_BOARD, "c", "d"]
+    assert pinned.is_connected
+
+    registry.release("c")
+    await registry.close_all()
+    assert registry.open_boards == [DEFAULT_BOARD]
+
+
+async def test_eviction_skips_board_acquired_meanwhile(tmp_path):
+    registry = ShardRegistry(
+        default_url=f"sqlite:///{tmp_path}/default.sqlite",
+        url_template=f"sqlite:///{tmp_path}/{{board}}.sqlite",
+        max_open=4,
+    )
+    for board in ["a", "b", "c"]:
+        await registry.acquire(board)
+        registry.release(board)
+
+    closing, resume = asyncio.Event(), asyncio.Event()
+    shard_a = registry.get("a")
+    disconnect = shard_a.disconnect
+
+    async def slow_disconnect():
+        closing.set()
+        await resume.wait()
+        await disconnect()
+
+    shard_a.disconnect = slow_disconnect
+    registry.max_open = 2
+    eviction = asyncio.create_task(registry.evict_idle())
+    await closing.wait()
+
+    pinned = await registry.acquire("b")
+    resume.set()
+    await eviction
+
+    assert pinned.is_connected
+    assert registry.open_boards == [DEFAULT_BOARD, "b"]
+
+    registry.release("b")
+    await registry.close_all()
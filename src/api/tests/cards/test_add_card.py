@@ -11,13 +11,17 @@ import pytest
 from httpx import AsyncClient
 from fastapi import status
 from api.cards.models import Card, State, Priority
+from api.config import get_settings
 
 pytestmark = pytest.mark.anyio
 
+settings = get_settings()
+
 
 async def test_root(client):
     response = await client.get("/api/db/path")
-    assert response.json() == "sqlite:///test_db.sqlite"
+    assert response.json() == settings.db.URL
+    assert response.json().startswith("sqlite:///test_db")
 
 
 @pytest.mark.num_cards(0)
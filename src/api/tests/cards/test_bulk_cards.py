@@ -0,0 +1,100 @@
+"""
+Test Cases
+* `post /cards/bulk` many cards
+* `post /cards/bulk` keeps imported timestamps
+* `post /cards/bulk` records each creation under the id the card got
+* `post /cards/bulk` empty and oversized batches
+* `post /cards/bulk` resent with its Idempotency-Key after it committed creates nothing again
+* `get /cards/export` every card
+* `get /cards/export` resuming after an id
+"""
+import json
+
+import pendulum
+import pytest
+from fastapi import status
+from api.cards.models import Card, CardHistory, HistoryKind, State, Priority
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.mark.num_cards(0)
+async def test_bulk_create(client, clean_db):
+    body = [{"title": f"card {i}", "summary": "bulk", "priority": Priority.HIGH.value} for i in range(50)]
+    response = await client.post("/api/cards/bulk/", json=body)
+
+    assert response.status_code == status.HTTP_201_CREATED
+    assert response.json()["count"] == 50
+    assert await Card.objects.filter(priority=Priority.HIGH).count() == 50
+
+
+@pytest.mark.num_cards(0)
+async def test_bulk_create_timestamps(client, clean_db):
+    created = pendulum.DateTime(2022, 1, 1, 10, 10, 10)
+    finished = pendulum.DateTime(2022, 1, 2, 10, 10, 10)
+    body = [
+        {"title": "imported", "state": State.DONE.value, "createdDttm": str(created), "finishedDttm": str(finished)},
+        {"title": "new", "state": State.DONE.value},
+    ]
+    response = await client.post("/api/cards/bulk/", json=body)
+    imported_card = await Card.objects.get(title="imported")
+    new_card = await Card.objects.get(title="new")
+
+    assert response.status_code == status.HTTP_201_CREATED
+    assert imported_card.created_dttm == created
+    assert imported_card.finished_dttm == finished
+    assert imported_card.started_dttm is not None
+    assert new_card.finished_dttm is not None
+
+
+@pytest.mark.num_cards(3)
+async def test_bulk_create_history(client, clean_db):
+    body = [{"title": f"card {i}"} for i in range(5)]
+    await client.post("/api/cards/bulk/", json=body, headers={"X-Actor": "ann"})
+    cards = await Card.objects.filter(title__startswith="card ").all()
+    created = await CardHistory.objects.filter(kind=HistoryKind.CREATED, actor="ann").all()
+
+    assert len(cards) == 5
+    assert {entry.card_id: entry.changes["title"]["new"] for entry in created} == {card.id: card.title for card in cards}
+
+
+@pytest.mark.num_cards(0)
+async def test_bulk_create_replayed(client, clean_db):
+    body = [{"title": f"card {i}"} for i in range(5)]
+    headers = {"Idempotency-Key": "import-abc-0"}
+    first = await client.post("/api/cards/bulk/", json=body, headers=headers)
+    replayed = await client.post("/api/cards/bulk/", json=body, headers=headers)
+    other = await client.post("/api/cards/bulk/", json=body[:2], headers=headers)
+
+    assert (first.status_code, replayed.status_code) == (status.HTTP_201_CREATED, status.HTTP_201_CREATED)
+    assert replayed.json() == first.json() == {"count": 5}
+    assert other.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+    assert await Card.objects.count() == 5
+
+
+@pytest.mark.parametrize("n_cards", [0, 1001])
+async def test_bulk_create_bad_size(client, n_cards):
+    body = [{"title": f"card {i}"} for i in range(n_cards)]
+    response = await client.post("/api/cards/bulk/", json=body)
+
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+
+@pytest.mark.num_cards(5)
+async def test_export(client, clean_db):
+    response = await client.get("/api/cards/export/")
+    cards = [json.loads(line) for line in response.text.splitlines()]
+
+    assert response.status_code == status.HTTP_200_OK
+    assert len(cards) == 5
+    assert [card["id"] for card in cards] == sorted(card["id"] for card in cards)
+
+
+@pytest.mark.num_cards(5)
+async def test_export_resume(client, clean_db):
+    card_ids = sorted(card.id for card in await Card.objects.all())
+    response = await client.get("/api/cards/export/", params={"after_id": card_ids[1]})
+    cards = [json.loads(line) for line in response.text.splitlines()]
+
+    assert response.status_code == status.HTTP_200_OK
+    assert [card["id"] for card in cards] == card_ids[2:]
@@ -0,0 +1,44 @@
+"""
+Test Cases
+* `get /cards/version` is stable without writes
+* `get /cards/version` changes after each kind of write
+"""
+import pytest
+from fastapi import status
+from api.cards.models import Card
+
+pytestmark = pytest.mark.anyio
+
+
+async def get_version(client) -> str:
+    response = await client.get("/api/cards/version/")
+    assert response.status_code == status.HTTP_200_OK
+    return response.json()["version"]
+
+
+@pytest.mark.num_cards(3)
+async def test_version_stable_without_writes(client, clean_db):
+    first_version = await get_version(client)
+    await client.get("/api/cards/filter/")
+    await client.get("/api/cards/count/")
+
+    assert await get_version(client) == first_version
+
+
+@pytest.mark.num_cards(0)
+async def test_version_changes_on_write(client, clean_db):
+    card = await Card.objects.create(title="test", summary="test summary")
+    requests = [
+        lambda: client.post("/api/cards/", json={"title": "new", "summary": "new"}),
+        lambda: client.patch(f"/api/cards/{card.id}", json={"title": "updated"}),
+        lambda: client.patch(f"/api/cards/start/{card.id}"),
+        lambda: client.patch(f"/api/cards/finish/{card.id}"),
+        lambda: client.delete(f"/api/cards/{card.id}"),
+    ]
+
+    versions = {await get_version(client)}
+    for request in requests:
+        await request()
+        versions.add(await get_version(client))
+
+    assert len(versions) == len(requests) + 1
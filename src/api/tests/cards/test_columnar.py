@@ -0,0 +1,76 @@
+"""
+Test Cases
+* `get /cards/filter` returns a columnar page when it is accepted
+* `get /cards/filter` columnar pages honour sparse fieldsets and paging
+* `get /cards/export` streams columnar pages
+* clients that do not ask for it keep getting JSON
+"""
+import pendulum
+import pytest
+from fastapi import status
+from httpx import QueryParams
+
+pytest.importorskip("msgpack")
+
+from api.cards.columnar import COLUMNAR_MEDIA_TYPE, decode_cards, decode_page, page_unpacker
+from api.cards.models import Card, CardField, Priority, State
+
+pytestmark = pytest.mark.anyio
+
+COLUMNAR = {"Accept": COLUMNAR_MEDIA_TYPE}
+
+
+@pytest.mark.num_cards(0)
+async def test_read_columnar(client, clean_db):
+    finished_dttm = pendulum.datetime(2022, 12, 1, 9, 30, 15, 123456, tz=None)
+    await Card.objects.bulk_create([
+        Card(title="open", summary="first", priority=Priority.HIGH),
+        Card(title="done", state=State.DONE, finished_dttm=finished_dttm),
+    ])
+
+    response = await client.get("/api/cards/filter/", headers=COLUMNAR)
+    page = decode_page(response.content)
+    columns = decode_cards(page)
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["content-type"] == COLUMNAR_MEDIA_TYPE
+    assert page["count"] == 2
+    assert set(columns) == {field.value for field in CardField}
+    assert list(columns["id"]) == sorted(columns["id"])
+    assert columns["title"] == ["open", "done"]
+    assert columns["summary"] == ["first", None]
+    assert columns["state"] == [State.TODO, State.DONE]
+    assert columns["priority"] == [Priority.HIGH, Priority.LOW]
+    assert columns["finished_dttm"] == [None, finished_dttm.naive()]
+    assert all(created_dttm is not None for created_dttm in columns["created_dttm"])
+
+
+@pytest.mark.num_cards(5)
+async def test_read_columnar_fields_and_pages(client, clean_db):
+    query_params = QueryParams(fields=["state"], limit=3)
+    response = await client.get("/api/cards/filter/", params=query_params, headers=COLUMNAR)
+    page = decode_page(response.content)
+    columns = decode_cards(page)
+
+    assert set(columns) == {"id", "state"}
+    assert columns["state"] == [State.TODO] * 3
+    assert page["nextAfterId"] == columns["id"][-1]
+
+
+@pytest.mark.num_cards(5)
+async def test_export_columnar(client, clean_db):
+    response = await client.get("/api/cards/export/", headers=COLUMNAR)
+    unpacker = page_unpacker()
+    unpacker.feed(response.content)
+    pages = [decode_cards(page) for page in unpacker]
+
+    assert response.headers["content-type"] == COLUMNAR_MEDIA_TYPE
+    assert sum(len(page["id"]) for page in pages) == 5
+
+
+@pytest.mark.num_cards(2)
+async def test_json_by_default(client, clean_db):
+    response = await client.get("/api/cards/filter/", headers={"Accept": "application/json"})
+
+    assert response.headers["content-type"] == "application/json"
+    assert len(response.json()["cards"]) == 2
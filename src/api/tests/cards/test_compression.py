@@ -0,0 +1,64 @@
+"""
+Test Cases
+* `get /cards/filter` above the size threshold is gzip compressed
+* `get /cards/{card_id}` below the threshold is sent as is
+* clients that do not accept a coding, or refuse it with q=0, get plain responses
+* `get /cards/export` streams compressed lines
+* zstd is preferred when it is installed
+"""
+import json
+
+import pytest
+from fastapi import status
+from api.cards.models import Card
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.mark.num_cards(50)
+async def test_large_response_compressed(client, clean_db):
+    response = await client.get("/api/cards/filter/", headers={"Accept-Encoding": "gzip"})
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["content-encoding"] == "gzip"
+    assert "accept-encoding" in response.headers["vary"].lower()
+    assert int(response.headers["content-length"]) < len(response.content)
+    assert len(response.json()["cards"]) == 50
+
+
+@pytest.mark.num_cards(1)
+async def test_small_response_not_compressed(client, clean_db):
+    card = await Card.objects.first()
+    response = await client.get(f"/api/cards/{card.id}", headers={"Accept-Encoding": "gzip"})
+
+    assert response.status_code == status.HTTP_200_OK
+    assert "content-encoding" not in response.headers
+    assert response.json()["id"] == card.id
+
+
+@pytest.mark.parametrize("accept_encoding", ["identity", "gzip;q=0", "deflate"])
+@pytest.mark.num_cards(50)
+async def test_coding_not_accepted(client, clean_db, accept_encoding):
+    response = await client.get("/api/cards/filter/", headers={"Accept-Encoding": accept_encoding})
+
+    assert "content-encoding" not in response.headers
+    assert len(response.json()["cards"]) == 50
+
+
+@pytest.mark.num_cards(20)
+async def test_streamed_export_compressed(client, clean_db):
+    response = await client.get("/api/cards/export/", headers={"Accept-Encoding": "gzip"})
+    lines = [json.loads(line) for line in response.text.splitlines()]
+
+    assert response.headers["content-encoding"] == "gzip"
+    assert "content-length" not in response.headers
+    assert len(lines) == 20
+
+
+@pytest.mark.num_cards(50)
+async def test_zstd_preferred(client, clean_db):
+    zstandard = pytest.importorskip("zstandard")
+    response = await client.get("/api/cards/filter/", headers={"Accept-Encoding": "gzip, zstd"})
+
+    assert response.headers["content-encoding"] == "zstd"
+    assert len(json.loads(zstandard.ZstdDecompressor().decompressobj().decompress(response.content))["cards"]) == 50
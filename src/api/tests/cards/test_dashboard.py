@@ -0,0 +1,73 @@
+"""
+Test Cases
+* `get /cards/dashboard` empty database
+* `get /cards/dashboard` counts by state and priority
+* `get /cards/dashboard` finished cards per day
+* `get /cards/dashboard` top open cards by priority
+"""
+import pendulum
+import pytest
+from fastapi import status
+from api.cards.models import Card, State, Priority
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture()
+def sample_cards():
+    today = pendulum.today()
+    return [
+        Card(title="low todo", state=State.TODO, priority=Priority.LOW),
+        Card(title="urgent todo", state=State.TODO, priority=Priority.URGENT),
+        Card(title="high doing", state=State.IN_PROGRESS, priority=Priority.HIGH),
+        Card(title="urgent done", state=State.DONE, priority=Priority.URGENT, finished_dttm=today.add(hours=1)),
+        Card(title="low done", state=State.DONE, priority=Priority.LOW, finished_dttm=today.add(hours=2)),
+        Card(title="old done", state=State.DONE, priority=Priority.LOW, finished_dttm=today.subtract(days=2)),
+        Card(title="ancient done", state=State.DONE, priority=Priority.LOW, finished_dttm=today.subtract(days=60)),
+    ]
+
+
+@pytest.mark.num_cards(0)
+async def test_dashboard_empty(client, clean_db):
+    response = await client.get("/api/cards/dashboard/")
+    data = response.json()
+
+    assert response.status_code == status.HTTP_200_OK
+    assert data["states"] == {state.value: 0 for state in State}
+    assert data["priorities"] == {priority.value: 0 for priority in Priority}
+    assert data["finishedPerDay"] == []
+    assert data["topCards"] == []
+
+
+@pytest.mark.num_cards(0)
+async def test_dashboard_counts(client, clean_db, sample_cards):
+    for card in sample_cards:
+        await card.save()
+
+    response = await client.get("/api/cards/dashboard/", params={"days": 7})
+    data = response.json()
+
+    assert response.status_code == status.HTTP_200_OK
+    assert data["states"] == {State.TODO.value: 2, State.IN_PROGRESS.value: 1, State.DONE.value: 4}
+    assert data["priorities"] == {
+        Priority.URGENT.value: 2,
+        Priority.HIGH.value: 1,
+        Priority.MEDIUM.value: 0,
+        Priority.LOW.value: 4,
+    }
+    assert data["finishedPerDay"] == [
+        {"day": pendulum.today().subtract(days=2).date().isoformat(), "count": 1},
+        {"day": pendulum.today().date().isoformat(), "count": 2},
+    ]
+
+
+@pytest.mark.num_cards(0)
+async def test_dashboard_top_cards(client, clean_db, sample_cards):
+    for card in sample_cards:
+        await card.save()
+
+    response = await client.get("/api/cards/dashboard/", params={"top": 2})
+    data = response.json()
+
+    assert response.status_code == status.HTTP_200_OK
+    assert [card["title"] for card in data["topCards"]] == ["urgent todo", "high doing"]
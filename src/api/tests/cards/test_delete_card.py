@@ -1,7 +1,7 @@
 """
 Test Cases
 * `delete /cards/{card_id}` empty database
-* `delete /cards/{card_id}` one card database
+* `delete /cards/{card_id}` one card database, leaving a tombstone the card routes no longer see
 * `delete /cards/{card_id}` many card database
 """
 import pytest
@@ -23,10 +23,15 @@ async def test_delete_ticket_from_one(client, clean_db):
     await card.save()
 
     response = await client.delete(f"/api/cards/{card.id}")
-    card_exists = await Card.objects.filter(id=card.id).exists()
+    card_exists = await Card.objects.filter(id=card.id, deleted_dttm__isnull=True).exists()
+    tombstone = await Card.objects.get(id=card.id)
 
     assert response.status_code == status.HTTP_204_NO_CONTENT
     assert not card_exists
+    assert tombstone.deleted_dttm is not None
+
+    response = await client.get(f"/api/cards/{card.id}")
+    assert response.status_code == status.HTTP_404_NOT_FOUND
 
 
 @pytest.mark.num_cards(0)
@@ -45,8 +50,8 @@ async def test_delete_ticket_from_many(client, clean_db):
 
     response = await client.delete(f"/api/cards/{delete_card_id}")
 
-    final_count = await Card.objects.count()
-    card_exists = await Card.objects.filter(id=card_1.id).exists()
+    final_count = await Card.objects.filter(deleted_dttm__isnull=True).count()
+    card_exists = await Card.objects.filter(id=card_1.id, deleted_dttm__isnull=True).exists()
 
     assert response.status_code == status.HTTP_204_NO_CONTENT
     assert not card_exists
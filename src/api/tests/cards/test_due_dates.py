@@ -0,0 +1,168 @@
+"""
+Test Cases
+* cards are created and updated with a due date
+* `get /cards/due` lists overdue and soon due open cards, soonest first
+* the scheduler fires each reminder once, in due order, loading a batch at a time
+* the scheduler skips cards finished or rescheduled after they were loaded
+* the scheduler picks up due dates set while it runs
+* databases from before due dates get the column and index added
+"""
+import asyncio
+import contextlib
+import sqlite3
+
+import pendulum
+import pytest
+from fastapi import status
+
+from api.cards.memory import MemoryCardRepository
+from api.cards.reminders import ReminderScheduler
+from api.database import create_schema
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture()
+def memory_repository():
+    return MemoryCardRepository()
+
+
+@pytest.fixture()
+async def scheduler(memory_repository):
+    fired = []
+
+    @contextlib.asynccontextmanager
+    async def open_repository(board):
+        yield memory_repository
+
+    async def on_due(board, card):
+        fired.append(card.id)
+
+    scheduler_ = ReminderScheduler(
+        "default",
+        open_repository,
+        batch_size=2,
+        max_sleep=1.0,
+        catch_up=60,
+        on_due=on_due,
+    )
+    scheduler_.fired_ids = fired
+    yield scheduler_
+    await scheduler_.stop()
+
+
+async def wait_for_reminders(scheduler, count, timeout=2.0):
+    async def fired():
+        while scheduler.fired < count:
+            await asyncio.sleep(0.01)
+
+    await asyncio.wait_for(fired(), timeout)
+
+
+@pytest.mark.num_cards(0)
+async def test_create_and_update_due_date(client, clean_db):
+    due_dttm = pendulum.datetime(2030, 1, 31, 17, 0, tz=None)
+    response = await client.post("/api/cards/", json={"title": "With deadline", "dueDttm": str(due_dttm)})
+    card = response.json()
+
+    assert response.status_code == status.HTTP_201_CREATED
+    assert pendulum.parse(card["dueDttm"]).naive() == due_dttm.naive()
+
+    response = await client.patch(f"/api/cards/{card['id']}", json={"dueDttm": None})
+    assert response.status_code == status.HTTP_204_NO_CONTENT
+
+    response = await client.get(f"/api/cards/{card['id']}")
+    assert response.json()["dueDttm"] is None
+
+
+@pytest.mark.num_cards(2)
+async def test_due_cards(client, clean_db):
+    now = pendulum.now()
+    for title, due_dttm in [
+        ("next week", now.add(days=7)),
+        ("tomorrow", now.add(hours=20)),
+        ("overdue", now.subtract(days=1)),
+        ("finished", now.add(hours=1)),
+    ]:
+        response = await client.post("/api/cards/", json={"title": title, "dueDttm": str(due_dttm)})
+
+    await client.patch(f"/api/cards/finish/{response.json()['id']}")
+
+    response = await client.get("/api/cards/due/")
+    assert response.status_code == status.HTTP_200_OK
+    assert [card["title"] for card in response.json()] == ["overdue", "tomorrow"]
+
+    response = await client.get("/api/cards/due/", params={"within_hours": 24 * 8, "limit": 1})
+    assert [card["title"] for card in response.json()] == ["overdue"]
+
+
+async def test_scheduler_fires_in_batches(scheduler, memory_repository):
+    now = pendulum.now()
+    card_ids = []
+    for offset in [0.15, -5, 0.05, 0.1, 0.2]:
+        card = await memory_repository.create({"title": f"due in {offset}", "due_dttm": now.add(seconds=offset)})
+        card_ids.append(card.id)
+
+    scheduler.start()
+    await wait_for_reminders(scheduler, 5)
+
+    assert scheduler.fired_ids == [card_ids[1], card_ids[2], card_ids[3], card_ids[0], card_ids[4]]
+    assert scheduler.reloads >= 3
+    assert scheduler.pending == 0
+
+
+async def test_scheduler_skips_stale_entries(scheduler, memory_repository):
+    now = pendulum.now()
+    finished = await memory_repository.create({"title": "finished", "due_dttm": now.add(seconds=0.05)})
+    moved = await memory_repository.create({"title": "moved", "due_dttm": now.add(seconds=0.05)})
+    scheduler.start()
+    await asyncio.sleep(0.01)
+
+    await memory_repository.update(finished.id, finished_dttm=pendulum.now())
+    await memory_repository.update(moved.id, due_dttm=now.add(seconds=0.2))
+    scheduler.notify(moved.id, now.add(seconds=0.2))
+    await wait_for_reminders(scheduler, 1)
+    await asyncio.sleep(0.1)
+
+    assert scheduler.fired_ids == [moved.id]
+
+
+async def test_scheduler_picks_up_new_due_dates(scheduler, memory_repository):
+    scheduler.start()
+    await asyncio.sleep(0.01)
+
+    card = await memory_repository.create({"title": "later", "due_dttm": pendulum.now().add(seconds=0.05)})
+    scheduler.notify(card.id, card.due_dttm)
+    await wait_for_reminders(scheduler, 1)
+
+    cards = [
+        await memory_repository.create({"title": f"bulk {i}", "due_dttm": pendulum.now().add(seconds=0.05)})
+        for i in range(3)
+    ]
+    scheduler.refresh()
+    await wait_for_reminders(scheduler, 4)
+
+    assert scheduler.fired_ids == [card.id] + [card.id for card in cards]
+
+
+def test_schema_upgrade(tmp_path):
+    path = tmp_path / "old.sqlite"
+    with contextlib.closing(sqlite3.connect(path)) as connection:
+        connection.execute(
+            "CREATE TABLE cards (id INTEGER PRIMARY KEY, title VARCHAR(100) NOT NULL, summary TEXT,"
+            " state VARCHAR(11) NOT NULL, priority VARCHAR(6) NOT NULL, created_dttm DATETIME,"
+            " started_dttm DATETIME, finished_dttm DATETIME)"
+        )
+        connection.execute("INSERT INTO cards (title, state, priority) VALUES ('old', 'TODO', 'LOW')")
+        connection.commit()
+
+    create_schema(f"sqlite:///{path}")
+
+    with contextlib.closing(sqlite3.connect(path)) as connection:
+        columns = [row[1] for row in connection.execute("PRAGMA table_info(cards)")]
+        indexes = [row[1] for row in connection.execute("PRAGMA index_list(cards)")]
+        rows = connection.execute("SELECT title, due_dttm FROM cards").fetchall()
+
+    assert "due_dttm" in columns
+    assert "ix_cards_open_due_dttm" in indexes
+    assert rows == [("old", None)]
@@ -0,0 +1,157 @@
+"""
+Test Cases
+* every change to a card is recorded with its actor and the fields it changed
+* `get /cards/{card_id}/history` pages on the entry id
+* history outlives the card, unknown cards return 404
+* `post /cards/history/compact` folds old entries into a snapshot and keeps newer ones
+* folding drops fields that ended where they started
+* the compactor folds the history of every board in use on its own
+"""
+import asyncio
+import contextlib
+
+import pendulum
+import pytest
+from fastapi import status
+
+from api.cards.compaction import HistoryCompactor
+from api.cards.history import fold_changes
+from api.cards.memory import MemoryCardRepository
+from api.cards.models import CardHistory
+
+pytestmark = pytest.mark.anyio
+
+
+async def history_events(client, card_id, **params):
+    response = await client.get(f"/api/cards/{card_id}/history/", params=params)
+    assert response.status_code == status.HTTP_200_OK
+    return response.json()["events"]
+
+
+async def create_card(client, title="Draft", actor="ann"):
+    response = await client.post("/api/cards/", json={"title": title}, headers={"X-Actor": actor})
+    return response.json()["id"]
+
+
+@pytest.mark.num_cards(0)
+async def test_history_records_changes(client, clean_db):
+    card_id = await create_card(client)
+    await client.patch(f"/api/cards/start/{card_id}", headers={"X-Actor": "bob"})
+    await client.patch(f"/api/cards/{card_id}", json={"title": "Final"})
+    await client.patch(f"/api/cards/finish/{card_id}", headers={"X-Actor": "ann"})
+
+    events = await history_events(client, card_id)
+
+    assert [(event["kind"], event["actor"]) for event in events] == [
+        ("created", "ann"),
+        ("started", "bob"),
+        ("updated", None),
+        ("finished", "ann"),
+    ]
+    assert events[0]["changes"]["title"] == {"old": None, "new": "Draft"}
+    assert events[1]["changes"]["state"] == {"old": "ToDo", "new": "In Progress"}
+    assert events[2]["changes"] == {"title": {"old": "Draft", "new": "Final"}}
+    assert set(events[3]["changes"]) == {"state", "finished_dttm"}
+
+
+@pytest.mark.num_cards(0)
+async def test_history_pages(client, clean_db):
+    card_id = await create_card(client)
+    for n in range(4):
+        await client.patch(f"/api/cards/{card_id}", json={"title": f"Draft {n}"})
+
+    response = await client.get(f"/api/cards/{card_id}/history/", params={"limit": 2})
+    page = response.json()
+    ids = [event["id"] for event in page["events"]]
+
+    while page["nextAfterId"] is not None:
+        response = await client.get(
+            f"/api/cards/{card_id}/history/",
+            params={"limit": 2, "after_id": page["nextAfterId"]},
+        )
+        page = response.json()
+        ids += [event["id"] for event in page["events"]]
+
+    assert len(ids) == 5
+    assert ids == sorted(ids)
+
+
+@pytest.mark.num_cards(0)
+async def test_history_survives_delete(client, clean_db):
+    card_id = await create_card(client)
+    await client.delete(f"/api/cards/{card_id}", headers={"X-Actor": "bob"})
+
+    events = await history_events(client, card_id)
+    assert [(event["kind"], event["actor"]) for event in events] == [("created", "ann"), ("deleted", "bob")]
+    assert events[1]["changes"]["title"] == {"old": "Draft", "new": None}
+
+    response = await client.get("/api/cards/999999/history/")
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+
+
+@pytest.mark.num_cards(0)
+async def test_compaction_keeps_recent_entries(client, clean_db, wait_for_job):
+    card_id = await create_card(client)
+    await client.patch(f"/api/cards/{card_id}", json={"title": "Second", "priority": "High"})
+    await client.patch(f"/api/cards/{card_id}", json={"title": "Third", "priority": "Low"})
+    old, middle, recent = await history_events(client, card_id)
+
+    long_ago = pendulum.now().subtract(days=100).naive()
+    await CardHistory.objects.filter(id__in=[old["id"], middle["id"]]).update(created_dttm=long_ago)
+
+    job = await wait_for_job(await client.post("/api/cards/history/compact/", params={"older_than_days": 90}))
+    assert job["result"] == {"cards": 1, "folded": 2}
+
+    snapshot, kept = await history_events(client, card_id)
+    assert snapshot["id"] == middle["id"]
+    assert snapshot["kind"] == "snapshot"
+    assert snapshot["folded"] == 2
+    assert snapshot["changes"]["title"] == {"old": None, "new": "Second"}
+    assert snapshot["changes"]["priority"] == {"old": None, "new": "High"}
+    assert kept == recent
+
+    job = await wait_for_job(await client.post("/api/cards/history/compact/", params={"older_than_days": 90}))
+    assert job["result"] == {"cards": 0, "folded": 0}
+
+
+def test_fold_changes():
+    folded = fold_changes([
+        {"title": {"old": "a", "new": "b"}, "state": {"old": "todo", "new": "in_progress"}},
+        {"title": {"old": "b", "new": "c"}},
+        {"state": {"old": "in_progress", "new": "todo"}},
+    ])
+
+    assert folded == {"title": {"old": "a", "new": "c"}}
+
+
+async def test_compactor_runs_on_its_own():
+    repositories = {"default": MemoryCardRepository(), "other": MemoryCardRepository()}
+    for repository in repositories.values():
+        card = await repository.create({"title": "Draft"})
+        await repository.update(card.id, title="Final")
+
+    @contextlib.asynccontextmanager
+    async def open_repository(board):
+        yield repositories[board]
+
+    compactor = HistoryCompactor(
+        open_repository,
+        lambda: list(repositories),
+        retention_days=-1,
+        interval=0.01,
+        batch_size=10,
+    )
+    compactor.start()
+    try:
+        async def compacted():
+            for repository in repositories.values():
+                while len(await repository.history(1, limit=10)) > 1:
+                    await asyncio.sleep(0.01)
+
+        await asyncio.wait_for(compacted(), 2.0)
+    finally:
+        await compactor.stop()
+
+    for repository in repositories.values():
+        [snapshot] = await repository.history(1, limit=10)
+        assert snapshot.folded == 2
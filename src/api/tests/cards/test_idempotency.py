@@ -0,0 +1,126 @@
+"""
+Test Cases
+* `post /cards/` retried with the same Idempotency-Key replays the first card
+* `post /cards/` retried concurrently with the same key creates one card
+* a key reused for a different request is rejected
+* replays survive losing the in-memory cache
+* expired keys run the request again
+* `patch /cards/start` and `patch /cards/finish` replay without a second update
+* the key is recorded in the same write as the card, failing to record it rolls the card back
+"""
+import asyncio
+import uuid
+
+import pytest
+from fastapi import status
+from api.cards.idempotency import idempotency_keys
+from api.cards.models import Card, CardHistory, IdempotencyRecord, State
+from api.database import DEFAULT_BOARD
+from api.writes import writes
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def key_headers():
+    return {"Idempotency-Key": uuid.uuid4().hex}
+
+
+@pytest.mark.num_cards(0)
+async def test_create_replay(client, clean_db, key_headers):
+    first = await client.post("/api/cards/", json={"title": "once"}, headers=key_headers)
+    retry = await client.post("/api/cards/", json={"title": "once"}, headers=key_headers)
+
+    assert first.status_code == retry.status_code == status.HTTP_201_CREATED
+    assert first.json() == retry.json()
+    assert await Card.objects.count() == 1
+
+
+@pytest.mark.num_cards(0)
+async def test_concurrent_retries(client, clean_db, key_headers):
+    responses = await asyncio.gather(*[
+        client.post("/api/cards/", json={"title": "once"}, headers=key_headers) for _ in range(5)
+    ])
+
+    assert len({response.json()["id"] for response in responses}) == 1
+    assert await Card.objects.count() == 1
+
+
+@pytest.mark.num_cards(0)
+async def test_key_reused_for_other_request(client, clean_db, key_headers):
+    await client.post("/api/cards/", json={"title": "first"}, headers=key_headers)
+    response = await client.post("/api/cards/", json={"title": "second"}, headers=key_headers)
+
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+    assert await Card.objects.count() == 1
+
+
+@pytest.mark.num_cards(0)
+async def test_replay_from_table(client, clean_db, key_headers, monkeypatch):
+    first = await client.post("/api/cards/", json={"title": "stored"}, headers=key_headers)
+    monkeypatch.setattr(idempotency_keys, "_cache", type(idempotency_keys._cache)())
+
+    retry = await client.post("/api/cards/", json={"title": "stored"}, headers=key_headers)
+
+    assert await IdempotencyRecord.objects.count() == 1
+    assert retry.json() == first.json()
+    assert await Card.objects.count() == 1
+
+
+@pytest.mark.num_cards(0)
+async def test_expired_key(client, clean_db, key_headers, monkeypatch):
+    monkeypatch.setattr(idempotency_keys, "ttl", 0)
+    first = await client.post("/api/cards/", json={"title": "again"}, headers=key_headers)
+    await asyncio.sleep(0.01)
+
+    retry = await client.post("/api/cards/", json={"title": "again"}, headers=key_headers)
+
+    assert retry.status_code == status.HTTP_201_CREATED
+    assert retry.json()["id"] != first.json()["id"]
+
+
+@pytest.mark.num_cards(1)
+async def test_transition_replay(client, clean_db, key_headers):
+    card = await Card.objects.first()
+    start_headers = {"Idempotency-Key": uuid.uuid4().hex}
+
+    response = await client.patch(f"/api/cards/start/{card.id}", headers=start_headers)
+    assert response.status_code == status.HTTP_204_NO_CONTENT
+    started_dttm = (await Card.objects.get(id=card.id)).started_dttm
+
+    response = await client.patch(f"/api/cards/start/{card.id}", headers=start_headers)
+    assert response.status_code == status.HTTP_204_NO_CONTENT
+    assert (await Card.objects.get(id=card.id)).started_dttm == started_dttm
+
+    response = await client.patch(f"/api/cards/finish/{card.id}", headers=key_headers)
+    assert response.status_code == status.HTTP_204_NO_CONTENT
+    response = await client.patch(f"/api/cards/finish/{card.id}", headers=key_headers)
+    assert response.status_code == status.HTTP_204_NO_CONTENT
+    assert (await Card.objects.get(id=card.id)).state == State.DONE
+
+
+@pytest.mark.num_cards(0)
+async def test_key_commits_with_card(client, clean_db, key_headers, monkeypatch):
+    record = idempotency_keys.record
+
+    async def crash(key, response):
+        raise OSError("disk I/O error")
+
+    monkeypatch.setattr(idempotency_keys, "record", crash)
+    with pytest.raises(OSError):
+        await client.post("/api/cards/", json={"title": "once"}, headers=key_headers)
+
+    assert await Card.objects.count() == 0
+    assert await CardHistory.objects.count() == 0
+    assert await IdempotencyRecord.objects.count() == 0
+
+    monkeypatch.setattr(idempotency_keys, "record", record)
+    monkeypatch.setattr(idempotency_keys, "_last_purge", {DEFAULT_BOARD: float("inf")})
+    n_writes = writes.stats.writes
+    first = await client.post("/api/cards/", json={"title": "once"}, headers=key_headers)
+    retry = await client.post("/api/cards/", json={"title": "once"}, headers=key_headers)
+
+    assert writes.stats.writes == n_writes + 1
+    assert first.json() == retry.json()
+    assert await Card.objects.count() == 1
+    assert await IdempotencyRecord.objects.count() == 1
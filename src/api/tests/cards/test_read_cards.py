@@ -4,6 +4,8 @@ Test Cases
 * `get /cards/filter` one card database
 * `get /cards/filter` many card database
 * `get /cards/filter` filtering
+* `get /cards/filter` keyset paging
+* `get /cards/filter` sparse fieldsets
 """
 import pytest
 from fastapi import status
@@ -119,3 +121,47 @@ async def test_bad_dates(client):
 
     assert response.status_code == status.HTTP_400_BAD_REQUEST
     assert data['detail'] == 'Bad dates provided, highest_create_date must be after lowest_create_date'
+
+
+@pytest.mark.num_cards(5)
+async def test_read_pages(client, clean_db):
+    card_ids = []
+    after_id = None
+    while True:
+        query_params = QueryParams(limit=2) if after_id is None else QueryParams(limit=2, after_id=after_id)
+        response = await client.get("/api/cards/filter/", params=query_params)
+        data = response.json()
+
+        assert response.status_code == status.HTTP_200_OK
+        assert len(data["cards"]) <= 2
+
+        card_ids.extend(card["id"] for card in data["cards"])
+        after_id = data["nextAfterId"]
+        if after_id is None:
+            break
+
+    assert card_ids == sorted(card_ids)
+    assert len(set(card_ids)) == 5
+
+
+@pytest.mark.parametrize("limit", [0, 1001])
+async def test_read_bad_limit(client, limit):
+    response = await client.get("/api/cards/filter/", params=QueryParams(limit=limit))
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+
+@pytest.mark.num_cards(3)
+async def test_read_fields(client, clean_db):
+    query_params = QueryParams(fields=["title", "state"], limit=2)
+    response = await client.get("/api/cards/filter/", params=query_params)
+    data = response.json()
+
+    assert response.status_code == status.HTTP_200_OK
+    assert [set(card) for card in data["cards"]] == [{"id", "title", "state"}] * 2
+    assert data["cards"][0]["state"] == State.TODO.value
+    assert data["nextAfterId"] == data["cards"][-1]["id"]
+
+
+async def test_read_bad_fields(client):
+    response = await client.get("/api/cards/filter/", params=QueryParams(fields=["password"]))
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
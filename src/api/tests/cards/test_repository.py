@@ -0,0 +1,221 @@
+"""
+Test Cases
+* create, get, update and delete behave the same in every backend
+* filter by state, priority and created date in every backend
+* filter pages by id in every backend
+* filter reads only the requested fields in every backend
+* tags are added, filtered on, counted and removed in every backend
+* due dates page in due order and leave out finished cards in every backend
+* history records every change and compacts into a snapshot in every backend
+* deleted cards leave tombstones that are listed and purged in every backend
+* dashboard aggregates the same in every backend
+* card routes run on the memory backend
+"""
+import pendulum
+import pytest
+from fastapi import status
+from api.cards import service
+from api.cards.memory import MemoryCardRepository
+from api.cards.models import CardField, CardPartial, HistoryKind, State, Priority
+from api.cards.repository import SqliteCardRepository
+from api.config import StorageBackend
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture(params=list(StorageBackend))
+async def repository(request, clean_db):
+    match request.param:
+        case StorageBackend.SQLITE:
+            return SqliteCardRepository()
+        case StorageBackend.MEMORY:
+            return MemoryCardRepository()
+
+
+@pytest.fixture()
+def memory_backend(monkeypatch):
+    monkeypatch.setattr(service.settings.db, "BACKEND", StorageBackend.MEMORY)
+    monkeypatch.setattr(service, "memory_repositories", type(service.memory_repositories)(MemoryCardRepository))
+    yield
+
+
+async def test_create_get_update_delete(repository):
+    card = await repository.create({"title": "Write tests", "priority": Priority.HIGH})
+    assert card.id is not None
+    assert card.state == State.TODO
+    assert card.created_dttm is not None
+
+    await repository.update(card.id, state=State.IN_PROGRESS, started_dttm=pendulum.now())
+    updated_card = await repository.get(card.id)
+    assert updated_card.state == State.IN_PROGRESS
+    assert updated_card.started_dttm is not None
+    assert await repository.count() == 1
+
+    await repository.delete(card.id)
+    assert await repository.get(card.id) is None
+    assert await repository.count() == 0
+
+
+async def test_filter(repository):
+    today = pendulum.today()
+    await repository.bulk_create([
+        {"title": "old low", "priority": Priority.LOW, "created_dttm": today.subtract(days=10)},
+        {"title": "new low", "priority": Priority.LOW, "created_dttm": today.add(hours=1)},
+        {"title": "new urgent", "priority": Priority.URGENT, "state": State.DONE, "created_dttm": today.add(hours=2)},
+    ])
+
+    def titles(cards):
+        return sorted(card.title for card in cards)
+
+    assert titles(await repository.filter(priorities=[Priority.LOW])) == ["new low", "old low"]
+    assert titles(await repository.filter(states=[State.DONE, State.IN_PROGRESS])) == ["new urgent"]
+    assert titles(await repository.filter(lowest_create_date=today.date())) == ["new low", "new urgent"]
+    assert titles(await repository.filter(highest_create_date=today.subtract(days=1).date())) == ["old low"]
+    assert titles(await repository.filter(
+        priorities=[Priority.LOW],
+        lowest_create_date=today.subtract(days=1).date()
+    )) == ["new low"]
+
+
+async def test_filter_pages(repository):
+    await repository.bulk_create([{"title": f"card {i}"} for i in range(7)])
+
+    first_page = await repository.filter(limit=3)
+    second_page = await repository.filter(after_id=first_page[-1].id, limit=3)
+    last_page = await repository.filter(after_id=second_page[-1].id, limit=3)
+    ids = [card.id for card in first_page + second_page + last_page]
+
+    assert ids == sorted(ids)
+    assert len(set(ids)) == 7
+    assert len(last_page) == 1
+
+
+async def test_filter_fields(repository):
+    await repository.create({"title": "partial", "summary": "a long summary", "priority": Priority.HIGH})
+
+    [card] = await repository.filter(fields=[CardField.TITLE, CardField.PRIORITY])
+
+    assert isinstance(card, CardPartial)
+    assert card.__fields_set__ == {"id", "title", "priority"}
+    assert (card.title, card.priority, card.summary) == ("partial", Priority.HIGH, None)
+
+
+async def test_tags(repository):
+    ids = [(await repository.create({"title": f"card {i}"})).id for i in range(3)]
+    await repository.add_tags(["bug", "ui"], ids[:2])
+    await repository.add_tags(["docs"], [ids[2], 999])
+
+    def card_ids(cards):
+        return sorted(card.id for card in cards)
+
+    assert card_ids(await repository.filter(tags_all=["bug", "ui"])) == ids[:2]
+    assert card_ids(await repository.filter(tags_any=["ui", "docs"])) == ids
+    assert card_ids(await repository.filter(tags_all=["bug", "docs"])) == []
+    assert await repository.card_tags(ids[0]) == ["bug", "ui"]
+
+    await repository.remove_tags(["ui"], [ids[0]])
+    await repository.delete(ids[2])
+
+    assert [(tag.name, tag.count) for tag in await repository.tag_counts()] == [("bug", 2), ("ui", 1)]
+
+
+async def test_due(repository):
+    now = pendulum.now()
+    await repository.bulk_create([
+        {"title": "no due date"},
+        {"title": "later", "due_dttm": now.add(days=2)},
+        {"title": "tied a", "due_dttm": now.add(hours=1)},
+        {"title": "tied b", "due_dttm": now.add(hours=1)},
+        {"title": "overdue", "due_dttm": now.subtract(hours=1)},
+        {"title": "done", "state": State.DONE, "finished_dttm": now, "due_dttm": now},
+    ])
+
+    first_page = await repository.due(limit=2)
+    last = first_page[-1]
+    second_page = await repository.due(after=(last.due_dttm, last.id), limit=2)
+
+    assert [card.title for card in first_page + second_page] == ["overdue", "tied a", "tied b", "later"]
+    assert [card.title for card in await repository.due(until=now, limit=10)] == ["overdue"]
+
+
+async def test_history(repository):
+    card = await repository.create({"title": "Draft"}, actor="ann")
+    await repository.update(card.id, actor="bob", title="Final")
+    await repository.update(card.id, state=State.IN_PROGRESS, started_dttm=pendulum.now())
+    await repository.delete(card.id, actor="ann")
+
+    events = await repository.history(card.id, limit=10)
+    assert [(event.kind, event.actor) for event in events] == [
+        (HistoryKind.CREATED, "ann"),
+        (HistoryKind.UPDATED, "bob"),
+        (HistoryKind.STARTED, None),
+        (HistoryKind.DELETED, "ann"),
+    ]
+    assert events[1].changes["title"].dict() == {"old": "Draft", "new": "Final"}
+    assert [event.id for event in await repository.history(card.id, after_id=events[1].id, limit=1)] == [events[2].id]
+
+    compaction = await repository.compact_history(before=pendulum.now().add(seconds=1), batch_size=1)
+    [snapshot] = await repository.history(card.id, limit=10)
+
+    assert (compaction.cards, compaction.folded) == (1, 4)
+    assert snapshot.id == events[-1].id
+    assert snapshot.kind == HistoryKind.SNAPSHOT
+    assert snapshot.folded == 4
+    # Created and then deleted, so every field went from empty back to empty
+    assert snapshot.changes == {}
+
+
+async def test_tombstones(repository):
+    cards = [await repository.create({"title": title}) for title in ["first", "second", "third"]]
+    await repository.delete(cards[1].id)
+    await repository.delete(cards[0].id)
+
+    assert [card.id for card in await repository.filter()] == [cards[2].id]
+    assert await repository.get(cards[1].id) is None
+
+    tombstones = await repository.deleted(limit=1)
+    tombstones += await repository.deleted(after=(tombstones[0].deleted_dttm, tombstones[0].id), limit=1)
+    assert [tombstone.id for tombstone in tombstones] == [cards[1].id, cards[0].id]
+
+    assert await repository.purge(before=pendulum.now().subtract(hours=1), limit=10) == 0
+    assert await repository.purge(before=pendulum.now().add(seconds=1), limit=1) == 1
+    assert [tombstone.id for tombstone in await repository.deleted(limit=10)] == [cards[0].id]
+
+
+async def test_dashboard(repository):
+    today = pendulum.today()
+    await repository.bulk_create([
+        {"title": "low todo", "priority": Priority.LOW},
+        {"title": "urgent todo", "priority": Priority.URGENT},
+        {"title": "high doing", "state": State.IN_PROGRESS, "priority": Priority.HIGH},
+        {"title": "done", "state": State.DONE, "finished_dttm": today.add(hours=1)},
+        {"title": "old done", "state": State.DONE, "finished_dttm": today.subtract(days=60)},
+    ])
+
+    dashboard = await repository.dashboard(top=2, days=14)
+
+    assert dashboard.states == {State.TODO: 2, State.IN_PROGRESS: 1, State.DONE: 2}
+    assert dashboard.priorities[Priority.LOW] == 3
+    assert [(day_count.day, day_count.count) for day_count in dashboard.finished_per_day] == [(today.date(), 1)]
+    assert [card.title for card in dashboard.top_cards] == ["urgent todo", "high doing"]
+
+
+async def test_routes_on_memory_backend(client, memory_backend):
+    response = await client.post("/api/cards/", json={"title": "In memory"})
+    assert response.status_code == status.HTTP_201_CREATED
+    card_id = response.json()["id"]
+
+    response = await client.patch(f"/api/cards/finish/{card_id}")
+    assert response.status_code == status.HTTP_204_NO_CONTENT
+
+    response = await client.get(f"/api/cards/{card_id}")
+    assert response.json()["state"] == State.DONE.value
+
+    response = await client.get("/api/boards/other/cards/count/")
+    assert response.json() == {"count": 0}
+
+    response = await client.delete(f"/api/cards/{card_id}")
+    assert response.status_code == status.HTTP_204_NO_CONTENT
+
+    response = await client.get(f"/api/cards/{card_id}")
+    assert response.status_code == status.HTTP_404_NOT_FOUND
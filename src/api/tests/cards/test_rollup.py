@@ -0,0 +1,156 @@
+"""
+Test Cases
+* creating, starting and finishing cards updates the daily rollup
+* starting a card twice counts one start
+* `get /cards/stats/daily` fills days without events with zeros
+* `get /cards/stats/cycle-times` estimates percentiles from the rollup
+* `get /cards/stats/cycle-times` with a percentile out of range returns 400
+* `post /cards/stats/backfill` rebuilds the same rollup the writes keep
+* the backfill keeps the counts of deleted cards, like the writes do, in both backends
+* histogram percentiles interpolate within their bucket
+"""
+import pendulum
+import pytest
+from fastapi import status
+from httpx import QueryParams
+
+from api.cards.memory import MemoryCardRepository
+from api.cards.models import Card, Priority, State
+from api.cards.rollup import DURATION_BOUNDS, HISTOGRAM_SIZE, bucket_index, histogram_percentile
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.mark.num_cards(0)
+async def test_transitions_update_rollup(client, clean_db):
+    card_ids = []
+    for title in ("first", "second", "third"):
+        response = await client.post("/api/cards/", json={"title": title})
+        card_ids.append(response.json()["id"])
+
+    await client.patch(f"/api/cards/start/{card_ids[0]}")
+    await client.patch(f"/api/cards/start/{card_ids[0]}")
+    await client.patch(f"/api/cards/finish/{card_ids[0]}")
+    await client.patch(f"/api/cards/finish/{card_ids[1]}")
+
+    response = await client.get("/api/cards/stats/daily/", params={"days": 1})
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json() == [
+        {"day": pendulum.today().date().isoformat(), "created": 3, "started": 2, "finished": 2}
+    ]
+
+
+@pytest.mark.num_cards(0)
+async def test_daily_stats_fill_empty_days(client, clean_db):
+    await client.post("/api/cards/", json={"title": "today"})
+
+    response = await client.get("/api/cards/stats/daily/", params={"days": 7})
+    days = response.json()
+
+    assert [day["day"] for day in days] == [
+        pendulum.today().subtract(days=offset).date().isoformat() for offset in reversed(range(7))
+    ]
+    assert [day["created"] for day in days] == [0] * 6 + [1]
+
+
+@pytest.mark.num_cards(0)
+async def test_cycle_times(client, clean_db):
+    now = pendulum.now()
+    response = await client.post("/api/cards/bulk/", json=[
+        {
+            "title": f"took {hours} hours",
+            "state": State.DONE.value,
+            "createdDttm": str(now.subtract(hours=hours * 2)),
+            "startedDttm": str(now.subtract(hours=hours)),
+            "finishedDttm": str(now),
+        }
+        for hours in range(1, 11)
+    ])
+    assert response.status_code == status.HTTP_201_CREATED
+
+    query_params = QueryParams(days=7, percentiles=[50, 90])
+    response = await client.get("/api/cards/stats/cycle-times/", params=query_params)
+    cycle_times = response.json()
+
+    assert response.status_code == status.HTTP_200_OK
+    assert cycle_times["cycleTime"]["count"] == 10
+    assert cycle_times["cycleTime"]["meanSeconds"] == pytest.approx(5.5 * 3600)
+    assert cycle_times["leadTime"]["meanSeconds"] == pytest.approx(11 * 3600)
+    # Buckets are a factor of sqrt(2) wide, so estimates land within that of the true value
+    assert 5 * 3600 / 1.42 <= cycle_times["cycleTime"]["percentileSeconds"]["50"] <= 5 * 3600 * 1.42
+    assert 9 * 3600 / 1.42 <= cycle_times["cycleTime"]["percentileSeconds"]["90"] <= 9 * 3600 * 1.42
+
+
+@pytest.mark.num_cards(0)
+async def test_cycle_times_without_cards(client, clean_db):
+    response = await client.get("/api/cards/stats/cycle-times/")
+
+    assert response.json()["leadTime"] == {"count": 0, "meanSeconds": None, "percentileSeconds": {}}
+
+
+async def test_cycle_times_invalid_percentile(client):
+    response = await client.get("/api/cards/stats/cycle-times/", params={"percentiles": 100})
+
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+
+@pytest.mark.num_cards(0)
+async def test_backfill_matches_incremental(client, clean_db, wait_for_job):
+    for title in ("first", "second"):
+        response = await client.post("/api/cards/", json={"title": title, "priority": Priority.HIGH.value})
+        await client.patch(f"/api/cards/finish/{response.json()['id']}")
+
+    incremental = (await client.get("/api/cards/stats/daily/", params={"days": 3})).json()
+
+    # Cards written around the rollup, the way boards from before it existed were
+    await Card.objects.bulk_create([Card(title="imported")])
+    job = await wait_for_job(await client.post("/api/cards/stats/backfill/"))
+
+    assert job["state"] == "succeeded"
+    assert job["result"] == {"cards": 3, "days": 1}
+
+    backfilled = (await client.get("/api/cards/stats/daily/", params={"days": 3})).json()
+    assert backfilled[:-1] == incremental[:-1]
+    assert backfilled[-1] == incremental[-1] | {"created": 3}
+
+
+@pytest.mark.num_cards(0)
+async def test_backfill_keeps_deleted_cards(client, clean_db, wait_for_job):
+    for title in ("kept", "deleted"):
+        response = await client.post("/api/cards/", json={"title": title})
+        await client.patch(f"/api/cards/finish/{response.json()['id']}")
+    await client.delete(f"/api/cards/{response.json()['id']}")
+
+    params = {"days": 1}
+    incremental = (await client.get("/api/cards/stats/daily/", params=params)).json()
+    incremental_times = (await client.get("/api/cards/stats/cycle-times/", params=params)).json()
+    job = await wait_for_job(await client.post("/api/cards/stats/backfill/"))
+
+    assert job["result"] == {"cards": 2, "days": 1}
+    assert (await client.get("/api/cards/stats/daily/", params=params)).json() == incremental
+    assert (await client.get("/api/cards/stats/cycle-times/", params=params)).json() == incremental_times
+
+
+async def test_memory_backfill_keeps_deleted_cards():
+    repository = MemoryCardRepository()
+    for title in ("kept", "deleted"):
+        card = await repository.create({"title": title, "state": State.DONE, "finished_dttm": pendulum.now()})
+    await repository.delete(card.id)
+
+    since = pendulum.today().date()
+    incremental = await repository.daily_stats(since)
+
+    assert (await repository.backfill_rollup()).cards == 2
+    assert await repository.daily_stats(since) == incremental
+
+
+def test_histogram_percentile():
+    histogram = [0] * HISTOGRAM_SIZE
+    histogram[bucket_index(90)] = 4
+
+    lower, upper = DURATION_BOUNDS[bucket_index(90) - 1], DURATION_BOUNDS[bucket_index(90)]
+
+    assert histogram_percentile(histogram, 50) == pytest.approx((lower + upper) / 2)
+    assert histogram_percentile(histogram, 100) == pytest.approx(upper)
+    assert histogram_percentile([0] * HISTOGRAM_SIZE, 50) is None
@@ -0,0 +1,108 @@
+"""
+Test Cases
+* identical concurrent calls share one call
+* calls after `invalidate` never join an earlier flight
+* errors reach every caller of the shared call
+* finished flights are not reused
+* concurrent `get /cards/filter` and `get /cards/{card_id}` return the same result
+"""
+import asyncio
+
+import pytest
+from fastapi import status
+from api.cards.models import Card
+from api.cards.service import SingleFlight
+
+pytestmark = pytest.mark.anyio
+
+
+def make_counting_read(release: asyncio.Event, calls: list):
+    async def read():
+        calls.append(None)
+        call_number = len(calls)
+        await release.wait()
+        return call_number
+
+    return read
+
+
+async def test_concurrent_calls_share_one_call():
+    flights = SingleFlight()
+    release = asyncio.Event()
+    calls = []
+    read = make_counting_read(release, calls)
+
+    tasks = [asyncio.create_task(flights.do("key", read)) for _ in range(5)]
+    await asyncio.sleep(0)
+    release.set()
+    results = await asyncio.gather(*tasks)
+
+    assert len(calls) == 1
+    assert results == [1] * 5
+    assert flights.in_flight == 0
+
+
+async def test_invalidate_starts_new_flight():
+    flights = SingleFlight()
+    release = asyncio.Event()
+    calls = []
+    read = make_counting_read(release, calls)
+
+    before_write = asyncio.create_task(flights.do("key", read))
+    await asyncio.sleep(0)
+    flights.invalidate()
+    after_write = asyncio.create_task(flights.do("key", read))
+    await asyncio.sleep(0)
+    release.set()
+
+    assert await before_write == 1
+    assert await after_write == 2
+    assert len(calls) == 2
+
+
+async def test_errors_reach_every_caller():
+    flights = SingleFlight()
+    release = asyncio.Event()
+
+    async def read():
+        await release.wait()
+        raise ValueError("boom")
+
+    tasks = [asyncio.create_task(flights.do("key", read)) for _ in range(3)]
+    await asyncio.sleep(0)
+    release.set()
+    results = await asyncio.gather(*tasks, return_exceptions=True)
+
+    assert all(isinstance(result, ValueError) for result in results)
+
+
+async def test_finished_flight_not_reused():
+    flights = SingleFlight()
+    release = asyncio.Event()
+    release.set()
+    calls = []
+    read = make_counting_read(release, calls)
+
+    assert await flights.do("key", read) == 1
+    assert await flights.do("key", read) == 2
+
+
+@pytest.mark.num_cards(5)
+async def test_concurrent_filter_requests(client, clean_db):
+    params = {"states": ["ToDo"], "priorities": ["Low", "Low"]}
+    responses = await asyncio.gather(
+        *[client.get("/api/cards/filter/", params=params) for _ in range(10)]
+    )
+
+    assert all(response.status_code == status.HTTP_200_OK for response in responses)
+    assert len({response.content for response in responses}) == 1
+    assert len(responses[0].json()["cards"]) == 5
+
+
+@pytest.mark.num_cards(0)
+async def test_concurrent_get_requests(client, clean_db):
+    card = await Card.objects.create(title="test", summary="test summary")
+    responses = await asyncio.gather(*[client.get(f"/api/cards/{card.id}") for _ in range(10)])
+
+    assert all(response.status_code == status.HTTP_200_OK for response in responses)
+    assert all(response.json()["id"] == card.id for response in responses)
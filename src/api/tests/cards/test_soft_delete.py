@@ -0,0 +1,204 @@
+"""
+Test Cases
+* deleted cards are left out of every read and cannot be updated or tagged
+* `get /cards/deleted` lists tombstones oldest first, paged on deletion time and id
+* the purger removes old tombstones in batches and backs off while other writes wait
+* live card counts and tombstone reads use the partial indexes
+* new databases vacuum incrementally, handing the pages of purged cards back
+* purged ids are never given to new cards, also in databases created before ids stopped being reused
+"""
+import contextlib
+import sqlite3
+
+import pendulum
+import pytest
+from databases import Database
+from fastapi import status
+from sqlalchemy.dialects import sqlite
+
+from api.cards.memory import MemoryCardRepository
+from api.cards.purge import TombstonePurger
+from api.cards.repository import SqliteCardRepository
+from api.database import DEFAULT_BOARD, create_schema, database, shards
+
+pytestmark = pytest.mark.anyio
+
+
+async def card_ids(client):
+    response = await client.get("/api/cards/filter/")
+    return [card["id"] for card in response.json()["cards"]]
+
+
+@pytest.mark.num_cards(3)
+async def test_deleted_cards_are_hidden(client, clean_db):
+    first, second, third = await card_ids(client)
+    await client.delete(f"/api/cards/{second}")
+
+    assert await card_ids(client) == [first, third]
+    assert (await client.get("/api/cards/count/")).json() == {"count": 2}
+    assert (await client.get(f"/api/cards/{second}")).status_code == status.HTTP_404_NOT_FOUND
+    assert (await client.delete(f"/api/cards/{second}")).status_code == status.HTTP_404_NOT_FOUND
+
+    response = await client.patch(f"/api/cards/{second}", json={"title": "Back"})
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+
+    await client.post("/api/cards/tags/add/", json={"tags": ["bug"], "cardIds": [first, second]})
+    response = await client.get("/api/cards/tags/")
+    assert response.json() == [{"name": "bug", "count": 1}]
+
+    response = await client.get("/api/cards/dashboard/")
+    assert sum(response.json()["states"].values()) == 2
+
+
+@pytest.mark.num_cards(4)
+async def test_deleted_cards_feed(client, clean_db):
+    ids = await card_ids(client)
+    for card_id in [ids[2], ids[0], ids[3]]:
+        await client.delete(f"/api/cards/{card_id}")
+
+    response = await client.get("/api/cards/deleted/", params={"limit": 2})
+    first_page = response.json()
+    last = first_page[-1]
+    response = await client.get(
+        "/api/cards/deleted/",
+        params={"limit": 2, "after_dttm": last["deletedDttm"], "after_id": last["id"]},
+    )
+    second_page = response.json()
+
+    assert [tombstone["id"] for tombstone in first_page + second_page] == [ids[2], ids[0], ids[3]]
+
+
+async def test_purge_keeps_recent_tombstones(clean_db):
+    repository = SqliteCardRepository()
+    old, recent, live = [await repository.create({"title": title}) for title in ["old", "recent", "live"]]
+    await repository.delete(old.id)
+    await repository.delete(recent.id)
+    await database.execute(
+        f"UPDATE cards SET deleted_dttm = '{pendulum.now().subtract(days=30).naive()}' WHERE id = {old.id}"
+    )
+
+    assert await repository.purge(before=pendulum.now().subtract(days=7), limit=10) == 1
+    assert [tombstone.id for tombstone in await repository.deleted(limit=10)] == [recent.id]
+    assert await repository.count() == 1
+    assert await repository.vacuum(100) >= 0
+
+
+async def test_purger_backs_off_while_busy():
+    repository = MemoryCardRepository()
+    for n in range(5):
+        card = await repository.create({"title": f"card {n}"})
+        await repository.delete(card.id)
+
+    @contextlib.asynccontextmanager
+    async def open_repository(board):
+        yield repository
+
+    busy = True
+    purged_batches = []
+    purge = repository.purge
+
+    async def counting_purge(before, limit):
+        purged_batches.append(await purge(before, limit))
+        return purged_batches[-1]
+
+    repository.purge = counting_purge
+    purger = TombstonePurger(
+        open_repository,
+        lambda: ["default"],
+        lambda board: not busy,
+        retention_hours=-1,
+        interval=60,
+        batch_size=2,
+        vacuum_pages=100,
+    )
+
+    assert await purger.purge("default") == 0
+    assert len(await repository.deleted(limit=10)) == 5
+
+    busy = False
+    assert await purger.purge("default") == 5
+    assert purged_batches == [2, 2, 1]
+    assert await repository.deleted(limit=10) == []
+
+
+async def test_partial_indexes_are_used(clean_db, isolated_db, monkeypatch):
+    queries = []
+
+    async def capture_rows(query):
+        queries.append(query)
+        return []
+
+    async def capture_value(query):
+        queries.append(query)
+        return 0
+
+    monkeypatch.setitem(vars(database), "fetch_all", capture_rows)
+    monkeypatch.setitem(vars(database), "fetch_val", capture_value)
+    repository = SqliteCardRepository()
+    await repository.count()
+    await repository.deleted(after=(pendulum.now(), 1), limit=10)
+
+    plans = []
+    for query in queries:
+        sql = str(query.compile(dialect=sqlite.dialect(), compile_kwargs={"literal_binds": True}))
+        plans.append(" ".join(row[-1] for row in await isolated_db.fetch_all(f"EXPLAIN QUERY PLAN {sql}")))
+
+    count_plan, deleted_plan = plans
+    assert "ix_cards_live_state_priority" in count_plan
+    assert "ix_cards_tombstones" in deleted_plan
+
+
+async def test_purge_releases_pages(tmp_path, monkeypatch):
+    url = f"sqlite:///{tmp_path / 'board.sqlite'}"
+    create_schema(url)
+    board_db = Database(url)
+    monkeypatch.setitem(shards._shards, DEFAULT_BOARD, board_db)
+    await board_db.connect()
+    try:
+        assert await board_db.fetch_val("PRAGMA auto_vacuum") == 2
+
+        repository = SqliteCardRepository()
+        await repository.bulk_create([{"title": "big", "summary": "x" * 4000} for _ in range(50)])
+        for card in await repository.filter():
+            await repository.delete(card.id)
+
+        assert await repository.purge(before=pendulum.now().add(seconds=1), limit=100) == 50
+        assert await repository.vacuum(1000) > 0
+        assert await board_db.fetch_val("PRAGMA freelist_count") == 0
+    finally:
+        await board_db.disconnect()
+
+
+async def test_purged_ids_are_not_reused(clean_db):
+    repository = SqliteCardRepository()
+    newest = await repository.create({"title": "newest"})
+    await repository.delete(newest.id)
+
+    assert await repository.purge(before=pendulum.now().add(seconds=1), limit=10) == 1
+    assert (await repository.create({"title": "next"})).id > newest.id
+
+
+def test_upgrade_stops_reusing_ids(tmp_path):
+    path = tmp_path / "board.sqlite"
+    with contextlib.closing(sqlite3.connect(path)) as connection:
+        # The cards table as the first releases created it
+        connection.execute(
+            "CREATE TABLE cards (id INTEGER NOT NULL, title VARCHAR(100) NOT NULL, summary TEXT, "
+            "state VARCHAR(11) NOT NULL, priority VARCHAR(6) NOT NULL, created_dttm DATETIME, "
+            "started_dttm DATETIME, finished_dttm DATETIME, PRIMARY KEY (id))"
+        )
+        connection.execute(
+            "INSERT INTO cards (id, title, state, priority) VALUES (1, 'first', 'TODO', 'LOW'), (7, 'newest', 'TODO', 'LOW')"
+        )
+        connection.commit()
+
+    create_schema(f"sqlite:///{path}")
+
+    with contextlib.closing(sqlite3.connect(path)) as connection:
+        connection.execute("DELETE FROM cards WHERE id = 7")
+        connection.execute("INSERT INTO cards (title, state, priority) VALUES ('next', 'TODO', 'LOW')")
+        cards = connection.execute("SELECT id, title FROM cards ORDER BY id").fetchall()
+        indexes = {row[0] for row in connection.execute("SELECT name FROM sqlite_master WHERE tbl_name = 'cards'")}
+
+    assert cards == [(1, "first"), (8, "next")]
+    assert "ix_cards_tombstones" in indexes
@@ -0,0 +1,105 @@
+"""
+Test Cases
+* `post /cards/tags/add` tags many cards at once and ignores unknown ids
+* `post /cards/tags/remove` untags many cards at once
+* `get /cards/filter` with `tags_all` and `tags_any`
+* `get /cards/tags` counts cards per tag
+* tags are normalized and invalid tags return 422
+* deleting a card drops its tags
+* tag filters read the tag index instead of scanning cards
+"""
+import pytest
+from fastapi import status
+from httpx import QueryParams
+from sqlalchemy.dialects import sqlite
+
+from api.cards.repository import SqliteCardRepository
+from api.database import database
+
+pytestmark = pytest.mark.anyio
+
+
+async def card_ids(client):
+    response = await client.get("/api/cards/filter/")
+    return [card["id"] for card in response.json()["cards"]]
+
+
+async def filtered_ids(client, **params):
+    response = await client.get("/api/cards/filter/", params=QueryParams(**params))
+    assert response.status_code == status.HTTP_200_OK
+    return sorted(card["id"] for card in response.json()["cards"])
+
+
+@pytest.mark.num_cards(4)
+async def test_tag_filters(client, clean_db):
+    first, second, third, fourth = await card_ids(client)
+
+    response = await client.post("/api/cards/tags/add/", json={"tags": ["bug", "ui"], "cardIds": [first, second, 999]})
+    assert response.status_code == status.HTTP_204_NO_CONTENT
+    await client.post("/api/cards/tags/add/", json={"tags": ["bug"], "cardIds": [third]})
+    await client.post("/api/cards/tags/add/", json={"tags": ["docs"], "cardIds": [fourth]})
+
+    assert await filtered_ids(client, tags_all=["bug", "ui"]) == [first, second]
+    assert await filtered_ids(client, tags_all=["bug"]) == [first, second, third]
+    assert await filtered_ids(client, tags_any=["ui", "docs"]) == [first, second, fourth]
+    assert await filtered_ids(client, tags_all=["bug"], tags_any=["docs"]) == []
+    assert await filtered_ids(client, tags_all=["missing"]) == []
+
+    response = await client.get(f"/api/cards/{first}/tags/")
+    assert response.json() == ["bug", "ui"]
+
+
+@pytest.mark.num_cards(3)
+async def test_remove_tags_and_counts(client, clean_db):
+    ids = await card_ids(client)
+    await client.post("/api/cards/tags/add/", json={"tags": ["bug", "ui"], "cardIds": ids})
+
+    response = await client.post("/api/cards/tags/remove/", json={"tags": ["ui"], "cardIds": ids[:2]})
+    assert response.status_code == status.HTTP_204_NO_CONTENT
+
+    response = await client.get("/api/cards/tags/")
+    assert response.json() == [{"name": "bug", "count": 3}, {"name": "ui", "count": 1}]
+
+
+@pytest.mark.num_cards(1)
+async def test_tags_are_normalized(client, clean_db):
+    [card_id] = await card_ids(client)
+    await client.post("/api/cards/tags/add/", json={"tags": [" Bug "], "cardIds": [card_id]})
+
+    assert await filtered_ids(client, tags_all=["BUG"]) == [card_id]
+
+    response = await client.post("/api/cards/tags/add/", json={"tags": ["no spaces"], "cardIds": [card_id]})
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+    response = await client.get("/api/cards/filter/", params={"tags_any": "bad%tag"})
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+
+@pytest.mark.num_cards(2)
+async def test_delete_card_drops_tags(client, clean_db):
+    ids = await card_ids(client)
+    await client.post("/api/cards/tags/add/", json={"tags": ["bug"], "cardIds": ids})
+
+    await client.delete(f"/api/cards/{ids[0]}")
+
+    response = await client.get("/api/cards/tags/")
+    assert response.json() == [{"name": "bug", "count": 1}]
+
+
+async def test_tag_filters_use_index(clean_db, isolated_db, monkeypatch):
+    queries = []
+
+    async def capture_query(query):
+        queries.append(query)
+        return []
+
+    # Set on the proxy itself, so undoing it falls back to forwarding to the current shard again
+    monkeypatch.setitem(vars(database), "fetch_all", capture_query)
+    await SqliteCardRepository().filter(tags_all=["bug", "ui"], tags_any=["docs"])
+
+    [query] = queries
+    sql = str(query.compile(dialect=sqlite.dialect(), compile_kwargs={"literal_binds": True}))
+    plan = [row[-1] for row in await isolated_db.fetch_all(f"EXPLAIN QUERY PLAN {sql}")]
+
+    assert any("ix_card_tags_tag_id_card_id" in step for step in plan)
+    assert not any(step.startswith("SCAN") for step in plan)
@@ -0,0 +1,79 @@
+"""
+Test Cases
+* concurrent `post /cards/` requests share commits
+* a failing write in a batch only fails its own caller
+* a full batch commits without waiting for the window
+* `get /admin/writes` reports batch sizes and waits
+"""
+import asyncio
+
+import pytest
+from fastapi import status
+from api.cards.models import Card
+from api.writes import WriteCoalescer, writes
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.mark.num_cards(0)
+async def test_concurrent_creates_share_commits(client, clean_db):
+    batches_before = writes.stats.batches
+
+    responses = await asyncio.gather(*[
+        client.post("/api/cards/", json={"title": f"card {i}"}) for i in range(20)
+    ])
+
+    assert all(response.status_code == status.HTTP_201_CREATED for response in responses)
+    assert len({response.json()["id"] for response in responses}) == 20
+    assert await Card.objects.count() == 20
+    assert writes.stats.batches - batches_before < 20
+
+
+@pytest.mark.num_cards(0)
+async def test_failed_write_is_isolated(clean_db):
+    coalescer = WriteCoalescer(max_batch=10, max_wait=0.01)
+
+    async def fail():
+        await Card(title="rolled back").save()
+        raise ValueError("bad write")
+
+    results = await asyncio.gather(
+        coalescer.submit(Card(title="first").save),
+        coalescer.submit(fail),
+        coalescer.submit(Card(title="second").save),
+        return_exceptions=True,
+    )
+
+    assert isinstance(results[1], ValueError)
+    assert [result.title for result in (results[0], results[2])] == ["first", "second"]
+    assert sorted(card.title for card in await Card.objects.all()) == ["first", "second"]
+    assert coalescer.stats.batches == 1
+    assert coalescer.stats.failed_writes == 1
+
+
+@pytest.mark.num_cards(0)
+async def test_full_batch_does_not_wait(clean_db):
+    coalescer = WriteCoalescer(max_batch=2, max_wait=60)
+
+    await asyncio.wait_for(
+        asyncio.gather(coalescer.submit(Card(title="a").save), coalescer.submit(Card(title="b").save)),
+        timeout=5,
+    )
+
+    assert coalescer.stats.summary()["max_batch_size"] == 2
+    assert coalescer.queued == 0
+
+
+@pytest.mark.num_cards(0)
+async def test_write_metrics(client, clean_db):
+    await client.post("/api/cards/", json={"title": "metered"})
+
+    response = await client.get("/api/admin/writes")
+    data = response.json()
+
+    assert response.status_code == status.HTTP_200_OK
+    assert data["batches"] >= 1
+    assert data["writes"] >= 1
+    assert data["maxBatchSize"] >= 1
+    assert data["waitMaxMs"] >= data["waitP50Ms"] >= 0
+    assert data["queued"] == 0
@@ -1,12 +1,31 @@
+import asyncio
+
 import pytest
+from databases import Database
 from httpx import AsyncClient
 from api.main import create_app
 import sqlalchemy
 from api.cards.models import metadata, Card, State, Priority
 from api.config import get_settings
-import asyncio
+from api.database import DEFAULT_BOARD, create_schema, shards
 
 settings = get_settings()
+# Cards never reuse an id, tests expecting ids from 1 need the counters restarted along with the rows
+RESET_IDS = "DELETE FROM sqlite_sequence"
+
+
+@pytest.fixture(scope="session", autouse=True)
+def test_schema():
+    """Create this worker's database once and start it empty"""
+    create_schema(settings.db.URL)
+    engine = sqlalchemy.create_engine(settings.db.URL)
+    try:
+        with engine.begin() as connection:
+            for table in reversed(metadata.sorted_tables):
+                connection.execute(table.delete())
+            connection.exec_driver_sql(RESET_IDS)
+    finally:
+        engine.dispose()
 
 
 @pytest.fixture(autouse=True)
@@ -27,29 +46,74 @@ async def client() -> AsyncClient:
         yield client_
 
 
+@pytest.fixture(autouse=True)
+async def isolated_db(request, anyio_backend, monkeypatch):
+    """
+    Run every test inside one transaction on the default board that is rolled
+    back afterwards, so tests never see each other's rows. Tests marked
+    `committed` write for real and have every table cleared and the ids
+    restarted around them.
+    """
+    committed = request.node.get_closest_marker("committed") is not None
+    test_db = Database(settings.db.URL, force_rollback=not committed)
+    monkeypatch.setitem(shards._shards, DEFAULT_BOARD, test_db)
+
+    async def clear_tables():
+        for table in reversed(metadata.sorted_tables):
+            await test_db.execute(table.delete())
+        await test_db.execute(RESET_IDS)
+
+    await test_db.connect()
+    try:
+        if committed:
+            await clear_tables()
+        yield test_db
+        if committed:
+            await clear_tables()
+    finally:
+        await test_db.disconnect()
+
+
 @pytest.fixture(scope="function")
 async def clean_db(request, faker):
-    """Clear out the database after every test function"""
-    await Card.objects.delete(each=True)
-
+    """Prefill the number of cards the `num_cards` marker asks for in one insert"""
     faker.seed_instance(101)
 
     if marker := request.node.get_closest_marker("num_cards"):
         num_cards = marker.args[0]
-        insert_tasks = [
+        cards = [
             Card(
                 title=faker.sentence()[:20],
                 summary=faker.sentence(),
                 state=State.TODO,
                 priority=Priority.LOW
-            ).save()
+            )
             for _ in range(num_cards)
         ]
-        await asyncio.gather(*insert_tasks)
+        if cards:
+            await Card.objects.bulk_create(cards)
 
     yield
 
-    await Card.objects.delete(each=True)
+
+@pytest.fixture
+def wait_for_job(client):
+    """Poll the job a 202 response started until it finishes, returning the finished job"""
+    async def wait(response, timeout: float = 5.0) -> dict:
+        assert response.status_code == 202
+        job_url = response.headers["Location"]
+
+        async def poll():
+            while True:
+                job = (await client.get(job_url)).json()
+                if job["state"] in ("succeeded", "failed", "cancelled"):
+                    return job
+
+                await asyncio.sleep(0.01)
+
+        return await asyncio.wait_for(poll(), timeout)
+
+    return wait
 
 
 @pytest.fixture(params=list(State))
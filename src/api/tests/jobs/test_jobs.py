@@ -0,0 +1,166 @@
+"""
+Test Cases
+* `post /cards/transition` moves cards in a job, reporting progress and the number moved
+* `post /cards/transition` with card ids records the actor in the card history
+* jobs past the worker limit stay queued until a worker frees up
+* queued and running jobs can be cancelled, finished ones cannot
+* a job cancelled while its final state is written still records it
+* a failing job records its error
+* jobs left unfinished by a previous process are marked failed on startup
+* new jobs are turned away with 503 once too many are pending
+"""
+import asyncio
+
+import pytest
+from fastapi import status
+
+from api.jobs.models import Job, JobState
+from api.jobs.service import JobRunner, jobs
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture()
+async def runner():
+    runner_ = JobRunner(max_workers=1, max_pending=10, progress_interval=0)
+    yield runner_
+    await runner_.stop()
+
+
+async def wait_for_state(runner, job_id, state, timeout=2.0):
+    async def poll():
+        while (job := await runner.get(job_id)).state != state:
+            await asyncio.sleep(0.01)
+
+        return job
+
+    return await asyncio.wait_for(poll(), timeout)
+
+
+@pytest.mark.num_cards(5)
+async def test_transition_job(client, clean_db, wait_for_job):
+    response = await client.post("/api/cards/transition/", json={"state": "Done", "fromStates": ["ToDo"]})
+    assert response.json()["state"] == "queued"
+
+    job = await wait_for_job(response)
+    assert job["state"] == "succeeded"
+    assert job["result"] == {"count": 5}
+    assert job["done"] == job["total"] == 5
+    assert job["kind"] == "transition_cards"
+
+    cards = (await client.get("/api/cards/filter/")).json()["cards"]
+    assert all(card["state"] == "Done" and card["finishedDttm"] is not None for card in cards)
+
+    job = await wait_for_job(await client.post("/api/cards/transition/", json={"state": "Done"}))
+    assert job["result"] == {"count": 0}
+
+
+@pytest.mark.num_cards(3)
+async def test_transition_card_ids(client, clean_db, wait_for_job):
+    first, second, third = [card["id"] for card in (await client.get("/api/cards/filter/")).json()["cards"]]
+    response = await client.post(
+        "/api/cards/transition/",
+        json={"state": "In Progress", "cardIds": [first, third, 999]},
+        headers={"X-Actor": "ann"},
+    )
+    job = await wait_for_job(response)
+
+    assert job["result"] == {"count": 2}
+    assert (await client.get(f"/api/cards/{second}")).json()["state"] == "ToDo"
+
+    [event] = (await client.get(f"/api/cards/{first}/history/")).json()["events"]
+    assert (event["kind"], event["actor"]) == ("started", "ann")
+
+
+async def test_worker_limit_and_cancel(runner):
+    started, release = asyncio.Event(), asyncio.Event()
+
+    async def blocked(progress):
+        await progress(1, 4)
+        started.set()
+        await release.wait()
+        return {"ok": True}
+
+    first = await runner.submit("blocked", "default", blocked)
+    second = await runner.submit("blocked", "default", blocked)
+    await asyncio.wait_for(started.wait(), 2.0)
+    running = await runner.get(first.id)
+
+    assert (running.state, running.done, running.total) == (JobState.RUNNING, 1, 4)
+    assert (await runner.get(second.id)).state == JobState.QUEUED
+
+    assert await runner.cancel(first.id)
+    assert (await wait_for_state(runner, second.id, JobState.RUNNING)).started_dttm is not None
+    assert (await runner.get(first.id)).state == JobState.CANCELLED
+
+    second_task = runner._tasks[second.id]
+    release.set()
+    await asyncio.wait_for(second_task, 2.0)
+    finished = await runner.get(second.id)
+
+    assert (finished.state, finished.result) == (JobState.SUCCEEDED, {"ok": True})
+    assert not await runner.cancel(second.id)
+
+
+async def test_cancel_while_finishing(runner, monkeypatch):
+    finishing, release = asyncio.Event(), asyncio.Event()
+    save = runner.save
+
+    async def slow_final_save(job_id, **values):
+        if "finished_dttm" in values:
+            finishing.set()
+            await release.wait()
+        await save(job_id, **values)
+
+    async def done(progress):
+        return {"ok": True}
+
+    monkeypatch.setattr(runner, "save", slow_final_save)
+    job = await runner.submit("done", "default", done)
+    task = runner._tasks[job.id]
+    await asyncio.wait_for(finishing.wait(), 2.0)
+
+    assert not await runner.cancel(job.id)
+
+    # Even cancelled from elsewhere, the task waits for its final state to be written
+    task.cancel()
+    release.set()
+    await asyncio.wait([task], timeout=2.0)
+
+    assert (await runner.get(job.id)).state == JobState.SUCCEEDED
+
+
+async def test_failed_job(runner):
+    async def failing(progress):
+        raise ValueError("No such board")
+
+    job = await runner.submit("failing", "default", failing)
+    failed = await wait_for_state(runner, job.id, JobState.FAILED)
+
+    assert failed.error == "No such board"
+    assert failed.finished_dttm is not None
+
+
+async def test_recover_interrupted_jobs(runner):
+    running = await Job(kind="export", board="default", state=JobState.RUNNING).save()
+    done = await Job(kind="export", board="default", state=JobState.SUCCEEDED).save()
+
+    assert await runner.recover(keep_days=30) == 1
+    assert (await runner.get(running.id)).state == JobState.FAILED
+    assert (await runner.get(done.id)).state == JobState.SUCCEEDED
+
+
+@pytest.mark.num_cards(1)
+async def test_job_routes(client, clean_db, wait_for_job, monkeypatch):
+    assert (await client.get("/api/jobs/999999")).status_code == status.HTTP_404_NOT_FOUND
+
+    job = await wait_for_job(await client.post("/api/cards/transition/", json={"state": "Done"}))
+    response = await client.post(f"/api/jobs/{job['id']}/cancel")
+    assert response.status_code == status.HTTP_409_CONFLICT
+
+    response = await client.get("/api/jobs/")
+    assert response.json()[0]["id"] == job["id"]
+
+    monkeypatch.setattr(jobs, "max_pending", 0)
+    response = await client.post("/api/cards/transition/", json={"state": "ToDo"})
+    assert response.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
@@ -0,0 +1,93 @@
+"""
+Test Cases
+* `get /health` answers without touching the database
+* `get /ready` reports the database round trip, loop lag, pool usage and queue depths
+* `get /ready` answers 503 when the database fails or is too slow
+* `get /ready` answers while the admission pools are full
+* loop lag counts the time callbacks already queued hold up the loop
+"""
+import asyncio
+import time
+
+import pytest
+from fastapi import status
+from httpx import AsyncClient
+
+from api.database import DEFAULT_BOARD, shards
+from api.main import create_app
+from api.root.routes import settings
+from api.root.service import loop_lag
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_health(client):
+    response = await client.get("/api/health")
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json() is True
+
+
+async def test_ready(client):
+    response = await client.get("/api/ready")
+    readiness = response.json()
+
+    assert response.status_code == status.HTTP_200_OK
+    assert readiness["ready"] is True
+    assert readiness["database"]["ok"] is True
+    assert readiness["database"]["connected"] is True
+    assert readiness["database"]["latencyMs"] >= 0
+    assert readiness["database"]["openShards"] >= 1
+    assert readiness["loopLagMs"] >= 0
+    assert readiness["reads"]["limit"] == settings.admission.READ_LIMIT
+    assert readiness["writes"]["inFlight"] == 0
+    assert readiness["queuedWrites"] == 0
+    assert readiness["pendingJobs"] == 0
+
+
+async def test_ready_database_down(client, monkeypatch):
+    async def broken(query):
+        raise OSError("disk I/O error")
+
+    monkeypatch.setattr(shards.get(DEFAULT_BOARD), "fetch_val", broken)
+    response = await client.get("/api/ready")
+
+    assert response.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+    assert response.json()["ready"] is False
+    assert response.json()["database"]["error"] == "disk I/O error"
+
+
+async def test_ready_database_slow(client, monkeypatch):
+    async def stuck(query):
+        await asyncio.sleep(1)
+
+    monkeypatch.setattr(shards.get(DEFAULT_BOARD), "fetch_val", stuck)
+    monkeypatch.setattr(settings.health, "DB_TIMEOUT_SECONDS", 0.01)
+    response = await client.get("/api/ready")
+    database = response.json()["database"]
+
+    assert response.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+    assert (database["ok"], database["latencyMs"]) == (False, None)
+
+
+async def test_ready_skips_admission():
+    app = create_app()
+    pool = app.state.read_pool
+    for _ in range(pool.limit):
+        await pool.acquire()
+
+    try:
+        async with AsyncClient(app=app, base_url="http://test") as client_:
+            response = await client_.get("/api/ready")
+    finally:
+        for _ in range(pool.limit):
+            pool.release()
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()["reads"]["inFlight"] == pool.limit
+
+
+async def test_loop_lag():
+    asyncio.get_running_loop().call_soon(time.sleep, 0.05)
+
+    assert await loop_lag() >= 0.05
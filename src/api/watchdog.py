@@ -0,0 +1,142 @@
+"""Event Loop Watchdog"""
+import asyncio
+import contextvars
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+
+import pendulum
+from loguru import logger
+
+from api.config import get_settings
+from api.writes import percentile
+
+settings = get_settings()
+
+
+class LoopStall:
+    """One stretch of time a callback kept the event loop to itself"""
+
+    def __init__(self, started_dttm: pendulum.DateTime, blocked: float, stack: list[str]):
+        self.started_dttm = started_dttm
+        self.blocked = blocked
+        self.stack = stack
+
+    def summary(self) -> dict:
+        return {
+            "started_dttm": self.started_dttm,
+            "blocked_ms": self.blocked * 1000,
+            "stack": self.stack,
+        }
+
+
+class LoopWatchdog:
+    """
+    Measure event loop lag continuously and catch the callbacks that block it.
+
+    A heartbeat task sleeps `interval` seconds at a time and records how late
+    it wakes up. A thread watches the heartbeat, and once it is `threshold`
+    seconds overdue the loop is stuck in a callback: the thread captures the
+    loop thread's stack at that moment, which names the code holding it, and
+    logs it. Lag samples over the last `window` beats give the percentiles.
+    """
+
+    def __init__(self, *, interval: float, threshold: float, window: int = 1024, max_stalls: int = 20):
+        self.interval = interval
+        self.threshold = threshold
+        self.lags: deque[float] = deque(maxlen=window)
+        self.stalls = 0
+        self.recent_stalls: deque[LoopStall] = deque(maxlen=max_stalls)
+        self._lock = threading.Lock()
+        self._beat = 0.0
+        self._stall: LoopStall | None = None
+        self._loop_thread_id: int | None = None
+        self._task: asyncio.Task | None = None
+        self._thread: threading.Thread | None = None
+        self._stopped = threading.Event()
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None
+
+    def start(self) -> None:
+        """Start watching the running event loop"""
+        if self.running:
+            return
+
+        self._loop_thread_id = threading.get_ident()
+        self._beat = time.perf_counter()
+        self._stopped.clear()
+        self._task = asyncio.create_task(self._heartbeat(), context=contextvars.Context())
+        self._thread = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._thread.start()
+
+    async def stop(self) -> None:
+        if not self.running:
+            return
+
+        self._stopped.set()
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+        self._thread.join()
+        self._thread = None
+
+    async def _heartbeat(self) -> None:
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            now = time.perf_counter()
+            lag = max(0.0, now - started - self.interval)
+            with self._lock:
+                self._beat = now
+                self.lags.append(lag)
+                if self._stall is not None:
+                    # The stack was taken while blocked, only now is it known how long the block lasted
+                    self._stall.blocked = lag
+                    self._stall = None
+
+    def _watch(self) -> None:
+        check_every = min(self.interval, self.threshold) / 2
+        while not self._stopped.wait(check_every):
+            with self._lock:
+                overdue = time.perf_counter() - self._beat - self.interval
+                if overdue < self.threshold or self._stall is not None:
+                    continue
+
+                frame = sys._current_frames().get(self._loop_thread_id)
+                stack = traceback.format_stack(frame) if frame is not None else []
+                self._stall = LoopStall(pendulum.now().subtract(seconds=overdue), overdue, stack)
+                self.stalls += 1
+                self.recent_stalls.append(self._stall)
+
+            logger.warning(
+                "Event loop blocked for over {blocked:.0f}ms in\n{stack}",
+                blocked=overdue * 1000,
+                stack="".join(stack[-8:]),
+            )
+
+    def summary(self) -> dict:
+        with self._lock:
+            lags = list(self.lags)
+            stalls = [stall.summary() for stall in self.recent_stalls]
+
+        return {
+            "samples": len(lags),
+            "lag_p50_ms": percentile(lags, 0.5) * 1000,
+            "lag_p95_ms": percentile(lags, 0.95) * 1000,
+            "lag_p99_ms": percentile(lags, 0.99) * 1000,
+            "lag_max_ms": max(lags, default=0.0) * 1000,
+            "stalls": self.stalls,
+            "recent_stalls": stalls,
+        }
+
+
+watchdog = LoopWatchdog(
+    interval=settings.watchdog.INTERVAL_SECONDS,
+    threshold=settings.watchdog.THRESHOLD_SECONDS,
+    window=settings.watchdog.WINDOW,
+    max_stalls=settings.watchdog.MAX_STALLS,
+)
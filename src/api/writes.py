@@ -0,0 +1,171 @@
+"""Write Coalescing"""
+import asyncio
+import contextvars
+import time
+from collections import defaultdict, deque
+from collections.abc import Awaitable, Callable
+from typing import Any
+
+from loguru import logger
+
+from api.config import get_settings
+from api.database import current_board, database
+
+settings = get_settings()
+
+
+def percentile(values: list[float], fraction: float) -> float:
+    if not values:
+        return 0.0
+
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class WriteStats:
+    """Batch sizes and queue waits of the most recent commits"""
+
+    def __init__(self, window: int = 1024):
+        self.batches = 0
+        self.writes = 0
+        self.failed_writes = 0
+        self.batch_sizes: deque[int] = deque(maxlen=window)
+        self.waits: deque[float] = deque(maxlen=window)
+
+    def record(self, batch_size: int, waits: list[float], failed: int) -> None:
+        self.batches += 1
+        self.writes += batch_size
+        self.failed_writes += failed
+        self.batch_sizes.append(batch_size)
+        self.waits.extend(waits)
+
+    def summary(self) -> dict:
+        batch_sizes = list(self.batch_sizes)
+        waits = list(self.waits)
+        return {
+            "batches": self.batches,
+            "writes": self.writes,
+            "failed_writes": self.failed_writes,
+            "mean_batch_size": sum(batch_sizes) / len(batch_sizes) if batch_sizes else 0.0,
+            "max_batch_size": max(batch_sizes, default=0),
+            "wait_p50_ms": percentile(waits, 0.5) * 1000,
+            "wait_p95_ms": percentile(waits, 0.95) * 1000,
+            "wait_max_ms": max(waits, default=0.0) * 1000,
+        }
+
+
+# Run on the result of the next write submitted from the context that sets it, inside that write's savepoint,
+# so whatever it records commits or rolls back together with the write
+companion_write: contextvars.ContextVar[Callable[[Any], Awaitable] | None] = contextvars.ContextVar(
+    "companion_write", default=None
+)
+
+
+class PendingWrite:
+    def __init__(self, func: Callable[[], Awaitable], companion: Callable[[Any], Awaitable] | None = None):
+        self.func = func
+        self.companion = companion
+        self.future = asyncio.get_running_loop().create_future()
+        self.queued_at = time.perf_counter()
+
+
+class WriteCoalescer:
+    """
+    Group commit for a database that allows one writer at a time.
+
+    Writes submitted within `max_wait` seconds of the first one, up to
+    `max_batch` of them, run in a single transaction on their board's shard.
+    Each write gets its own savepoint, so a failing write is rolled back and
+    raised to its caller alone while the rest of the batch commits. Callers
+    are only resolved once the batch has committed.
+    """
+
+    def __init__(self, max_batch: int, max_wait: float):
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.stats = WriteStats()
+        self._pending: dict[str, list[PendingWrite]] = {}
+        self._timers: dict[str, asyncio.TimerHandle] = {}
+        self._commit_locks: defaultdict[str, asyncio.Lock] = defaultdict(asyncio.Lock)
+        self._commits: set[asyncio.Task] = set()
+
+    @property
+    def queued(self) -> int:
+        return sum(len(batch) for batch in self._pending.values())
+
+    def idle(self, board: str) -> bool:
+        """Whether the board has no writes waiting or committing, for background jobs to stay out of the way"""
+        lock = self._commit_locks.get(board)
+        return not self._pending.get(board) and (lock is None or not lock.locked())
+
+    async def submit(self, func: Callable[[], Awaitable]) -> Any:
+        """Run `func` in the next batch for the current board and return its result once committed"""
+        board = current_board.get()
+        companion = companion_write.get()
+        if companion is not None:
+            companion_write.set(None)
+
+        write = PendingWrite(func, companion)
+        batch = self._pending.setdefault(board, [])
+        batch.append(write)
+
+        if len(batch) >= self.max_batch:
+            self._flush(board)
+        elif len(batch) == 1:
+            self._timers[board] = asyncio.get_running_loop().call_later(self.max_wait, self._flush, board)
+
+        # A caller that goes away does not take its queued write with it
+        return await asyncio.shield(write.future)
+
+    def _flush(self, board: str) -> None:
+        timer = self._timers.pop(board, None)
+        if timer is not None:
+            timer.cancel()
+
+        batch = self._pending.pop(board, None)
+        if not batch:
+            return
+
+        # A fresh context so the batch gets its own connection rather than the first caller's
+        commit = asyncio.create_task(self._commit(board, batch), context=contextvars.Context())
+        self._commits.add(commit)
+        commit.add_done_callback(self._commits.discard)
+
+    async def _commit(self, board: str, batch: list[PendingWrite]) -> None:
+        current_board.set(board)
+        results = []
+        async with self._commit_locks[board]:
+            started_at = time.perf_counter()
+            try:
+                async with database.transaction():
+                    for write in batch:
+                        try:
+                            async with database.transaction():
+                                result = await write.func()
+                                if write.companion is not None:
+                                    await write.companion(result)
+
+                                results.append((write, result, None))
+                        except Exception as e:
+                            results.append((write, None, e))
+            except Exception as e:
+                logger.exception("Write batch of {size} on board {board} failed", size=len(batch), board=board)
+                results = [(write, None, e) for write in batch]
+
+        self.stats.record(
+            batch_size=len(batch),
+            waits=[started_at - write.queued_at for write in batch],
+            failed=sum(error is not None for _, _, error in results),
+        )
+
+        for write, result, error in results:
+            if write.future.done():
+                continue
+
+            if error is None:
+                write.future.set_result(result)
+            else:
+                write.future.set_exception(error)
+
+
+writes = WriteCoalescer(max_batch=settings.db.WRITE_BATCH_SIZE, max_wait=settings.db.WRITE_BATCH_WAIT)
@@ -2,25 +2,53 @@
 import api
 import cli
 from api.cards.client import SyncCardClient
-from api.cards.models import CardCreate, CardUpdate, CardRead, Priority, State
+from api.cards.models import CardCreate, CardUpdate, CardRead, Dashboard, Priority, State
+from cli.transfer import (
+    Checkpoint, CardWriter, FileFormat, RowsPerSecondColumn, batched, detect_format, file_digest, format_csv_value,
+    read_cards
+)
 
 from rich.console import Console
 from rich.panel import Panel
 from rich import box
 from rich.table import Table
 from rich.layout import Layout
+from rich.progress import BarColumn, Progress, SpinnerColumn, TextColumn, TimeElapsedColumn
 import typer
 import pendulum
 import termcharts as tc
 import datetime as dt
+import csv
+import sys
+import time
+from pathlib import Path
+from collections.abc import Iterable
+from enum import Enum
 
 
 app = typer.Typer(add_completion=False)
 console = Console(emoji=True)
 client = SyncCardClient()
 
+DASHBOARD_TOP_CARDS = 10
+DASHBOARD_DAYS = 14
+DUE_FORMATS = ["%Y-%m-%d", "%Y-%m-%d %H:%M"]
 
-def make_cards_table(cards_: list[CardRead]):
+
+class OutputFormat(str, Enum):
+    TABLE = "table"
+    TSV = "tsv"
+    JSON = "json"
+    NDJSON = "ndjson"
+
+
+def make_cards_table(
+        cards_: list[CardRead],
+        *,
+        title: str | None = "My TODO List",
+        show_header: bool = True,
+        sort: bool = True
+):
     def format_dttm(dttm: pendulum.DateTime | None):
         return "" if dttm is None else dttm.strftime("%m/%d %I:%M %p")
 
@@ -45,7 +73,8 @@ def make_cards_table(cards_: list[CardRead]):
         return "dim" if card_.state == State.DONE else ""
 
     table = Table(
-        title="My TODO List",
+        title=title,
+        show_header=show_header,
         expand=True,
         box=box.HEAVY_EDGE,
         header_style="bold magenta",
@@ -61,8 +90,10 @@ def make_cards_table(cards_: list[CardRead]):
     table.add_column("Created", justify="right")
     table.add_column("Started", justify="right")
     table.add_column("Finished", justify="right")
+    table.add_column("Due", justify="right")
 
-    cards_.sort(key=lambda x: (x.state, x.priority))
+    if sort:
+        cards_.sort(key=lambda x: (x.state, x.priority))
 
     for card in cards_:
         table.add_row(
@@ -74,6 +105,7 @@ def make_cards_table(cards_: list[CardRead]):
             format_dttm(card.created_dttm),
             format_dttm(card.started_dttm),
             format_dttm(card.finished_dttm),
+            format_dttm(card.due_dttm),
             style=get_row_style(card)
         )
 
@@ -81,10 +113,14 @@ def make_cards_table(cards_: list[CardRead]):
 
 
 @app.callback(invoke_without_command=True)
-def main(ctx: typer.Context):
+def main(
+        ctx: typer.Context,
+        board: str = typer.Option(None, '--board', envvar="CARDS_BOARD", help="Board to work on")
+):
     """
     Cards is a small command line task tracking application.
     """
+    client.board = board
 
     def make_layout() -> Layout:
         """Define the layout."""
@@ -110,6 +146,7 @@ def main(ctx: typer.Context):
         )
         layout_["bottom"].split_row(
             Layout(name="left_chart"),
+            Layout(name="middle_chart"),
             Layout(name="right_chart")
         )
         layout_["spacer"].update("")
@@ -146,27 +183,33 @@ def main(ctx: typer.Context):
         )
         return layout_
 
-    def make_priority_chart():
-        chart = [
-            tc.bar({'roll': 24, 'bss':10, 'wes':30, 'ewfwef':50}, title='', rich=True)
-        ]
-        return Panel(chart[0], border_style="bright_green", expand=True)
+    def make_bar_chart(counts: dict[str, int], title: str):
+        if not any(counts.values()):
+            chart = f"[dim]No {title.lower()} yet"
+        else:
+            chart = tc.bar(counts, title='', rich=True)
+        return Panel(chart, title=title, border_style="bright_green", expand=True)
 
-    def make_state_chart():
-        chart = [
-            tc.bar({'roll': 24, 'bss':10, 'wes':30, 'ewfwef':50}, title='', rich=True)
-        ]
-        return Panel(chart[0], border_style="bright_green", expand=True)
+    def make_priority_chart(dashboard_: Dashboard):
+        counts = {priority.value: dashboard_.priorities.get(priority, 0) for priority in sorted(Priority)}
+        return make_bar_chart(counts, "Cards by Priority")
+
+    def make_state_chart(dashboard_: Dashboard):
+        counts = {state.value: dashboard_.states.get(state, 0) for state in sorted(State)}
+        return make_bar_chart(counts, "Cards by State")
+
+    def make_finished_chart(dashboard_: Dashboard):
+        counts = {day_count.day.strftime("%m/%d"): day_count.count for day_count in dashboard_.finished_per_day}
+        return make_bar_chart(counts, "Finished Cards")
 
     if ctx.invoked_subcommand is None:
 
         layout = make_layout()
-        cards = client.get_cards()
-        cards_table = make_cards_table(cards)
-        priority_chart = make_priority_chart()
-        state_chart = make_state_chart()
-        layout["left_chart"].update(priority_chart)
-        layout["right_chart"].update(state_chart)
+        dashboard = client.get_dashboard(top=DASHBOARD_TOP_CARDS, days=DASHBOARD_DAYS)
+        cards_table = make_cards_table(dashboard.top_cards, title="Top Open Cards", sort=False)
+        layout["left_chart"].update(make_priority_chart(dashboard))
+        layout["middle_chart"].update(make_state_chart(dashboard))
+        layout["right_chart"].update(make_finished_chart(dashboard))
         layout["table_container"].update(Panel(cards_table, border_style="bright_green"))
         console.print(layout)
 
@@ -186,12 +229,19 @@ def add(
         title: str = typer.Argument(..., help="Title of the card"),
         summary: str = typer.Argument(..., help="Short summary of the card"),
         state: State = State.TODO,
-        priority: Priority = Priority.LOW
+        priority: Priority = Priority.LOW,
+        due: dt.datetime = typer.Option(None, '-d', '--due', help="When the card is due", formats=DUE_FORMATS)
 ):
     """
     Add a card to the to-do list
     """
-    card = CardCreate(title=title, summary=summary, state=state, priority=priority)
+    card = CardCreate(
+        title=title,
+        summary=summary,
+        state=state,
+        priority=priority,
+        due_dttm=datetime_to_pendulum(due),
+    )
     client.create_card(card)
 
 
@@ -209,12 +259,13 @@ def update(
         card_id: int = typer.Argument(..., help="ID of the card you want to update"),
         title: str = typer.Option(None, '-t', '--title', help="New title for the card"),
         summary: str = typer.Option(None, '-s', '--summary', help="New summary for the card"),
-        priority: Priority = typer.Option(None, '-p', '--priority', help="New priority for the card")
+        priority: Priority = typer.Option(None, '-p', '--priority', help="New priority for the card"),
+        due: dt.datetime = typer.Option(None, '-d', '--due', help="New due date for the card", formats=DUE_FORMATS)
 ):
     """
     Update a card on the to-do list
     """
-    if all(option is None for option in [title, summary, priority]):
+    if all(option is None for option in [title, summary, priority, due]):
         console.print("[bold red]No updates provided")
         raise typer.Exit(0)
 
@@ -228,6 +279,9 @@ def update(
     if priority is not None:
         update_data.priority = priority
 
+    if due is not None:
+        update_data.due_dttm = datetime_to_pendulum(due)
+
     client.update_card(card_id, card_updates=update_data)
 
 
@@ -256,10 +310,151 @@ def count():
     console.print(f"There are {card_count} cards in the database")
 
 
+@app.command()
+def backup():
+    """
+    Take a consistent online snapshot of the cards database
+    """
+    with console.status("Taking snapshot"):
+        snapshot = client.create_backup()
+
+    size_mb = snapshot.size_bytes / 1024 / 1024
+    console.print(
+        f"[bold green]Snapshot written to {snapshot.path} "
+        f"({size_mb:,.2f} MB, {snapshot.pages:,} pages in {snapshot.steps:,} steps, {snapshot.duration_seconds:.3f}s)"
+    )
+
+
+@app.command()
+def tag(
+        card_ids: list[int] = typer.Argument(..., help="IDs of the cards to tag"),
+        tags: list[str] = typer.Option(..., '-t', '--tag', help="Tags to add"),
+):
+    """
+    Tag cards on the to-do list
+    """
+    client.add_tags(tags, card_ids)
+
+
+@app.command()
+def untag(
+        card_ids: list[int] = typer.Argument(..., help="IDs of the cards to untag"),
+        tags: list[str] = typer.Option(..., '-t', '--tag', help="Tags to remove"),
+):
+    """
+    Remove tags from cards on the to-do list
+    """
+    client.remove_tags(tags, card_ids)
+
+
+@app.command()
+def tags():
+    """
+    Count the cards with each tag
+    """
+    tag_counts = client.get_tag_counts()
+    if not tag_counts:
+        console.print("[bold green]No cards are tagged yet")
+        raise typer.Exit(0)
+
+    table = Table(title="Tags", box=box.HEAVY_EDGE, header_style="bold magenta", title_style="bold green")
+    table.add_column("Tag", style="green")
+    table.add_column("Cards", justify="right")
+    for tag_count in tag_counts:
+        table.add_row(tag_count.name, str(tag_count.count))
+
+    console.print(table)
+
+
+@app.command()
+def due(
+        within_hours: int = typer.Option(24, '-w', '--within-hours', help="How far ahead to look"),
+):
+    """
+    List open cards that are overdue or due soon
+    """
+    cards = client.get_due_cards(within_hours=within_hours)
+    if not cards:
+        console.print(f"[bold green]Nothing is due in the next {within_hours} hours")
+        raise typer.Exit(0)
+
+    console.print(make_cards_table(cards, title="Due Soon", sort=False))
+
+
+@app.command()
+def history(
+        card_id: int = typer.Argument(..., help="ID of the card whose history you want to see"),
+):
+    """
+    Show every change made to a card, oldest first
+    """
+    table = Table(
+        title=f"History of Card {card_id}",
+        box=box.HEAVY_EDGE,
+        header_style="bold magenta",
+        title_style="bold green",
+    )
+    table.add_column("When", style="cyan")
+    table.add_column("What", style="green")
+    table.add_column("Who")
+    table.add_column("Changes")
+
+    after_id = None
+    while True:
+        page = client.get_card_history(card_id, after_id=after_id)
+        for event in page.events:
+            changes = "\n".join(
+                f"{field}: {change.old} -> {change.new}" for field, change in event.changes.items()
+            )
+            if event.folded > 1:
+                changes = f"({event.folded} changes)\n{changes}"
+
+            when = pendulum.instance(event.created_dttm).to_datetime_string()
+            table.add_row(when, event.kind.value, event.actor or "", changes)
+
+        if page.next_after_id is None:
+            break
+
+        after_id = page.next_after_id
+
+    console.print(table)
+
+
+@app.command(name="backfill-stats")
+def backfill_stats():
+    """
+    Rebuild the daily throughput and cycle time rollup from the cards
+    """
+    with console.status("Rebuilding daily stats"):
+        backfill = client.backfill_stats()
+
+    console.print(f"[bold green]Rolled up {backfill.cards:,} cards into {backfill.days:,} days")
+
+
+@app.command()
+def transition(
+        state: State = typer.Argument(..., help="State to move the cards to"),
+        card_ids: list[int] = typer.Option(None, '-c', '--card-ids', help="Cards to move, every card when left out"),
+        from_states: list[State] = typer.Option(None, '-s', '--from-states', help="Only move cards in these states"),
+):
+    """
+    Move many cards to a new state at once
+    """
+    with console.status(f"Moving cards to {state.value}"):
+        count = client.transition_cards(state, card_ids=card_ids or None, from_states=from_states or None)
+
+    console.print(f"[bold green]Moved {count:,} cards to {state.value}")
+
+
 def datetime_to_pendulum_date(dttm: dt.datetime) -> pendulum.date:
     return pendulum.instance(dttm).date()
 
 
+def datetime_to_pendulum(dttm: dt.datetime | None) -> pendulum.DateTime | None:
+    """Typer parses dates without a zone, they are meant in local time"""
+    return None if dttm is None else pendulum.instance(dttm, tz=pendulum.local_timezone())
+
+
 @app.command(name="list")
 def list_(
         *,
@@ -278,6 +473,16 @@ def list_(
             '--highest-create-date',
             help="Lowest Date for filtering",
             formats=["%Y-%m-%d"],
+        ),
+        tags_all: list[str] = typer.Option(None, '-t', '--tag', help="Only cards with every one of these tags"),
+        tags_any: list[str] = typer.Option(None, '--any-tag', help="Only cards with at least one of these tags"),
+        limit: int = typer.Option(None, '-n', '--limit', min=1, help="Maximum number of cards to list"),
+        page_size: int = typer.Option(500, '--page-size', min=1, max=1000, help="Cards fetched per request"),
+        output_format: OutputFormat = typer.Option(
+            OutputFormat.TABLE.value,
+            '-f',
+            '--format',
+            help="Table for reading, tsv/json/ndjson for scripts",
         )
 ):
     """
@@ -289,11 +494,158 @@ def list_(
     if highest_create_date is not None:
         highest_create_date = datetime_to_pendulum_date(highest_create_date)
 
-    cards = client.get_cards(
+    pages = client.iter_card_pages(
+        page_size=page_size,
+        limit=limit,
         highest_create_date=highest_create_date,
         lowest_create_date=lowest_create_date,
         states=states,
-        priorities=priorities
+        priorities=priorities,
+        tags_all=tags_all or None,
+        tags_any=tags_any or None
+    )
+
+    match output_format:
+        case OutputFormat.TABLE:
+            print_table_pages(pages)
+        case OutputFormat.TSV:
+            print_tsv_pages(pages)
+        case OutputFormat.JSON:
+            print_json_pages(pages)
+        case OutputFormat.NDJSON:
+            print_ndjson_pages(pages)
+
+
+def print_table_pages(pages: Iterable[list[CardRead]]):
+    """Print each page as soon as it arrives, only the first page gets a title and header"""
+    for page_number, page in enumerate(pages):
+        first_page = page_number == 0
+        table = make_cards_table(
+            page,
+            title="My TODO List" if first_page else None,
+            show_header=first_page,
+            sort=False
+        )
+        console.print(table)
+
+
+def print_tsv_pages(pages: Iterable[list[CardRead]]):
+    writer = csv.writer(sys.stdout, delimiter="\t", lineterminator="\n")
+    writer.writerow(CardRead.__fields__)
+    for page in pages:
+        writer.writerows([format_csv_value(value) for value in card.dict().values()] for card in page)
+        sys.stdout.flush()
+
+
+def print_json_pages(pages: Iterable[list[CardRead]]):
+    """Stream a JSON array without holding every card in memory"""
+    separator = "\n"
+    sys.stdout.write("[")
+    for page in pages:
+        for card in page:
+            sys.stdout.write(separator + card.json(by_alias=True))
+            separator = ",\n"
+        sys.stdout.flush()
+    sys.stdout.write("\n]\n")
+
+
+def print_ndjson_pages(pages: Iterable[list[CardRead]]):
+    for page in pages:
+        sys.stdout.writelines(card.json(by_alias=True) + "\n" for card in page)
+        sys.stdout.flush()
+
+
+def make_transfer_progress() -> Progress:
+    return Progress(
+        SpinnerColumn(),
+        TextColumn("[progress.description]{task.description}"),
+        BarColumn(),
+        TextColumn("{task.completed:,} rows"),
+        RowsPerSecondColumn(),
+        TimeElapsedColumn(),
+        console=console,
     )
-    cards_table = make_cards_table(cards)
-    console.print(cards_table)
+
+
+def print_transfer_summary(action: str, n_rows: int, started: float):
+    elapsed = time.perf_counter() - started
+    console.print(f"[bold green]{action} {n_rows:,} cards in {elapsed:.1f}s ({n_rows / max(elapsed, 1e-9):,.0f} rows/s)")
+
+
+@app.command(name="import")
+def import_(
+        *,
+        path: Path = typer.Argument(..., exists=True, dir_okay=False, help="CSV or JSONL file of cards"),
+        file_format: FileFormat = typer.Option(None, '-f', '--format', help="File format, defaults to the file suffix"),
+        batch_size: int = typer.Option(500, '-b', '--batch-size', min=1, max=1000, help="Cards sent per request"),
+        restart: bool = typer.Option(False, '--restart', help="Ignore any checkpoint and import from the start"),
+):
+    """
+    Import cards from a CSV or JSONL file, resuming from the last checkpoint
+    """
+    file_format = detect_format(path, file_format)
+    checkpoint = Checkpoint(path)
+    # Each batch is keyed by the file and its first row, so a batch that committed after the last checkpoint
+    # was saved is answered from the server's record when the import resumes instead of being created again
+    import_key = f"import-{file_digest(path)}"
+    n_imported = 0 if restart else checkpoint.load().get("rows", 0)
+    if n_imported:
+        console.print(f"Resuming after {n_imported:,} imported rows")
+
+    started = time.perf_counter()
+    n_skipped = n_imported
+    with path.open(newline="") as file, make_transfer_progress() as progress:
+        task = progress.add_task("Importing", total=None, completed=n_imported)
+        for batch in batched(read_cards(file, file_format, skip=n_imported), batch_size):
+            client.bulk_create_cards(batch, key=f"{import_key}-{n_imported}")
+            n_imported += len(batch)
+            checkpoint.save(rows=n_imported)
+            progress.update(task, completed=n_imported)
+
+    checkpoint.clear()
+    print_transfer_summary("Imported", n_imported - n_skipped, started)
+
+
+@app.command()
+def export(
+        *,
+        path: Path = typer.Argument(..., dir_okay=False, help="CSV or JSONL file to write"),
+        file_format: FileFormat = typer.Option(None, '-f', '--format', help="File format, defaults to the file suffix"),
+        checkpoint_every: int = typer.Option(1000, '--checkpoint-every', min=1, help="Rows between checkpoints"),
+        restart: bool = typer.Option(False, '--restart', help="Ignore any checkpoint and export from the start"),
+):
+    """
+    Export every card to a CSV or JSONL file, resuming from the last checkpoint
+    """
+    file_format = detect_format(path, file_format)
+    checkpoint = Checkpoint(path)
+    state = {} if restart else checkpoint.load()
+    after_id, n_exported, size = state.get("after_id", 0), state.get("rows", 0), state.get("size", 0)
+    resuming = bool(state) and path.exists()
+    if resuming:
+        console.print(f"Resuming after {n_exported:,} exported rows")
+
+    def save_checkpoint():
+        file.flush()
+        checkpoint.save(after_id=after_id, rows=n_exported, size=file.tell())
+
+    started = time.perf_counter()
+    n_skipped = n_exported
+    with path.open("r+" if resuming else "w", newline="") as file, make_transfer_progress() as progress:
+        # Drop anything written after the last checkpoint so resumed rows are not duplicated
+        file.truncate(size if resuming else 0)
+        file.seek(0, 2)
+        writer = CardWriter(file, file_format, write_header=not resuming)
+        task = progress.add_task("Exporting", total=None, completed=n_exported)
+        for card in client.iter_export(after_id=after_id):
+            writer.write(card)
+            after_id = card.id
+            n_exported += 1
+            if n_exported % checkpoint_every == 0:
+                save_checkpoint()
+                progress.update(task, completed=n_exported)
+
+        progress.update(task, completed=n_exported)
+
+    checkpoint.clear()
+    print_transfer_summary("Exported", n_exported - n_skipped, started)
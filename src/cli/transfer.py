@@ -0,0 +1,110 @@
+"""Streaming file helpers for the import and export commands."""
+import csv
+import datetime as dt
+import hashlib
+import json
+from collections.abc import Iterable, Iterator
+from enum import Enum
+from itertools import islice
+from pathlib import Path
+from typing import TextIO
+
+from rich.progress import ProgressColumn, Task
+from rich.text import Text
+
+from api.cards.models import CardImport, CardRead
+
+
+class FileFormat(str, Enum):
+    CSV = "csv"
+    JSONL = "jsonl"
+
+
+CSV_FIELDS = list(CardRead.__fields__)
+
+
+def detect_format(path: Path, file_format: FileFormat | None) -> FileFormat:
+    if file_format is not None:
+        return file_format
+
+    return FileFormat.JSONL if path.suffix in (".jsonl", ".ndjson") else FileFormat.CSV
+
+
+def format_csv_value(value):
+    if value is None:
+        return ""
+
+    if isinstance(value, Enum):
+        return value.value
+
+    if isinstance(value, dt.datetime):
+        return value.isoformat()
+
+    return value
+
+
+def read_cards(file: TextIO, file_format: FileFormat, skip: int = 0) -> Iterator[CardImport]:
+    """Lazily parse cards from `file`, skipping the first `skip` rows"""
+    match file_format:
+        case FileFormat.CSV:
+            rows = (
+                CardImport(**{key: value for key, value in row.items() if value != ""})
+                for row in csv.DictReader(file)
+            )
+        case FileFormat.JSONL:
+            rows = (CardImport.parse_raw(line) for line in file if line.strip())
+
+    return islice(rows, skip, None)
+
+
+class CardWriter:
+    def __init__(self, file: TextIO, file_format: FileFormat, write_header: bool):
+        self.file = file
+        self.file_format = file_format
+        self.csv_writer = csv.writer(file, lineterminator="\n")
+        if file_format == FileFormat.CSV and write_header:
+            self.csv_writer.writerow(CSV_FIELDS)
+
+    def write(self, card: CardRead) -> None:
+        match self.file_format:
+            case FileFormat.CSV:
+                self.csv_writer.writerow(format_csv_value(value) for value in card.dict().values())
+            case FileFormat.JSONL:
+                self.file.write(card.json(by_alias=True) + "\n")
+
+
+def batched(items: Iterable, size: int) -> Iterator[list]:
+    iterator = iter(items)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def file_digest(path: Path) -> str:
+    """Hash of the file's contents, the same file always yields the same import keys"""
+    with path.open("rb") as file:
+        return hashlib.file_digest(file, "sha256").hexdigest()
+
+
+class Checkpoint:
+    """Progress marker kept next to the data file so an interrupted transfer can resume"""
+
+    def __init__(self, data_path: Path):
+        self.path = data_path.with_name(data_path.name + ".checkpoint")
+
+    def load(self) -> dict:
+        return json.loads(self.path.read_text()) if self.path.exists() else {}
+
+    def save(self, **data) -> None:
+        # Write then rename so a crash never leaves a half written checkpoint
+        temp_path = self.path.with_name(self.path.name + ".tmp")
+        temp_path.write_text(json.dumps(data))
+        temp_path.replace(self.path)
+
+    def clear(self) -> None:
+        self.path.unlink(missing_ok=True)
+
+
+class RowsPerSecondColumn(ProgressColumn):
+    def render(self, task: Task) -> Text:
+        speed = task.finished_speed or task.speed
+        return Text(f"{speed or 0:,.0f} rows/s", style="progress.data.speed")
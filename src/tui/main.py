@@ -1,12 +1,17 @@
 from textual.app import App, ComposeResult
 from textual.widgets import Header, Footer, Button, Static, Placeholder
 from textual import events, log
+import asyncio
+import os
+from collections.abc import Awaitable, Callable
+import pendulum
+from httpx import HTTPError
 from textual.containers import Vertical, Horizontal, Container
 from textual.widget import Widget
 from textual.reactive import reactive
 from textual.message import Message, MessageTarget
-from api.cards.client import SyncCardClient
-from api.cards.models import CardRead, State
+from api.cards.client import AsyncCardClient, ClientError
+from api.cards.models import CardField, CardPartial, CardRead, State
 
 
 
@@ -23,6 +28,13 @@ class Title(Static):
 
 
 class CardList(Vertical):
+    """
+    Board column that only mounts widgets for the cards in its visible window.
+
+    Cards are kept in a dict keyed by id. `set_cards` diffs the new cards
+    against it and only mounts, updates or removes the widgets that changed.
+    """
+
     DEFAULT_CSS = """
     CardList {
         height: 100%;
@@ -34,6 +46,12 @@ class CardList(Vertical):
     }
     """
 
+    TITLE_HEIGHT = 3
+    CARD_HEIGHT = 6
+
+    window_start = reactive(0)
+    window_size = reactive(10)
+
     def __init__(
             self, title,
             *children: Widget,
@@ -41,8 +59,71 @@ class CardList(Vertical):
             id: str | None = None,
             classes: str | None = None,
     ):
-        super().__init__(Title(title), *children, id=id, classes=classes, name=name)
-
+        self.list_title = title
+        self.title_widget = Title(title)
+        self.cards: dict[int, CardRead] = {}
+        self.card_ids: list[int] = []
+        self.card_widgets: dict[int, CardMini] = {}
+        super().__init__(self.title_widget, *children, id=id, classes=classes, name=name)
+
+    def set_cards(self, cards: list[CardRead]) -> None:
+        """Apply a keyed diff of `cards` against the cards currently in the column"""
+        new_cards = {card.id: card for card in cards}
+        if new_cards == self.cards:
+            return
+
+        for card_id, card in new_cards.items():
+            widget = self.card_widgets.get(card_id)
+            if widget is not None and self.cards.get(card_id) != card:
+                widget.update_card(card)
+
+        self.cards = new_cards
+        self.card_ids = sorted(new_cards, key=lambda card_id: (new_cards[card_id].priority, card_id))
+        self.window_start = min(self.window_start, self.max_window_start)
+        self.render_window()
+
+    @property
+    def max_window_start(self) -> int:
+        return max(0, len(self.card_ids) - self.window_size)
+
+    def render_window(self) -> None:
+        """Mount, move and remove card widgets so only the visible window has widgets"""
+        visible_ids = self.card_ids[self.window_start:self.window_start + self.window_size]
+
+        for card_id in set(self.card_widgets) - set(visible_ids):
+            self.card_widgets.pop(card_id).remove()
+
+        previous = self.title_widget
+        for card_id in visible_ids:
+            widget = self.card_widgets.get(card_id)
+            if widget is None:
+                widget = self.card_widgets[card_id] = CardMini(self.cards[card_id])
+                self.mount(widget, after=previous)
+            elif self.children.index(widget) != self.children.index(previous) + 1:
+                self.move_child(widget, after=previous)
+            previous = widget
+
+        hidden_count = len(self.card_ids) - len(visible_ids)
+        more = f" (+{hidden_count})" if hidden_count else ""
+        self.title_widget.update(f"{self.list_title} - {len(self.card_ids)}{more}")
+
+    def watch_window_start(self, window_start: int) -> None:
+        self.render_window()
+
+    def watch_window_size(self, window_size: int) -> None:
+        self.window_start = min(self.window_start, self.max_window_start)
+        self.render_window()
+
+    def on_resize(self, event: events.Resize) -> None:
+        self.window_size = max(1, (event.size.height - self.TITLE_HEIGHT) // self.CARD_HEIGHT)
+
+    def on_mouse_scroll_down(self, event: events.MouseScrollDown) -> None:
+        event.stop()
+        self.window_start = min(self.window_start + 1, self.max_window_start)
+
+    def on_mouse_scroll_up(self, event: events.MouseScrollUp) -> None:
+        event.stop()
+        self.window_start = max(self.window_start - 1, 0)
 
 
 class CardMiniTitle(Static):
@@ -90,6 +171,13 @@ class InfoButton(BaseButton):
 class StartButton(BaseButton):
     DEFAULT_CLASSES = "bg-blue"
 
+    class Selected(Message):
+        """Card start requested message."""
+
+        def __init__(self, sender: MessageTarget, card: CardRead) -> None:
+            self.card = card
+            super().__init__(sender)
+
     def __init__(
             self,
             card: CardRead = None,
@@ -101,14 +189,22 @@ class StartButton(BaseButton):
         super().__init__(label="Start", disabled=False, name=name, id=id, classes=classes)
         self.card = card
 
-    def on_click(self, event: events.Click) -> None:
+    async def on_click(self, event: events.Click) -> None:
         log(event)
-        log("start button clicked")
+        log(f"start button clicked - {self.card.id}")
+        await self.emit(self.Selected(self, self.card))
 
 
 class FinishButton(BaseButton):
     DEFAULT_CLASSES = "bg-green"
 
+    class Selected(Message):
+        """Card finish requested message."""
+
+        def __init__(self, sender: MessageTarget, card: CardRead) -> None:
+            self.card = card
+            super().__init__(sender)
+
     def __init__(
             self,
             card: CardRead = None,
@@ -120,10 +216,10 @@ class FinishButton(BaseButton):
         super().__init__(label="Finish", disabled=False, name=name, id=id, classes=classes)
         self.card = card
 
-
-    def on_click(self, event: events.Click) -> None:
+    async def on_click(self, event: events.Click) -> None:
         log(event)
-        log("finish button clicked")
+        log(f"finish button clicked - {self.card.id}")
+        await self.emit(self.Selected(self, self.card))
 
 
 class CardMini(Static):
@@ -144,6 +240,14 @@ class CardMini(Static):
     def on_click(self) -> None:
         log(self.card.id)
 
+    def update_card(self, card: CardRead) -> None:
+        """Point the widget and its buttons at a newer version of the same card"""
+        self.card = card
+        for button in self.query(BaseButton):
+            button.card = card
+
+        self.query_one(CardMiniTitle).update(card.title)
+
     def compose(self) -> ComposeResult:
         info_button = InfoButton(card=self.card)
         match self.card.state:
@@ -181,9 +285,26 @@ class CardDetails(Static):
 class CardsApp(App):
     CSS_PATH = "app.css"
     BINDINGS = [("q", "request_quit", "Quit")]
-    client = SyncCardClient()
+    STATE_LISTS = {
+        State.TODO: "#todo-list",
+        State.IN_PROGRESS: "#in-progress-list",
+        State.DONE: "#done-list",
+    }
+    MIN_REFRESH_INTERVAL = 2.0
+    MAX_REFRESH_INTERVAL = 60.0
+    # All the board draws, so summaries and timestamps are never read or sent
+    BOARD_FIELDS = [CardField.ID, CardField.TITLE, CardField.STATE, CardField.PRIORITY]
+    client = AsyncCardClient(board=os.environ.get("CARDS_BOARD"))
     selected_card = reactive(None)
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.cards: dict[int, CardRead] = {}
+        self.pending_cards: dict[int, CardRead] = {}
+        self.workers: set[asyncio.Task] = set()
+        self.cards_version: str | None = None
+        self.refresh_interval = self.MIN_REFRESH_INTERVAL
+
     def compose(self) -> ComposeResult:
         yield Header(show_clock=True)
         yield Container(
@@ -198,18 +319,104 @@ class CardsApp(App):
         )
         yield Footer()
 
-    def load_cards(self, cards_: list[CardRead], list_id: str, state: State) -> None:
-        list_widget = self.query_one(list_id)
-        filtered_cards = [card for card in cards_ if card.state == state]
-        for card in filtered_cards:
-            list_widget.mount(CardMini(card))
+    def start_worker(self, work: Awaitable) -> asyncio.Task:
+        """Run `work` in the background so the event loop keeps handling input"""
+        task = asyncio.create_task(work)
+        self.workers.add(task)
+        task.add_done_callback(self.workers.discard)
+        return task
+
+    def render_board(self) -> None:
+        """Show the server cards with any unconfirmed optimistic changes on top"""
+        cards_by_state = {state: [] for state in self.STATE_LISTS}
+        for card in {**self.cards, **self.pending_cards}.values():
+            cards_by_state[card.state].append(card)
+
+        for state, list_id in self.STATE_LISTS.items():
+            self.query_one(list_id, CardList).set_cards(cards_by_state[state])
+
+    def load_cards(self, cards_: list[CardRead | CardPartial]) -> None:
+        self.cards = {card.id: card for card in cards_}
+        self.render_board()
+
+    async def refresh_cards(self) -> bool:
+        """Reload the board if the server's cards version moved, returns whether it did"""
+        try:
+            # Read the version first so a write racing the reload is caught on the next poll
+            version = await self.client.get_cards_version()
+            if version == self.cards_version:
+                return False
+
+            cards = await self.client.get_cards(fields=self.BOARD_FIELDS)
+        except (ClientError, HTTPError) as e:
+            log(f"loading cards failed - {e!r}")
+            return False
+
+        self.cards_version = version
+        self.load_cards(cards)
+        return True
+
+    async def auto_refresh(self) -> None:
+        """Poll the cards version, backing off while the board is idle"""
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+            if await self.refresh_cards():
+                self.refresh_interval = self.MIN_REFRESH_INTERVAL
+            else:
+                self.refresh_interval = min(self.refresh_interval * 2, self.MAX_REFRESH_INTERVAL)
 
     def on_mount(self) -> None:
-        cards = self.client.get_cards()
+        self.start_worker(self.refresh_cards())
+        self.start_worker(self.auto_refresh())
+
+    async def on_unmount(self) -> None:
+        for worker in self.workers:
+            worker.cancel()
+
+        await self.client.close()
+
+    async def change_card(self, optimistic_card: CardRead, request: Callable[[int], Awaitable]) -> None:
+        """Send a state change, then replace the optimistic card with the server's copy"""
+        card_id = optimistic_card.id
+        try:
+            await request(card_id)
+            card = await self.client.get_card(card_id)
+        except (ClientError, HTTPError) as e:
+            log(f"changing card {card_id} failed - {e!r}")
+            self.bell()
+        else:
+            self.cards[card_id] = card
+        finally:
+            # Only drop the optimistic card if a newer action has not replaced it
+            if self.pending_cards.get(card_id) is optimistic_card:
+                del self.pending_cards[card_id]
+
+        self.render_board()
+
+    def apply_optimistic(self, card: CardRead, request: Callable[[int], Awaitable], **changes) -> None:
+        optimistic_card = card.copy(update=changes)
+        self.refresh_interval = self.MIN_REFRESH_INTERVAL
+        self.pending_cards[card.id] = optimistic_card
+        self.render_board()
+        self.start_worker(self.change_card(optimistic_card, request))
+
+    def on_start_button_selected(self, message: StartButton.Selected) -> None:
+        self.apply_optimistic(
+            message.card,
+            self.client.start_card,
+            state=State.IN_PROGRESS,
+            started_dttm=pendulum.now(),
+        )
 
-        self.load_cards(cards, "#todo-list", State.TODO)
-        self.load_cards(cards, "#in-progress-list", State.IN_PROGRESS)
-        self.load_cards(cards, "#done-list", State.DONE)
+    def on_finish_button_selected(self, message: FinishButton.Selected) -> None:
+        now = pendulum.now()
+        self.apply_optimistic(
+            message.card,
+            self.client.finish_card,
+            state=State.DONE,
+            started_dttm=message.card.started_dttm or now,
+            finished_dttm=now,
+        )
 
     def action_request_quit(self) -> None:
         self.exit()